@@ -23,6 +23,7 @@
 #
 ########################################################################
 
+import bisect
 import logging
 import math
 import sys
@@ -91,7 +92,7 @@ class LassoToolContext(OpenMayaUI.MPxContext):
         """
         OpenMayaUI.MPxContext.__init__(self)
         self.lasso = []
-        self.sorted_lasso = []
+        self.lasso_rows = {}
         self.lasso_cursor = OpenMayaUI.MCursor(width=self.cursor_width,
             height=self.cursor_height,
             hotSpotX=self.cursor_x_hot,
@@ -157,9 +158,10 @@ class LassoToolContext(OpenMayaUI.MPxContext):
         Perfom the release operations common to both VP2.0 and the Legacy Viewport.
         """
 
-        # Close the lasso by appending the starting point, and sort all the points on it.
+        # Close the lasso by appending the starting point, and build the table
+        # of its crossings on each row of the screen.
         self.append_lasso(self.lasso[0])
-        self.sorted_lasso = sorted(self.lasso, key=lambda x: (x[1], x[0]))
+        self.build_lasso_rows()
 
         # Save the state of the current selections.  The "selectFromSceen"
         # below will alter the active list, and we have to be able to put
@@ -204,70 +206,23 @@ class LassoToolContext(OpenMayaUI.MPxContext):
 
             found_components = True
 
-            if component.apiType() == OpenMaya.MFn.kCurveCVComponent:
-                curve_cv_iter = OpenMaya.MItCurveCV( dag_path, component)
-                while not curve_cv_iter.isDone():
-                    try:
-                        point = curve_cv_iter.position(OpenMaya.MSpace.kWorld)
-                        pt = self.view.worldToView(point)
-                        if self.point_in_lasso(pt):
-                            single_component = curve_cv_iter.currentItem()
-                            new_list.add ((dag_path, single_component))
-                    except:
-                        OpenMaya.MGlobal.displayError("Could not get position")
-                    curve_cv_iter.next()
-
-            elif component.apiType() == OpenMaya.MFn.kSurfaceCVComponent:
-                surf_cv_iter = OpenMaya.MItSurfaceCV(dag_path, component, true)
-                while not surf_cv_iter.isDone():
-                    try:
-                        point = surf_cv_iter.position(OpenMaya.MSpace.kWorld)
-                        pt = self.view.worldToView(point)
-                        if self.point_in_lasso(pt):
-                            single_component = surf_cv_iter.currentItem()
-                            new_list.add((dag_path, single_component))
-                    except:
-                        OpenMaya.MGlobal.displayError("Could not get position")
-                    surf_cv_iter.next()
-
-            elif component.apiType() == OpenMaya.MFn.kMeshVertComponent:
-                vertex_iter = OpenMaya.MItMeshVertex(dag_path, component)
-                while not vertex_iter.isDone():
-                    try:
-                        point = vertex_iter.position(OpenMaya.MSpace.kWorld)
-                        pt = self.view.worldToView(point)
-                        if self.point_in_lasso(pt):
-                            single_component = vertex_iter.currentItem()
-                            new_list.add((dag_path, single_component))
-                    except:
-                        OpenMaya.MGlobal.displayError("Could not get position")
-                    vertex_iter.next()
-
-            elif component.apiType() == OpenMaya.MFn.kMeshEdgeComponent:
-                edge_iter = OpenMaya.MItMeshEdge(dag_path, component)
-                while not edge_iter.isDone():
-                    try:
-                        point = edge_iter.center(OpenMaya.MSpace.kWorld)
-                        pt = view.worldToView(point)
-                        if self.point_in_lasso(pt):
-                            single_component = edge_iter.currentItem()
-                            new_list.add ((dag_path, single_component))
-                    except:
-                        OpenMaya.MGlobal.displayError("Could not get position")
-                    edge_iter.next()
-
-            elif component.apiType() == OpenMaya.MFn.kMeshPolygonComponent:
-                polygon_iter = OpenMaya.MItMeshPolygon(dag_path, component)
-                while not polygon_iter.isDone():
-                    try:
-                        point = polygon_iter.center(OpenMaya.MSpace.kWorld)
-                        pt = view.worldToView(point)
-                        if self.point_in_lasso(pt):
-                            single_component = polygon_iter.currentItem();
-                            new_list.add ((dag_path, single_component))
-                    except:
-                        OpenMaya.MGlobal.displayError("Could not get position")
-                    polygon_iter.next()
+            # Gather the world space positions of the components in one go,
+            # test them against the lasso, and add the ones inside as a single
+            # component of the same type.
+            try:
+                selected = self.components_in_lasso(dag_path, component)
+            except:
+                OpenMaya.MGlobal.displayError("Could not get position")
+                selected = None
+
+            if selected:
+                if component.apiType() == OpenMaya.MFn.kSurfaceCVComponent:
+                    fn_component = OpenMaya.MFnDoubleIndexedComponent()
+                else:
+                    fn_component = OpenMaya.MFnSingleIndexedComponent()
+                lasso_component = fn_component.create(component.apiType())
+                fn_component.addElements(selected)
+                new_list.add((dag_path, lasso_component))
 
             iter.next()
 
@@ -280,7 +235,97 @@ class LassoToolContext(OpenMayaUI.MPxContext):
 
         # Free the memory that held the lasso points.
         self.lasso = []
-        self.sorted_lasso = []
+        self.lasso_rows = {}
+
+    def components_in_lasso( self, dag_path, component ):
+        """
+        Return the elements of the given component that lie inside the lasso.
+        CVs and mesh vertices are tested at their positions, mesh edges and
+        faces at their centers.  Returns None for unsupported component types.
+        """
+        component_type = component.apiType()
+
+        if component_type == OpenMaya.MFn.kCurveCVComponent:
+            elements = OpenMaya.MFnSingleIndexedComponent(component).getElements()
+            cvs = OpenMaya.MFnNurbsCurve(dag_path).cvPositions(OpenMaya.MSpace.kWorld)
+            points = [ cvs[i] for i in elements ]
+
+        elif component_type == OpenMaya.MFn.kSurfaceCVComponent:
+            elements = OpenMaya.MFnDoubleIndexedComponent(component).getElements()
+            surface_fn = OpenMaya.MFnNurbsSurface(dag_path)
+            cvs = surface_fn.cvPositions(OpenMaya.MSpace.kWorld)
+            num_cvs_in_v = surface_fn.numCVsInV
+            points = [ cvs[u * num_cvs_in_v + v] for (u, v) in elements ]
+
+        elif component_type == OpenMaya.MFn.kMeshVertComponent:
+            elements = OpenMaya.MFnSingleIndexedComponent(component).getElements()
+            vertices = OpenMaya.MFnMesh(dag_path).getPoints(OpenMaya.MSpace.kWorld)
+            points = [ vertices[i] for i in elements ]
+
+        elif component_type == OpenMaya.MFn.kMeshEdgeComponent:
+            elements = OpenMaya.MFnSingleIndexedComponent(component).getElements()
+            mesh_fn = OpenMaya.MFnMesh(dag_path)
+            vertices = mesh_fn.getPoints(OpenMaya.MSpace.kWorld)
+            # Only the candidate edges are queried: MFnMesh has no bulk edge query
+            # and walking every edge of the mesh costs more for a small lasso.
+            points = []
+            for i in elements:
+                (v0, v1) = mesh_fn.getEdgeVertices(i)
+                p0 = vertices[v0]
+                p1 = vertices[v1]
+                points.append(((p0.x + p1.x) * 0.5, (p0.y + p1.y) * 0.5, (p0.z + p1.z) * 0.5))
+
+        elif component_type == OpenMaya.MFn.kMeshPolygonComponent:
+            elements = OpenMaya.MFnSingleIndexedComponent(component).getElements()
+            mesh_fn = OpenMaya.MFnMesh(dag_path)
+            vertices = mesh_fn.getPoints(OpenMaya.MSpace.kWorld)
+            (counts, connects) = mesh_fn.getVertices()
+            offsets = [0] * len(counts)
+            offset = 0
+            for i in range(len(counts)):
+                offsets[i] = offset
+                offset += counts[i]
+            points = []
+            for i in elements:
+                face_vertices = [ vertices[connects[j]] for j in range(offsets[i], offsets[i] + counts[i]) ]
+                scale = 1.0 / len(face_vertices)
+                points.append((sum(p.x for p in face_vertices) * scale,
+                               sum(p.y for p in face_vertices) * scale,
+                               sum(p.z for p in face_vertices) * scale))
+
+        else:
+            return None
+
+        return [ elements[i] for i in self.points_in_lasso(points) ]
+
+    def points_in_lasso( self, points ):
+        """
+        Project the given world space points to the view in a single pass with the
+        view's combined matrix, and return the indices of the ones inside the lasso.
+        """
+        camera = self.view.getCamera()
+        world_to_clip = camera.inclusiveMatrixInverse() * self.view.projectionMatrix()
+        (m00, m01, m02, m03,
+         m10, m11, m12, m13,
+         m20, m21, m22, m23,
+         m30, m31, m32, m33) = [ world_to_clip.getElement(row, col) for row in range(4) for col in range(4) ]
+
+        half_width = 0.5 * self.view.portWidth()
+        half_height = 0.5 * self.view.portHeight()
+
+        inside = []
+        for i in range(len(points)):
+            (x, y, z) = points[i][0], points[i][1], points[i][2]
+            w = x*m03 + y*m13 + z*m23 + m33
+            if w <= 0.0:
+                continue
+
+            view_x = int(((x*m00 + y*m10 + z*m20 + m30) / w + 1.0) * half_width)
+            view_y = int(((x*m01 + y*m11 + z*m21 + m31) / w + 1.0) * half_height)
+            if self.point_in_lasso((view_x, view_y)):
+                inside.append(i)
+
+        return inside
 
     def draw_lasso_gl( self ):
         """
@@ -333,27 +378,30 @@ class LassoToolContext(OpenMayaUI.MPxContext):
             fx = fx + xinc
             cy = cy + yinc
 
+    def build_lasso_rows( self ):
+        """
+        Build the span table of the closed lasso: for each screen row, the sorted
+        x coordinates where the lasso crosses it.  append_lasso() rasterizes the
+        lasso so that every segment contributes one point per row it spans.
+        """
+        rows = {}
+        for [x, y] in self.lasso:
+            rows.setdefault(y, []).append(x)
+        for xs in rows.values():
+            xs.sort()
+        self.lasso_rows = rows
+
     def point_in_lasso( self, pt ):
         """
         Check the given point to see if it's inside the loop defined by the lasso.
-        """
-        for i in range(len(self.lasso)):
-            if (self.sorted_lasso[i][1] == pt[1]):
-                while ((self.sorted_lasso[i][1] == pt[1]) and (self.sorted_lasso[i][0] < pt[0])):
-                    i = i + 1
-                if (self.sorted_lasso[i][1] != pt[1]):
-                    return False
-                sides = 0
-                i = i + 1
-                while (self.sorted_lasso[i][1] == pt[1]):
-                    i = i + 1
-                    sides = sides + 1
-
-                if (sides % 2):
-                    return False
-                else:
-                    return True
-        return False
+        The point is inside when the lasso crosses its row an odd number of times
+        at or to the right of it.
+        """
+        xs = self.lasso_rows.get(pt[1])
+        if not xs:
+            return False
+        crossings = len(xs) - bisect.bisect_left(xs, pt[0])
+        return (crossings % 2) == 1
 
     def doPressLegacy( self, event ):
         """
@@ -22,11 +22,22 @@
 # click selection or drag selection). Both will also work with the shift 
 # key held down in the same manner as the selection tool. 
 #
+# The context can also select the vertices of hilited meshes without going
+# through selectFromScreen, by projecting their points to the screen:
+#
+# cmds.marqueeToolContext(ctx, edit=True, projectionSelect=True, backfaceCulling=True)
+#
+# To compare both methods on the hilited meshes of the active view:
+#
+# import marqueeTool
+# marqueeTool.benchmark(0, 0, 800, 600)
+#
 ########################################################################
 
 import logging
 import math
 import sys
+import timeit
 from maya.api import OpenMaya, OpenMayaRender, OpenMayaUI
 from maya import OpenMayaRender as OpenMayaRenderV1
 
@@ -35,6 +46,203 @@ logger = logging.getLogger('marqueeTool')
 # tell Maya that we want to use Python API 2.0
 maya_useNewAPI = True
 
+class ProjectionMarquee(object):
+    """
+    This class selects the vertices of the hilited meshes that fall within a
+    screen rectangle, by projecting them with the view's matrices instead of
+    picking them with selectFromScreen.  The object space points and normals
+    of each mesh are cached until its geometry changes.
+    """
+
+    def __init__(self):
+        self.backface_culling = False
+        self.shape_cache = {}
+        self.shape_callbacks = {}
+
+    def clear(self):
+        """
+        Forget the cached meshes and remove the callbacks watching them.
+        """
+        for callback in self.shape_callbacks.values():
+            OpenMaya.MMessage.removeCallback(callback)
+        self.shape_callbacks = {}
+        self.shape_cache = {}
+
+    def on_shape_dirty(self, node, plug, key):
+        """
+        Drop the cached data of a mesh when its geometry is dirtied.
+        """
+        if plug.partialName(useLongNames=True) == "outMesh":
+            self.shape_cache.pop(key, None)
+
+    def shape_data(self, dag_path):
+        """
+        Return the object space (points, normals) of the mesh at the given path,
+        as lists of (x, y, z) tuples.
+        """
+        key = dag_path.fullPathName()
+        data = self.shape_cache.get(key)
+        if data is None:
+            mesh_fn = OpenMaya.MFnMesh(dag_path)
+            points = [ (p.x, p.y, p.z) for p in mesh_fn.getPoints(OpenMaya.MSpace.kObject) ]
+            normals = [ (n.x, n.y, n.z) for n in mesh_fn.getVertexNormals(False, OpenMaya.MSpace.kObject) ]
+            data = (points, normals)
+            self.shape_cache[key] = data
+
+            if key not in self.shape_callbacks:
+                self.shape_callbacks[key] = OpenMaya.MNodeMessage.addNodeDirtyPlugCallback(dag_path.node(), self.on_shape_dirty, key)
+        return data
+
+    def hilited_meshes(self):
+        """
+        Return the paths to the mesh shapes of the hilite list.
+        """
+        meshes = []
+        iter = OpenMaya.MItSelectionList(OpenMaya.MGlobal.getHiliteList())
+        while not iter.isDone():
+            try:
+                dag_path = iter.getDagPath()
+                if not dag_path.hasFn(OpenMaya.MFn.kMesh):
+                    dag_path.extendToShape()
+                if dag_path.hasFn(OpenMaya.MFn.kMesh):
+                    meshes.append(dag_path)
+            except:
+                pass
+            iter.next()
+        return meshes
+
+    def can_select(self):
+        """
+        Return True when the current selection mode picks mesh vertices on
+        hilited meshes.  Anything else is left to selectFromScreen.
+        """
+        if OpenMaya.MGlobal.selectionMode() == OpenMaya.MGlobal.kSelectComponentMode:
+            mask = OpenMaya.MGlobal.componentSelectionMask()
+        else:
+            mask = OpenMaya.MGlobal.objectSelectionMask()
+        return mask.intersects(OpenMaya.MSelectionMask.kSelectMeshVerts) and len(self.hilited_meshes()) > 0
+
+    def select(self, view, x0, y0, x1, y1):
+        """
+        Return a selection list with the vertices of the hilited meshes whose
+        projection lies within the given port rectangle of the view.
+        """
+        x_min = min(x0, x1)
+        x_max = max(x0, x1)
+        y_min = min(y0, y1)
+        y_max = max(y0, y1)
+
+        camera = view.getCamera()
+        world_to_clip = camera.inclusiveMatrixInverse() * view.projectionMatrix()
+        half_width = 0.5 * view.portWidth()
+        half_height = 0.5 * view.portHeight()
+
+        camera_fn = OpenMaya.MFnCamera(camera)
+        orthographic = camera_fn.isOrtho()
+        eye = camera_fn.eyePoint(OpenMaya.MSpace.kWorld)
+        view_direction = camera_fn.viewDirection(OpenMaya.MSpace.kWorld)
+
+        selection = OpenMaya.MSelectionList()
+        for dag_path in self.hilited_meshes():
+            (points, normals) = self.shape_data(dag_path)
+
+            obj_to_clip = dag_path.inclusiveMatrix() * world_to_clip
+            (m00, m01, m02, m03,
+             m10, m11, m12, m13,
+             m20, m21, m22, m23,
+             m30, m31, m32, m33) = [ obj_to_clip.getElement(row, col) for row in range(4) for col in range(4) ]
+
+            # The facing test is done in object space: the dot product of a
+            # normal and a vector is the same once both are in world space.
+            world_to_obj = dag_path.inclusiveMatrixInverse()
+            eye_obj = eye * world_to_obj
+            towards_eye = -(view_direction * world_to_obj)
+
+            selected = []
+            for i in range(len(points)):
+                (x, y, z) = points[i]
+                w = x*m03 + y*m13 + z*m23 + m33
+                if w <= 0.0:
+                    continue
+
+                view_x = ((x*m00 + y*m10 + z*m20 + m30) / w + 1.0) * half_width
+                if view_x < x_min or view_x > x_max:
+                    continue
+                view_y = ((x*m01 + y*m11 + z*m21 + m31) / w + 1.0) * half_height
+                if view_y < y_min or view_y > y_max:
+                    continue
+
+                if self.backface_culling:
+                    (nx, ny, nz) = normals[i]
+                    if orthographic:
+                        facing = nx*towards_eye.x + ny*towards_eye.y + nz*towards_eye.z
+                    else:
+                        facing = nx*(eye_obj.x - x) + ny*(eye_obj.y - y) + nz*(eye_obj.z - z)
+                    if facing <= 0.0:
+                        continue
+
+                selected.append(i)
+
+            if selected:
+                fn_component = OpenMaya.MFnSingleIndexedComponent()
+                component = fn_component.create(OpenMaya.MFn.kMeshVertComponent)
+                fn_component.addElements(selected)
+                selection.add((dag_path, component))
+
+        return selection
+
+def benchmark(x0, y0, x1, y1, iterations=10, backface_culling=False):
+    """
+    Time the projection marquee against MGlobal.selectFromScreen when selecting
+    the vertices of the hilited meshes within the given port rectangle of the
+    active view.  Returns the average seconds of (first projection, cached
+    projection, selectFromScreen) selections.
+    """
+    view = OpenMayaUI.M3dView.active3dView()
+    marquee = ProjectionMarquee()
+    marquee.backface_culling = backface_culling
+
+    def selection_size(selection):
+        count = 0
+        iter = OpenMaya.MItSelectionList(selection)
+        while not iter.isDone():
+            if iter.hasComponents():
+                count += OpenMaya.MFnSingleIndexedComponent(iter.getComponent()[1]).elementCount
+            iter.next()
+        return count
+
+    try:
+        start = timeit.default_timer()
+        projection_list = marquee.select(view, x0, y0, x1, y1)
+        first_time = timeit.default_timer() - start
+
+        start = timeit.default_timer()
+        for i in range(iterations):
+            marquee.select(view, x0, y0, x1, y1)
+        projection_time = (timeit.default_timer() - start) / iterations
+    finally:
+        marquee.clear()
+
+    # selectFromScreen alters the active list, put it back when done.
+    incoming_list = OpenMaya.MGlobal.getActiveSelectionList()
+    select_method = OpenMaya.MGlobal.kSurfaceSelectMethod if backface_culling else OpenMaya.MGlobal.kWireframeSelectMethod
+    try:
+        start = timeit.default_timer()
+        for i in range(iterations):
+            OpenMaya.MGlobal.selectFromScreen(x0, y0, x1, y1,
+                                              listAdjustment = OpenMaya.MGlobal.kReplaceList,
+                                              selectMethod = select_method )
+        screen_time = (timeit.default_timer() - start) / iterations
+        screen_list = OpenMaya.MGlobal.getActiveSelectionList()
+    finally:
+        OpenMaya.MGlobal.setActiveSelectionList(incoming_list, OpenMaya.MGlobal.kReplaceList)
+
+    logger.info("Marquee benchmark over %d selections:" % iterations)
+    logger.info("    projection (first):  %.4fs, %d vertices" % (first_time, selection_size(projection_list)))
+    logger.info("    projection (cached): %.4fs" % projection_time)
+    logger.info("    selectFromScreen:    %.4fs, %d vertices" % (screen_time, selection_size(screen_list)))
+    return (first_time, projection_time, screen_time)
+
 # command
 class MarqueeContextCmd (OpenMayaUI.MPxContextCommand):
     """
@@ -42,8 +250,14 @@ class MarqueeContextCmd (OpenMayaUI.MPxContextCommand):
     """
     kPluginCmdName = "marqueeToolContext"
 
+    kProjectionSelectFlag = "-ps"
+    kProjectionSelectFlagLong = "-projectionSelect"
+    kBackfaceCullingFlag = "-bfc"
+    kBackfaceCullingFlagLong = "-backfaceCulling"
+
     def __init__(self):
         OpenMayaUI.MPxContextCommand.__init__(self)
+        self.context = None
 
     @classmethod
     def creator(cls):
@@ -56,7 +270,36 @@ class MarqueeContextCmd (OpenMayaUI.MPxContextCommand):
         """
         This factory method creates an instance of the MarqueeContext class.
         """
-        return MarqueeContext()
+        self.context = MarqueeContext()
+        return self.context
+
+    def appendSyntax(self):
+        """
+        Add the flags choosing how the context selects.
+        """
+        syntax = self.syntax()
+        syntax.addFlag(MarqueeContextCmd.kProjectionSelectFlag, MarqueeContextCmd.kProjectionSelectFlagLong, OpenMaya.MSyntax.kBoolean)
+        syntax.addFlag(MarqueeContextCmd.kBackfaceCullingFlag, MarqueeContextCmd.kBackfaceCullingFlagLong, OpenMaya.MSyntax.kBoolean)
+
+    def doEditFlags(self):
+        """
+        Set the selection options of the context.
+        """
+        parser = self.parser()
+        if parser.isFlagSet(MarqueeContextCmd.kProjectionSelectFlag):
+            self.context.projection_select = parser.flagArgumentBool(MarqueeContextCmd.kProjectionSelectFlag, 0)
+        if parser.isFlagSet(MarqueeContextCmd.kBackfaceCullingFlag):
+            self.context.projection_marquee.backface_culling = parser.flagArgumentBool(MarqueeContextCmd.kBackfaceCullingFlag, 0)
+
+    def doQueryFlags(self):
+        """
+        Return the selection options of the context.
+        """
+        parser = self.parser()
+        if parser.isFlagSet(MarqueeContextCmd.kProjectionSelectFlag):
+            self.setResult(self.context.projection_select)
+        elif parser.isFlagSet(MarqueeContextCmd.kBackfaceCullingFlag):
+            self.setResult(self.context.projection_marquee.backface_culling)
 
 class MarqueeContext(OpenMayaUI.MPxContext):
     """
@@ -81,6 +324,8 @@ class MarqueeContext(OpenMayaUI.MPxContext):
         self.fs_drawn = False
         self.list_adjustment = 0
         self.view = None
+        self.projection_select = False
+        self.projection_marquee = ProjectionMarquee()
         self.setTitleString('Marquee Tool')
         self.setImage('marqueeTool.xpm', OpenMayaUI.MPxContext.kImage1)
 
@@ -97,6 +342,13 @@ class MarqueeContext(OpenMayaUI.MPxContext):
         """
         self.setHelpString( MarqueeContext.helpString )
 
+    def toolOffCleanup( self ):
+        """
+        Release the meshes cached by the projection marquee when the tool is
+        put away.
+        """
+        self.projection_marquee.clear()
+
     def check_event( self, event ):
         """
         Print out some information for the given event, such as its position which button
@@ -152,6 +404,16 @@ class MarqueeContext(OpenMayaUI.MPxContext):
         # Get the end position of the marquee
         self.last = event.position
 
+        # Marquees over the vertices of hilited meshes can be done without
+        # selectFromScreen, by projecting the cached mesh points.
+        if ( self.projection_select and
+             (math.fabs(self.start[0] - self.last[0]) >= 2 or math.fabs(self.start[1] - self.last[1]) >= 2) and
+             self.projection_marquee.can_select() ):
+            view = OpenMayaUI.M3dView.active3dView()
+            marquee_list = self.projection_marquee.select(view, self.start[0], self.start[1], self.last[0], self.last[1])
+            OpenMaya.MGlobal.selectCommand(marquee_list, self.list_adjustment)
+            return
+
         # Save the state of the current selections.  The "selectFromSceen"
         # below will alter the active list, and we have to be able to put
         # it back.
@@ -0,0 +1,344 @@
+import sys
+import json
+import math
+import itertools
+from array import array
+
+from profilerDump import ProfilerCapture
+
+__all__ = [ 'profilerLoadCapture', 'profilerAnalyze', 'profilerPrintReport', 'profilerDiff', 'profilerPrintDiff']
+
+#
+# The following is sample code which post-processes captures written by profilerDump.py
+# to find where time is spent, without needing a Maya session holding the profiler data.
+#
+# For each event name and each category it reports the number of events, the total,
+# mean and 50th/95th/99th percentile durations, and the self time: the duration of an
+# event minus the durations of the events directly nested inside it on the same thread.
+#
+# Durations are in the units of the capture's "duration" field. Nesting is worked out
+# from "time" and "tDuration", which are both in profiler ticks.
+#
+# Two captures can also be compared, e.g. before and after a rig or plugin upgrade,
+# to find the events which got slower. The comparison is written as JSON so it can
+# gate a build:
+#
+#	mayapy profilerAnalysis.py before.json after.json diff.json
+#
+# exits with status 1 when any event name or category got slower beyond the noise
+# thresholds.
+#
+
+sPercentiles = (50, 95, 99)
+
+def profilerLoadCapture(fileName):
+	"""
+	 	fileName : profilerToJSON file or binary capture written by profilerToBinary
+
+		Description:
+			Loads either kind of capture as a ProfilerCapture. Binary captures are
+			memory mapped, JSON files are streamed.
+
+		Example usage:
+			> capture = profilerLoadCapture('profiler.mprf')
+	"""
+	return ProfilerCapture.open(fileName)
+
+def percentile(sortedValues, p):
+	"""
+		Description:
+			Nearest rank percentile of an ascending sequence.
+	"""
+	if not sortedValues:
+		return 0
+	rank = int(math.ceil(p / 100.0 * len(sortedValues)))
+	return sortedValues[min(max(rank, 1), len(sortedValues)) - 1]
+
+def selfDurations(capture):
+	"""
+		Description:
+			Returns an array with the self duration of every event in the capture.
+			Self durations are clamped at zero since timer resolution can make the
+			children of an event add up to more than the event itself.
+
+			Events are grouped per thread and ordered by start time, longest first
+			when they start together. A stack of open events then gives the parent
+			of each event, whose self duration loses the child's duration.
+			Children which outlast their parent are still counted as nested.
+	"""
+	times = capture.columnArray('time')
+	threadDurations = capture.columnArray('tDuration')
+	durations = capture.columnArray('duration')
+	threadIds = capture.columnArray('tId')
+	selfTimes = array('d', durations)
+
+	threads = {}
+	for i, threadId in enumerate(threadIds):
+		indices = threads.get(threadId)
+		if indices is None:
+			indices = threads[threadId] = []
+		indices.append(i)
+
+	for indices in threads.itervalues():
+		# Two stable sorts order by start time, then longest first
+		indices.sort(key=threadDurations.__getitem__, reverse=True)
+		indices.sort(key=times.__getitem__)
+
+		openEnds = []
+		openEvents = []
+		for i, start in itertools.izip(indices, map(times.__getitem__, indices)):
+			while openEnds and openEnds[-1] <= start:
+				openEnds.pop()
+				openEvents.pop()
+			if openEvents:
+				selfTimes[openEvents[-1]] -= durations[i]
+			openEnds.append(start + threadDurations[i])
+			openEvents.append(i)
+
+	for i in xrange(len(selfTimes)):
+		if selfTimes[i] < 0.0:
+			selfTimes[i] = 0.0
+	return selfTimes
+
+def groupStats(groupIndices, durations, selfTimes):
+	"""
+		groupIndices : column assigning each event to a group, 0 to the number of groups - 1
+		durations : duration of each event
+		selfTimes : self duration of each event
+
+		Description:
+			Returns count, total, mean, percentile and self time statistics per group.
+	"""
+	if not len(groupIndices):
+		return {}
+	groupCount = max(groupIndices) + 1
+	groupDurations = [array(durations.typecode) for group in xrange(groupCount)]
+	groupAppends = [values.append for values in groupDurations]
+	groupSelf = [0.0] * groupCount
+	for group, duration, selfDuration in itertools.izip(groupIndices, durations, selfTimes):
+		groupAppends[group](duration)
+		groupSelf[group] += selfDuration
+
+	stats = {}
+	for group, values in enumerate(groupDurations):
+		if not values:
+			continue
+		values = sorted(values)
+		count = len(values)
+		total = sum(values)
+		entry = {
+			'count' : count,
+			'total' : total,
+			'mean' : total / float(count),
+			'selfTotal' : groupSelf[group],
+			'selfMean' : groupSelf[group] / count }
+		for p in sPercentiles:
+			entry['p%d' % p] = percentile(values, p)
+		stats[group] = entry
+	return stats
+
+def analyzeCapture(capture):
+	"""
+		Description:
+			Returns the report for a ProfilerCapture, see profilerAnalyze().
+	"""
+	durations = capture.columnArray('duration')
+	nameIndices = capture.columnArray('nameIdx')
+	categoryIndices = capture.columnArray('catIdx')
+	selfTimes = selfDurations(capture)
+
+	eventNames = {}
+	for nameIndex, stats in groupStats(nameIndices, durations, selfTimes).iteritems():
+		eventNames[capture.eventNames[nameIndex]] = stats
+	categories = {}
+	for categoryIndex, stats in groupStats(categoryIndices, durations, selfTimes).iteritems():
+		categories[capture.categories[categoryIndex]] = stats
+
+	# Category of each event name, from its first event
+	for nameIndex, categoryIndex in itertools.izip(nameIndices, categoryIndices):
+		stats = eventNames[capture.eventNames[nameIndex]]
+		if 'category' not in stats:
+			stats['category'] = capture.categories[categoryIndex]
+
+	return {
+		'version' : 1,
+		'eventsAnalyzed' : len(durations),
+		'eventNames' : eventNames,
+		'categories' : categories }
+
+def profilerAnalyze(fileName, reportFileName=None):
+	"""
+	 	fileName : profilerToJSON file or binary capture to analyze
+		reportFileName : optional file to write the report to as JSON
+
+		Description:
+			Computes per event name and per category statistics for a capture.
+			The report is a dictionary:
+				"eventsAnalyzed" : number of events in the capture
+				"eventNames" : event name -> statistics, including the event's "category"
+				"categories" : category name -> statistics
+			where statistics hold "count", "total", "mean", "p50", "p95", "p99",
+			"selfTotal" and "selfMean".
+
+		Example usage:
+			> report = profilerAnalyze('profiler.mprf', 'profilerReport.json')
+			> profilerPrintReport(report)
+	"""
+	capture = profilerLoadCapture(fileName)
+	report = analyzeCapture(capture)
+	capture.close()
+	report['source'] = fileName
+
+	if reportFileName:
+		file = open(reportFileName, "w")
+		json.dump(report, file, sort_keys=True, indent=4, separators=(',', ': '))
+		file.close()
+	return report
+
+def profilerPrintReport(report, sortBy='selfTotal', limit=20):
+	"""
+	 	report : report returned by profilerAnalyze()
+		sortBy : statistic to rank event names and categories by
+		limit : number of event names to print
+
+		Example usage:
+			> profilerPrintReport(profilerAnalyze('profiler.json'), 'p99')
+	"""
+	columns = ('count', 'total', 'mean', 'p50', 'p95', 'p99', 'selfTotal', 'selfMean')
+	for title, table, rows in (('Event Name', report['eventNames'], limit), ('Category', report['categories'], None)):
+		print('%-40s' % title + ''.join('%14s' % column for column in columns))
+		ranked = sorted(table.iteritems(), key=lambda item: item[1][sortBy], reverse=True)
+		for name, stats in ranked[:rows]:
+			print('%-40s' % name[:40] + ''.join('%14.1f' % stats[column] for column in columns))
+		print('')
+
+
+# Capture diffing
+# ---------------
+#
+sDiffMetrics = ('count', 'total', 'mean', 'p50', 'p95', 'p99', 'selfTotal', 'selfMean')
+
+def diffStats(baseTable, newTable, metric, relativeThreshold, absoluteThreshold, minCount):
+	"""
+		Description:
+			Aligns two statistics tables by name and returns a list of entries with
+			the base and new value, delta and ratio of every metric, and a status:
+			"slower", "faster", "unchanged", "added" or "removed". Entries are sorted
+			by decreasing delta of the chosen metric.
+
+			A change only counts when the metric moved by more than absoluteThreshold
+			and by more than relativeThreshold of its base value, with at least
+			minCount events on both sides.
+	"""
+	entries = []
+	for name in set(baseTable) | set(newTable):
+		base = baseTable.get(name)
+		new = newTable.get(name)
+		entry = { 'name' : name }
+		category = (new or base).get('category')
+		if category is not None:
+			entry['category'] = category
+		for column in sDiffMetrics:
+			baseValue = base[column] if base else 0
+			newValue = new[column] if new else 0
+			entry[column] = {
+				'base' : baseValue,
+				'new' : newValue,
+				'delta' : newValue - baseValue,
+				'ratio' : (float(newValue) / baseValue) if baseValue else None }
+
+		if base is None:
+			entry['status'] = 'added'
+		elif new is None:
+			entry['status'] = 'removed'
+		else:
+			delta = entry[metric]['delta']
+			baseValue = entry[metric]['base']
+			significant = abs(delta) > absoluteThreshold and (not baseValue or abs(delta) > relativeThreshold * abs(baseValue))
+			if not significant or min(base['count'], new['count']) < minCount:
+				entry['status'] = 'unchanged'
+			elif delta > 0:
+				entry['status'] = 'slower'
+			else:
+				entry['status'] = 'faster'
+		entries.append(entry)
+
+	entries.sort(key=lambda entry: entry[metric]['delta'], reverse=True)
+	return entries
+
+def profilerDiff(base, new, diffFileName=None, metric='total', relativeThreshold=0.05, absoluteThreshold=0, minCount=1):
+	"""
+	 	base : capture file or profilerAnalyze() report of the reference run
+		new : capture file or profilerAnalyze() report of the run to check
+		diffFileName : optional file to write the comparison to as JSON
+		metric : statistic which decides whether an event got slower or faster
+		relativeThreshold : changes smaller than this fraction of the base value are noise
+		absoluteThreshold : changes no larger than this, in duration units, are noise
+		minCount : events with fewer occurrences in either run are never flagged
+
+		Description:
+			Compares two captures per event name and per category. The result is a
+			dictionary with the settings used, "eventNames" and "categories" lists
+			of entries as described in diffStats(), a "summary" with the number of
+			entries of each status per table, and "passed", which is False when any
+			event name or category got slower.
+
+		Example usage:
+			> diff = profilerDiff('before.mprf', 'after.mprf', 'diff.json', 'p95', 0.1, 50)
+			> profilerPrintDiff(diff)
+	"""
+	if not isinstance(base, dict):
+		base = profilerAnalyze(base)
+	if not isinstance(new, dict):
+		new = profilerAnalyze(new)
+
+	diff = {
+		'version' : 1,
+		'base' : base.get('source'),
+		'new' : new.get('source'),
+		'metric' : metric,
+		'relativeThreshold' : relativeThreshold,
+		'absoluteThreshold' : absoluteThreshold,
+		'minCount' : minCount,
+		'summary' : {} }
+	for table in ('eventNames', 'categories'):
+		entries = diffStats(base[table], new[table], metric, relativeThreshold, absoluteThreshold, minCount)
+		diff[table] = entries
+		summary = dict((status, 0) for status in ('slower', 'faster', 'unchanged', 'added', 'removed'))
+		for entry in entries:
+			summary[entry['status']] += 1
+		diff['summary'][table] = summary
+	diff['passed'] = not diff['summary']['eventNames']['slower'] and not diff['summary']['categories']['slower']
+
+	if diffFileName:
+		file = open(diffFileName, "w")
+		json.dump(diff, file, sort_keys=True, indent=4, separators=(',', ': '))
+		file.close()
+	return diff
+
+def profilerPrintDiff(diff, limit=20):
+	"""
+	 	diff : comparison returned by profilerDiff()
+		limit : number of changed event names to print
+
+		Example usage:
+			> profilerPrintDiff(profilerDiff('before.json', 'after.json'))
+	"""
+	metric = diff['metric']
+	for title, table, rows in (('Event Name', diff['eventNames'], limit), ('Category', diff['categories'], None)):
+		print('%-40s%10s%16s%16s%16s%10s' % (title, 'status', 'base ' + metric, 'new ' + metric, 'delta', 'ratio'))
+		changed = [entry for entry in table if entry['status'] != 'unchanged']
+		for entry in changed[:rows]:
+			values = entry[metric]
+			ratio = '%10.2f' % values['ratio'] if values['ratio'] is not None else '%10s' % '-'
+			print('%-40s%10s%16.1f%16.1f%+16.1f' % (entry['name'][:40], entry['status'], values['base'], values['new'], values['delta']) + ratio)
+		print('')
+	print('PASSED' if diff['passed'] else 'FAILED')
+
+if __name__ == "__main__":
+	if len(sys.argv) < 3:
+		print('usage: profilerAnalysis.py base new [diff.json]')
+		sys.exit(2)
+	diff = profilerDiff(sys.argv[1], sys.argv[2], sys.argv[3] if len(sys.argv) > 3 else None)
+	profilerPrintDiff(diff)
+	sys.exit(0 if diff['passed'] else 1)
@@ -1,8 +1,27 @@
 import maya.OpenMaya as om
 import json
 import csv
+import os
+import re
+import sys
+import time
+import heapq
+import mmap
+import struct
+import ctypes
+import tempfile
+import itertools
+import operator
+import multiprocessing
+import cStringIO
+from array import array
 
-__all__ = [ 'profilerToJSON', 'profilerToCSV', 'profilerFormatJSON']
+__all__ = [ 'profilerToJSON', 'profilerToCSV', 'profilerFormatJSON', 'profilerBenchmarkJSON',
+	'profilerToBinary', 'profilerLoadBinary', 'profilerJSONToBinary', 'profilerBinaryToJSON',
+	'profilerToJSONParallel', 'profilerToCSVParallel', 'profilerBenchmarkParallel',
+	'profilerToJSONIncremental', 'profilerToCSVIncremental', 'profilerResetIncremental',
+	'profilerToLOD', 'profilerCaptureToLOD', 'EventFilter',
+	'profilerToTrace', 'profilerCaptureToTrace']
 
 #
 # The following is sample code which uses the OpenMaya API to show how
@@ -11,15 +30,341 @@ __all__ = [ 'profilerToJSON', 'profilerToCSV', 'profilerFormatJSON']
 # Note that references to Maya's profiler output format are valid at the time of writing.
 #
 # The format's chosen to illustrate this are JSON and CSV. For each sample output is provided.
+# A compact columnar binary format is also provided for very large captures.
+
+stripped = lambda s: "".join(i for i in s if 31 < ord(i) < 127)
+
+# Event name and category lookup tables
+# -------------------------------------
+#
+# Event names come back from the profiler as raw byte strings which need to be
+# decoded and stripped of non printable characters before they can be written out.
+# Captures typically contain millions of events but only a few hundred distinct
+# names, so the decoded name and its index are cached per raw name and each event
+# only costs a dictionary lookup.
+#
+class EventNameTable(object):
+	"""
+		Description:
+			Interns event names in order of first appearance, after any names
+			given up front. names[index(rawName)] is the decoded and stripped name.
+	"""
+	def __init__(self, names=()):
+		self.names = list(names)
+		self.nameIndex = dict((name, idx) for idx, name in enumerate(self.names))
+		self.rawIndex = {}
+
+	def index(self, rawName):
+		idx = self.rawIndex.get(rawName)
+		if idx is None:
+			# Different raw names may strip to the same printable name
+			eventName = stripped(rawName.decode('ascii', 'replace'))
+			idx = self.nameIndex.get(eventName)
+			if idx is None:
+				idx = len(self.names)
+				self.nameIndex[eventName] = idx
+				self.names.append(eventName)
+			self.rawIndex[rawName] = idx
+		return idx
+
+class CategoryTable(object):
+	"""
+		Description:
+			Maps profiler category ids to indices in the category name list
+			returned by getAllCategories(), after any names given up front.
+			Names which are not in that list are appended so that every index
+			stays valid.
+	"""
+	def __init__(self, profiler, names=()):
+		self.profiler = profiler
+		self.names = list(names)
+		self.nameIndex = dict((name, idx) for idx, name in enumerate(self.names))
+		self.idIndex = {}
+		categories = []
+		profiler.getAllCategories(categories)
+		for categoryName in categories:
+			if categoryName not in self.nameIndex:
+				self.nameIndex[categoryName] = len(self.names)
+				self.names.append(categoryName)
+
+	def index(self, categoryId):
+		idx = self.idIndex.get(categoryId)
+		if idx is None:
+			categoryName = self.profiler.getCategoryName(categoryId)
+			idx = self.nameIndex.get(categoryName)
+			if idx is None:
+				idx = len(self.names)
+				self.nameIndex[categoryName] = idx
+				self.names.append(categoryName)
+			self.idIndex[categoryId] = idx
+		return idx
+
+# Event filters
+# -------------
+#
+# Targeted exports often only want a small slice of a huge capture. Filters are tested
+# cheapest first, numeric fields before category and name lookups, and category and
+# name results are cached per category id and raw name, so rejected events never
+# have their name decoded or their description or color fetched.
+#
+class EventFilter(object):
+	"""
+		categories : collection of category names to keep, all if None
+		namePattern : regular expression, or compiled pattern, searched for in event names
+		threadIds : collection of thread ids to keep, all if None
+		timeWindow : (start, end) event times to keep, inclusive. Either may be None.
+
+		Description:
+			Selects the events to export. Durations are always compared against the
+			exporter's durationMin.
+
+		Example usage:
+			> profilerToJSON('vp2.json', True, 0.0, eventFilter=EventFilter(categories=['VP2 Evaluation'], namePattern='^Vp2Update'))
+	"""
+	def __init__(self, categories=None, namePattern=None, threadIds=None, timeWindow=None):
+		self.categories = set(categories) if categories is not None else None
+		if isinstance(namePattern, basestring):
+			namePattern = re.compile(namePattern)
+		self.namePattern = namePattern
+		self.threadIds = set(threadIds) if threadIds is not None else None
+		self.timeWindow = timeWindow
+
+	def indices(self, profiler, durationMin, candidates=None):
+		"""
+			profiler : event source
+			durationMin : only keep events which are longer than this
+			candidates : profiler indices to test, all events if None
+
+			Description:
+				Returns an array of the indices of the events which pass the filter.
+		"""
+		if candidates is None:
+			candidates = xrange(profiler.getEventCount())
+		getEventDuration = profiler.getEventDuration
+		getEventTime = profiler.getEventTime
+		getThreadId = profiler.getThreadId
+		getEventCategory = profiler.getEventCategory
+		getEventName = profiler.getEventName
+
+		timeStart, timeEnd = self.timeWindow or (None, None)
+		threadIds = self.threadIds
+		categories = self.categories
+		namePattern = self.namePattern
+		categoryAccepted = {}
+		nameAccepted = {}
+
+		accepted = array('i')
+		for i in candidates:
+			if getEventDuration(i) <= durationMin:
+				continue
+			if timeStart is not None or timeEnd is not None:
+				eventTime = getEventTime(i)
+				if (timeStart is not None and eventTime < timeStart) or (timeEnd is not None and eventTime > timeEnd):
+					continue
+			if threadIds is not None and getThreadId(i) not in threadIds:
+				continue
+			if categories is not None:
+				categoryId = getEventCategory(i)
+				keep = categoryAccepted.get(categoryId)
+				if keep is None:
+					keep = categoryAccepted[categoryId] = profiler.getCategoryName(categoryId) in categories
+				if not keep:
+					continue
+			if namePattern is not None:
+				rawName = getEventName(i)
+				keep = nameAccepted.get(rawName)
+				if keep is None:
+					keep = nameAccepted[rawName] = namePattern.search(stripped(rawName.decode('ascii', 'replace'))) is not None
+				if not keep:
+					continue
+			accepted.append(i)
+		return accepted
+
+# Streaming JSON helpers
+# ----------------------
+#
+# Long playback sessions produce captures of several gigabytes. These helpers write
+# and read the event list a piece at a time so neither export nor reformatting has
+# to hold the whole capture in memory.
+#
+def quoted(text):
+	"""
+		Description:
+			JSON string literal for text. Bytes outside of ASCII are replaced.
+	"""
+	if not text:
+		return '""'
+	if isinstance(text, str):
+		text = text.decode('ascii', 'replace')
+	return json.dumps(text)
+
+class ChunkedWriter(object):
+	"""
+		file : file object to write to
+		chunkSize : number of characters to buffer before writing
+
+		Description:
+			Collects small strings and hands them to the file in large chunks.
+	"""
+	def __init__(self, file, chunkSize=1 << 20):
+		self.file = file
+		self.chunkSize = chunkSize
+		self.chunks = []
+		self.size = 0
+
+	def write(self, text):
+		self.chunks.append(text)
+		self.size += len(text)
+		if self.size >= self.chunkSize:
+			self.flush()
+
+	def flush(self):
+		if self.chunks:
+			self.file.write("".join(self.chunks))
+			self.chunks = []
+			self.size = 0
+
+class JSONStreamReader(object):
+	"""
+		file : file object to read from
+		chunkSize : number of characters to read at a time
+
+		Description:
+			Incremental reader for a top level JSON object. Only the value being
+			decoded and the unread part of the current chunk are kept in memory.
+
+		Example usage:
+			> for key, value in JSONStreamReader(file).items():
+			>	if key == 'events':
+			>		for event in value:
+			>			...
+	"""
+	whitespace = re.compile(r'[ \t\n\r]*')
+
+	def __init__(self, file, chunkSize=1 << 20):
+		self.file = file
+		self.chunkSize = chunkSize
+		self.buffer = ''
+		self.pos = 0
+		self.decoder = json.JSONDecoder()
+
+	def fill(self):
+		data = self.file.read(self.chunkSize)
+		if not data:
+			return False
+		self.buffer = self.buffer[self.pos:] + data
+		self.pos = 0
+		return True
+
+	def peek(self):
+		# Next non whitespace character, or '' at the end of the file
+		while True:
+			self.pos = self.whitespace.match(self.buffer, self.pos).end()
+			if self.pos < len(self.buffer):
+				return self.buffer[self.pos]
+			if not self.fill():
+				return ''
+
+	def expect(self, characters):
+		c = self.peek()
+		if not c or c not in characters:
+			raise ValueError("Expected one of '%s' but found '%s'" % (characters, c))
+		self.pos += 1
+		return c
+
+	def value(self):
+		self.peek()
+		while True:
+			try:
+				value, end = self.decoder.raw_decode(self.buffer, self.pos)
+			except ValueError:
+				# Value is cut off at the end of the chunk
+				if self.fill():
+					continue
+				raise
+			# A number may continue in the next chunk
+			if end == len(self.buffer) and self.fill():
+				continue
+			self.pos = end
+			return value
+
+	def elements(self):
+		if self.peek() == ']':
+			self.pos += 1
+			return
+		while True:
+			yield self.value()
+			if self.expect(',]') == ']':
+				return
+
+	def items(self):
+		"""
+			Description:
+				Yields (key, value) pairs of the top level object. Array values are
+				yielded as generators which produce one element at a time.
+		"""
+		self.expect('{')
+		if self.peek() == '}':
+			self.pos += 1
+			return
+		while True:
+			key = self.value()
+			self.expect(':')
+			if self.peek() == '[':
+				self.pos += 1
+				elements = self.elements()
+				yield key, elements
+				# Skip whatever the caller did not consume
+				for element in elements:
+					pass
+			else:
+				yield key, self.value()
+			if self.expect(',}') == '}':
+				return
+
+class IndentedEventFormatter(object):
+	"""
+		indent : indentation of the event records
+
+		Description:
+			Formats event records the way json.dumps(sort_keys=True, indent=4) lays
+			them out inside the events list. json only uses its C encoder when keys
+			are not sorted, so the values of a record are encoded with a single
+			unsorted dump of a list and slotted into a template cached per key set.
+			Records with nested values fall back to json.dumps.
+	"""
+	def __init__(self, indent):
+		self.indent = indent
+		self.valueEncoder = json.JSONEncoder(separators=('\n', ': '))
+		self.templates = {}
+
+	def template(self, keys):
+		template = self.templates.get(keys)
+		if template is None:
+			fieldIndent = self.indent + '    '
+			fields = [fieldIndent + json.dumps(key).replace('%', '%%') + ': %s' for key in keys]
+			template = '{\n' + ',\n'.join(fields) + '\n' + self.indent + '}'
+			self.templates[keys] = template
+		return template
+
+	def format(self, event):
+		keys = tuple(sorted(event))
+		# Encoded scalars never contain a raw newline so the separator splits them apart
+		values = self.valueEncoder.encode([event[key] for key in keys])[1:-1].split('\n')
+		if keys and len(values) == len(keys) and not [value for value in values if value[:1] in '[{']:
+			return self.template(keys) % tuple(values)
+		return json.dumps(event, sort_keys=True, indent=4, separators=(',', ': ')).replace('\n', '\n' + self.indent)
 
 # Sample 1: Profiler to JSON output
 # ---------------------------------
 #
-def profilerToJSON(fileName, useIndex, durationMin):
+def profilerToJSON(fileName, useIndex, durationMin, profiler=om.MProfiler, eventFilter=None):
 	"""
 	 	fileName : name of file to write to disk
 		useIndex : write events using index lookup to category and name lists
 		durationMin : only write out events which have at least this minimum time duration
+		profiler : event source, om.MProfiler unless benchmarking with a SyntheticProfiler
+		eventFilter : optional EventFilter selecting which events to write
 
 		Description:
 			Sample code to extract profiler information and write to file in JSON format
@@ -98,9 +443,7 @@ def profilerToJSON(fileName, useIndex, durationMin):
 		# ]
 		# "eventsWritten": 364
 	#
-	stripped = lambda s: "".join(i for i in s if 31 < ord(i) < 127)
-
-	eventCount = om.MProfiler.getEventCount()
+	eventCount = profiler.getEventCount()
 	if eventCount == 0:
 		return
 
@@ -108,138 +451,239 @@ def profilerToJSON(fileName, useIndex, durationMin):
 	if not file:
 		return
 
+	# Select the events to write, then resolve their name and category indices in a
+	# single pass. Both lists are written out ahead of the events so they have to be
+	# complete first.
+	indices = (eventFilter or EventFilter()).indices(profiler, durationMin)
+	nameTable = EventNameTable()
+	categoryTable = CategoryTable(profiler)
+	nameIndices = array('i')
+	categoryIndices = array('i')
+	getEventName = profiler.getEventName
+	getEventCategory = profiler.getEventCategory
+	for i in indices:
+		nameIndices.append(nameTable.index(getEventName(i)))
+		categoryIndices.append(categoryTable.index(getEventCategory(i)))
+	eventNames = nameTable.names
+	categories = categoryTable.names
+
+	# Event time, Event Name / Event Index, Description , Category / Category index, Duration, Thread Duration, Thread id, Cpu id, Color id
+	def eventRecords():
+		for i, nameIndex, categoryIndex in itertools.izip(indices, nameIndices, categoryIndices):
+			yield (profiler.getEventTime(i), nameIndex, profiler.getDescription(i), categoryIndex, profiler.getEventDuration(i),
+				profiler.getThreadDuration(i), profiler.getThreadId(i), profiler.getCPUId(i), profiler.getColor(i))
+
+	writeJSONCapture(file, eventCount, profiler.getNumberOfCPUs(), categories, eventNames, useIndex, eventRecords())
+	file.close()
+
+def writeJSONCapture(file, eventCount, cpuCount, categories, eventNames, useIndex, records):
+	"""
+		file : file object to write to
+		eventCount : total number of events in the capture
+		cpuCount : number of CPUs
+		categories : list of category names
+		eventNames : list of event names
+		useIndex : write events using index lookup to category and name lists
+		records : iterable of (time, nameIdx, description, catIdx, duration, tDuration, tId, cpuId, colorId) tuples
+
+		Description:
+			Writes the profilerToJSON layout for any source of event records.
+			Returns the number of events written.
+	"""
+	writer = ChunkedWriter(file)
+	writeJSONHeader(writer, eventCount, cpuCount, categories, eventNames, useIndex)
+	eventFormat, nameValues, categoryValues = jsonEventFormat(useIndex, eventNames, categories)
+
+	# Each event is formatted into a single record and the writer batches records
+	# into large chunks instead of writing every field separately.
+	write = writer.write
+	separator = '\t{ '
+	eventsWritten = 0
+	for eventTime, nameIndex, description, categoryIndex, duration, threadDuration, threadId, cpuId, colorId in records:
+		eventsWritten = eventsWritten + 1
+		write(separator + eventFormat % (eventTime, nameValues[nameIndex], quoted(description), categoryValues[categoryIndex],
+			duration, threadDuration, threadId, cpuId, colorId))
+		separator = '\t,{ '
+
+	writeJSONFooter(writer, eventsWritten)
+	writer.flush()
+	return eventsWritten
 
-	file.write("{\n")
+def writeJSONHeader(writer, eventCount, cpuCount, categories, eventNames, useIndex):
+	writer.write("{\n")
 
 	# Output version
-	file.write("\t\"version\": 1,\n")
+	writer.write("\t\"version\": 1,\n")
 	# Output event count
-	file.write("\t\"eventCount\": " + str(eventCount) + ",\n")
+	writer.write("\t\"eventCount\": " + str(eventCount) + ",\n")
 	# Output number of CPUS. Missing from Python API
-	file.write("\t\"cpuCount\": " + str(om.MProfiler.getNumberOfCPUs()) + ",\n")
+	writer.write("\t\"cpuCount\": " + str(cpuCount) + ",\n")
 
 	# Output event categories if using indexing lookup
-	categories = []
-	om.MProfiler.getAllCategories(categories)
-	asciiString = json.dumps(categories, True, True)
 	if useIndex:
-		file.write("\t\"categories\": " + asciiString + ",\n")
+		asciiString = json.dumps(categories, True, True)
+		writer.write("\t\"categories\": " + asciiString + ",\n")
 
 	# Output event name list if using indexing
-	nameDict = {}
-	for i in range(0, eventCount, 1):
-		eventName = om.MProfiler.getEventName(i)
-		eventName = eventName.decode('ascii', 'replace')
-		eventName = stripped(eventName)
-		if eventName not in nameDict:
-			nameDict[eventName] = len(nameDict)
 	if useIndex:
-		nameString = json.dumps(nameDict.keys(), True, True)
-		file.write('\t\"eventNames\" : ' + nameString + ",\n")
+		nameString = json.dumps(eventNames, True, True)
+		writer.write('\t\"eventNames\" : ' + nameString + ",\n")
 
 	# Write out each event:
 	# Event time, Event Name / Event Index, Description , Category / Category index, Duration, Thread Duration, Thread id, Cpu id, Color id
-	file.write('\t\"events\": [\n')
-	dumped = False
-	eventsWritten = 0
-	for i in range(0, eventCount):
-
-		duration = om.MProfiler.getEventDuration(i)
-		if duration > durationMin:
-			eventsWritten = eventsWritten + 1
-
-			eventTime = om.MProfiler.getEventTime(i)
-			eventName = om.MProfiler.getEventName(i)
-			eventName = eventName.decode('ascii', 'replace')
-			eventName = stripped(eventName)
-			if useIndex:
-				eventNameIndex = nameDict.keys().index(eventName)
-
-			description = ''
-			if om.MProfiler.getDescription(i):
-				description = om.MProfiler.getDescription(i)
-
-			eventCategory = om.MProfiler.getEventCategory(i)
-			eventCategoryName = om.MProfiler.getCategoryName(eventCategory)
-			if useIndex:
-				eventCatagoryIndex = categories.index(eventCategoryName)
-
-			threadDuration = om.MProfiler.getThreadDuration(i)
+	writer.write('\t\"events\": [\n')
 
-			threadId = om.MProfiler.getThreadId(i)
-
-			cpuId = om.MProfiler.getCPUId(i)
-
-			colorId = om.MProfiler.getColor(i)
-
-			# Instead of using json library, the code just writes on the fly
-			if dumped:
-				file.write('\t,{ ')
-			else:
-				file.write('\t{ ')
-			dumped = True
-			file.write('\"time\" : ' + str(eventTime) + ', ')
-			if useIndex:
-				file.write('\"nameIdx\" : ' + str(eventNameIndex) + ', ')
-			else:
-				file.write('\"name\" : \"' + eventName + '\", ')
-			file.write('\"desc\" : \"' + str(description) + '\", ')
-			if useIndex:
-				file.write('\"catIdx\" : ' + str(eventCatagoryIndex) + ', ')
-			else:
-				file.write('\"category\" : \"' + eventCategoryName + '\", ')
-			file.write('\"duration\" : ' + str(duration) + ', ')
-			file.write('\"tDuration\" : ' + str(threadDuration) + ', ')
-			file.write('\"tId\" : ' + str(threadId) + ', ')
-			file.write('\"cpuId\" : ' + str(cpuId) + ', ')
-			file.write('\"colorId\" : ' + str(colorId) + '')
-			file.write('\t}\n')
+def jsonEventFormat(useIndex, eventNames, categories):
+	"""
+		Description:
+			Returns the record template for one event, which follows its '\\t{ ' or
+			'\\t,{ ' separator, and the values substituted for name and category indices.
+	"""
+	if useIndex:
+		eventFormat = '"time" : %d, "nameIdx" : %s, "desc" : %s, "catIdx" : %s, "duration" : %d, "tDuration" : %d, "tId" : %d, "cpuId" : %d, "colorId" : %d\t}\n'
+		nameValues = range(len(eventNames))
+		categoryValues = range(len(categories))
+	else:
+		eventFormat = '"time" : %d, "name" : %s, "desc" : %s, "category" : %s, "duration" : %d, "tDuration" : %d, "tId" : %d, "cpuId" : %d, "colorId" : %d\t}\n'
+		nameValues = [quoted(name) for name in eventNames]
+		categoryValues = [quoted(name) for name in categories]
+	return eventFormat, nameValues, categoryValues
 
-	file.write("\t],\n")
-	file.write("\t\"eventsWritten\": " + str(eventsWritten) + "\n")
-	file.write("}\n")
-	file.close()
+def writeJSONFooter(writer, eventsWritten):
+	writer.write("\t],\n")
+	writer.write("\t\"eventsWritten\": " + str(eventsWritten) + "\n")
+	writer.write("}\n")
 
-def profilerFormatJSON(fileName, fileName2):
+def profilerFormatJSON(fileName, fileName2, sortBy=None, chunkEvents=250000):
 	"""
 	 	fileName : name of file to read
 		fileName2 : name of file to write to
+		sortBy : optional event key, e.g. 'time' or 'duration', to sort the events by
+		chunkEvents : maximum number of events held in memory at once
 
 		Description:
 			Simple utility code to read a JSON file sort and format it before
 			writing to a secondary file.
 
+			The file is streamed so captures larger than memory can be formatted.
+			Events are spilled to temporary files in chunks of chunkEvents, each
+			chunk sorted by sortBy if given, and merged back while writing. The
+			output matches json.dumps(result, sort_keys=True, indent=4) with
+			separators=(',', ': ').
+
 		Example:
 			> profilerFormatJSON('profilerIn.json', 'profilerFormatted.json')
+			> profilerFormatJSON('profilerIn.json', 'profilerByTime.json', 'time')
 
 	"""
 	file = open(fileName, "r")
 	if not file:
 		return
 
-	result = json.load(file)
+	# Events are formatted as they are read and spilled to temporary files, so only
+	# the small header values and one chunk of events are ever held in memory.
+	header = {}
+	runs = []
+	haveEvents = False
+	formatter = IndentedEventFormatter('        ')
+	for key, value in JSONStreamReader(file).items():
+		if key != 'events' or not hasattr(value, 'next'):
+			header[key] = list(value) if hasattr(value, 'next') else value
+			continue
+		haveEvents = True
+		chunk = []
+		for event in value:
+			chunk.append((event.get(sortBy) if sortBy else None, formatter.format(event)))
+			if len(chunk) == chunkEvents:
+				runs.append(spillEvents(chunk, sortBy))
+				chunk = []
+		if chunk:
+			runs.append(spillEvents(chunk, sortBy))
 	file.close()
 
-	dump = json.dumps(result, sort_keys=True, indent=4)
-
 	file2 = open(fileName2, "w")
 	if not file2:
 		return
 
-	file2.write(dump)
+	writer = ChunkedWriter(file2)
+	if haveEvents:
+		header['events'] = None
+	separator = '{\n'
+	for key in sorted(header):
+		writer.write(separator + '    ' + json.dumps(key) + ': ')
+		separator = ',\n'
+		if key != 'events' or not haveEvents:
+			writer.write(json.dumps(header[key], sort_keys=True, indent=4, separators=(',', ': ')).replace('\n', '\n    '))
+			continue
+		eventSeparator = '[\n        '
+		for record in mergeEvents(runs, sortBy):
+			writer.write(eventSeparator + record)
+			eventSeparator = ',\n        '
+		writer.write('[]' if eventSeparator == '[\n        ' else '\n    ]')
+	writer.write('{}' if separator == '{\n' else '\n}')
+	writer.flush()
 	file2.close()
 
+	for run in runs:
+		run.close()
+
+def spillEvents(chunk, sortBy):
+	"""
+		chunk : list of (sort value, formatted record) pairs
+
+		Description:
+			Writes a chunk of formatted records, sorted if sortBy is given, to a
+			temporary file. Records are stored one per line with their newlines
+			replaced by '\\x1f', which JSON never contains unescaped. The sort value
+			is kept in front of each record for the merge.
+	"""
+	if sortBy:
+		chunk.sort(key=lambda pair: pair[0])
+	run = tempfile.TemporaryFile("w+")
+	writer = ChunkedWriter(run)
+	for sortValue, record in chunk:
+		if sortBy:
+			writer.write(json.dumps(sortValue) + '\t')
+		writer.write(record.replace('\n', '\x1f') + '\n')
+	writer.flush()
+	run.seek(0)
+	return run
+
+def mergeEvents(runs, sortBy):
+	"""
+		Description:
+			Reads the spilled records back in order, merging the runs on their
+			sort value. Events with equal sort values keep their original order.
+	"""
+	if not sortBy:
+		for run in runs:
+			for line in run:
+				yield line[:-1].replace('\x1f', '\n')
+		return
+
+	def readRun(runIndex, run):
+		for seq, line in enumerate(run):
+			sortValue, record = line.split('\t', 1)
+			yield (json.loads(sortValue), runIndex, seq, record)
+
+	for sortValue, runIndex, seq, record in heapq.merge(*[readRun(runIndex, run) for runIndex, run in enumerate(runs)]):
+		yield record[:-1].replace('\x1f', '\n')
+
 
 
 
 # Sample 1: Profiler to CSV output
 # ---------------------------------
 #
-def profilerToCSV(fileName, durationMin):
+sCSVHead = ( 'Event Time', 'Event Name', 'Description', 'Event Category', 'Duration', 'Thread Duration', 'Thread Id', 'CPU Id', 'Color Id' )
+
+def profilerToCSV(fileName, durationMin, profiler=om.MProfiler, eventFilter=None):
 	"""
 	 	fileName : name of file to write to disk
 		useIndex : write events using index lookup to category and name lists
 		durationMin : only write out events which have at least this minimum time duration
+		profiler : event source, om.MProfiler unless benchmarking with a SyntheticProfiler
+		eventFilter : optional EventFilter selecting which events to write
 
 		Description:
 			Sample to output profiler event information only to CSV format.
@@ -258,9 +702,7 @@ def profilerToCSV(fileName, durationMin):
 	# 25620058332,"sendAttributeChangedMsg","","Change",7,6844,6972,0,12
 	# ... <more events> ...
 	#
-	stripped = lambda s: "".join(i for i in s if 31 < ord(i) < 127)
-	
-	eventCount = om.MProfiler.getEventCount()
+	eventCount = profiler.getEventCount()
 	if eventCount == 0:
 		return
 
@@ -273,41 +715,1185 @@ def profilerToCSV(fileName, durationMin):
 	# Write out each event:
 	# Event time, Event Name / Event Index, Description , Category / Category index, Duration, Thread Duration, Thread id, Cpu id, Color id
 
-	head = ( 'Event Time', 'Event Name', 'Description', 'Event Category', 'Duration', 'Thread Duration', 'Thread Id', 'CPU Id', 'Color Id' )
-	csvWriter.writerow(head)
+	csvWriter.writerow(sCSVHead)
+
+	nameTable = EventNameTable()
+	categoryTable = CategoryTable(profiler)
+	for i in (eventFilter or EventFilter()).indices(profiler, durationMin):
 
-	for i in range(0, eventCount):
+		duration = profiler.getEventDuration(i)
 
-		duration = om.MProfiler.getEventDuration(i)
-		if duration > durationMin:
+		eventTime = profiler.getEventTime(i)
+		eventName = nameTable.names[nameTable.index(profiler.getEventName(i))]
 
-			eventTime = om.MProfiler.getEventTime(i)
-			eventName = om.MProfiler.getEventName(i)
-			eventName = eventName.decode('ascii', 'replace')
-			eventName = stripped(eventName)
-			
+		description = profiler.getDescription(i)
+		if not description:
 			description = ''
-			if om.MProfiler.getDescription(i):
-				description = om.MProfiler.getDescription(i)
 
-			eventCategory = om.MProfiler.getEventCategory(i)
-			eventCategoryName = om.MProfiler.getCategoryName(eventCategory)
+		eventCategory = profiler.getEventCategory(i)
+		eventCategoryName = categoryTable.names[categoryTable.index(eventCategory)]
 
-			threadDuration = om.MProfiler.getThreadDuration(i)
+		threadDuration = profiler.getThreadDuration(i)
 
-			threadId = om.MProfiler.getThreadId(i)
+		threadId = profiler.getThreadId(i)
 
-			cpuId = om.MProfiler.getCPUId(i)
+		cpuId = profiler.getCPUId(i)
 
-			colorId = om.MProfiler.getColor(i)
+		colorId = profiler.getColor(i)
 
-			row = ( eventTime, eventName, description, eventCategoryName, duration, threadDuration, threadId, cpuId, colorId )
+		row = ( eventTime, eventName, description, eventCategoryName, duration, threadDuration, threadId, cpuId, colorId )
 
-			csvWriter.writerow(row)
+		csvWriter.writerow(row)
 
 	file.close()
 
 
+# Sample 3: Profiler to columnar binary output
+# --------------------------------------------
+#
+# JSON and CSV are large and slow to parse once a capture holds millions of events.
+# The binary format stores each event field as a fixed width column so a capture can
+# be memory mapped and its columns used directly without parsing.
+#
+# Layout:
+#	8 bytes		magic "MPRFCOL1"
+#	4 bytes		little endian size of the JSON header
+#	header		JSON object with version, eventCount, cpuCount, eventsWritten, byteOrder,
+#				the string tables (categories, eventNames, descriptions) and, for each
+#				column, its name, type ("i4", "i8" or "f8") and byte offset in the file
+#	columns		eventsWritten values per column, each column aligned to 8 bytes
+#
+# Events reference the string tables by index through nameIdx, catIdx and descIdx.
+#
+sBinaryMagic = 'MPRFCOL1'
+sBinaryAlignment = 8
+
+def int64Typecode():
+	"""
+		Description:
+			Array typecode for 64 bit columns. Python 2 only supports 'q' on some
+			platforms and 'l' is 32 bit on Windows, where doubles are used instead.
+	"""
+	for typecode in ('q', 'l'):
+		try:
+			if array(typecode).itemsize == 8:
+				return typecode
+		except ValueError:
+			pass
+	return 'd'
+
+sColumnTypecodes = { 'i4' : 'i', 'i8' : int64Typecode(), 'f8' : 'd' }
+sColumnCTypes = { 'i4' : ctypes.c_int32, 'i8' : ctypes.c_int64, 'f8' : ctypes.c_double }
+
+def columnType(column):
+	"""
+		Description:
+			Storage type of an array or ctypes array column.
+	"""
+	if isinstance(column, array):
+		return { 'i' : 'i4', 'd' : 'f8' }.get(column.typecode, 'i8')
+	for columnType, ctype in sColumnCTypes.items():
+		if column._type_ is ctype:
+			return columnType
+	raise TypeError('Unsupported column type %s' % type(column))
+
+class ProfilerCapture(object):
+	"""
+		Description:
+			Columnar snapshot of profiler events. columns maps each field name to a
+			sequence with one value per written event: arrays while the capture is
+			being built, and ctypes arrays viewing the mapped file once loaded.
+			Loaded columns can be wrapped without copying by numpy.ctypeslib.as_array().
+
+		Example usage:
+			> capture = ProfilerCapture.fromProfiler(0.0)
+			> capture.save('profiler.mprf')
+			> capture = ProfilerCapture.load('profiler.mprf')
+			> capture.columns['duration'][0]
+	"""
+	sColumns = (
+		('time', 'i8'),
+		('duration', 'i8'),
+		('tDuration', 'i8'),
+		('tId', 'i8'),
+		('cpuId', 'i4'),
+		('colorId', 'i4'),
+		('nameIdx', 'i4'),
+		('catIdx', 'i4'),
+		('descIdx', 'i4'))
+
+	def __init__(self):
+		self.version = 1
+		self.eventCount = 0
+		self.cpuCount = 0
+		self.categories = []
+		self.eventNames = []
+		self.descriptions = ['']
+		self.descriptionIndex = { '' : 0 }
+		self.columns = dict((name, array(sColumnTypecodes[columnType])) for name, columnType in self.sColumns)
+		self.map = None
+
+	def __len__(self):
+		return len(self.columns['time'])
+
+	def columnArray(self, name):
+		"""
+			Description:
+				Returns a column as an array, copying a mapped column in one block.
+		"""
+		column = self.columns[name]
+		if isinstance(column, array):
+			return column
+		dataType = columnType(column)
+		values = array(sColumnTypecodes[dataType])
+		if dataType == 'i8' and values.typecode == 'd':
+			values.extend(column)
+		else:
+			values.fromstring(buffer(column))
+		return values
+
+	def descIndex(self, description):
+		if not description:
+			return 0
+		idx = self.descriptionIndex.get(description)
+		if idx is None:
+			idx = len(self.descriptions)
+			self.descriptionIndex[description] = idx
+			self.descriptions.append(description)
+		return idx
+
+	def append(self, eventTime, nameIndex, description, categoryIndex, duration, threadDuration, threadId, cpuId, colorId):
+		columns = self.columns
+		columns['time'].append(eventTime)
+		columns['duration'].append(duration)
+		columns['tDuration'].append(threadDuration)
+		columns['tId'].append(threadId)
+		columns['cpuId'].append(cpuId)
+		columns['colorId'].append(colorId)
+		columns['nameIdx'].append(nameIndex)
+		columns['catIdx'].append(categoryIndex)
+		columns['descIdx'].append(self.descIndex(description))
+
+	def records(self):
+		"""
+			Description:
+				Iterates events as the record tuples taken by writeJSONCapture().
+		"""
+		columns = self.columns
+		descriptions = self.descriptions
+		for eventTime, nameIndex, descIndex, categoryIndex, duration, threadDuration, threadId, cpuId, colorId in itertools.izip(
+				columns['time'], columns['nameIdx'], columns['descIdx'], columns['catIdx'], columns['duration'],
+				columns['tDuration'], columns['tId'], columns['cpuId'], columns['colorId']):
+			yield (eventTime, nameIndex, descriptions[descIndex], categoryIndex, duration, threadDuration, threadId, cpuId, colorId)
+
+	@classmethod
+	def fromProfiler(cls, durationMin, profiler=om.MProfiler, eventFilter=None):
+		"""
+			Description:
+				Snapshots events with at least durationMin duration, and which pass
+				the optional EventFilter, from the profiler.
+		"""
+		capture = cls()
+		capture.eventCount = profiler.getEventCount()
+		capture.cpuCount = profiler.getNumberOfCPUs()
+		nameTable = EventNameTable()
+		categoryTable = CategoryTable(profiler)
+		for i in (eventFilter or EventFilter()).indices(profiler, durationMin):
+			capture.append(profiler.getEventTime(i),
+				nameTable.index(profiler.getEventName(i)),
+				profiler.getDescription(i),
+				categoryTable.index(profiler.getEventCategory(i)),
+				profiler.getEventDuration(i),
+				profiler.getThreadDuration(i),
+				profiler.getThreadId(i),
+				profiler.getCPUId(i),
+				profiler.getColor(i))
+		capture.eventNames = nameTable.names
+		capture.categories = categoryTable.names
+		return capture
+
+	@classmethod
+	def fromJSON(cls, fileName):
+		"""
+			Description:
+				Reads a profilerToJSON file, indexed or not, streaming the events.
+		"""
+		capture = cls()
+		nameIndex = {}
+		categoryIndex = {}
+		def intern(table, index, name):
+			idx = index.get(name)
+			if idx is None:
+				idx = len(table)
+				index[name] = idx
+				table.append(name)
+			return idx
+
+		file = open(fileName, "r")
+		for key, value in JSONStreamReader(file).items():
+			if key == 'events':
+				for event in value:
+					if 'nameIdx' in event:
+						nameIdx = event['nameIdx']
+					else:
+						nameIdx = intern(capture.eventNames, nameIndex, event['name'])
+					if 'catIdx' in event:
+						catIdx = event['catIdx']
+					else:
+						catIdx = intern(capture.categories, categoryIndex, event['category'])
+					capture.append(event['time'], nameIdx, event.get('desc', ''), catIdx, event['duration'],
+						event['tDuration'], event['tId'], event['cpuId'], event['colorId'])
+			elif key == 'eventNames':
+				capture.eventNames = list(value)
+				nameIndex = dict((name, idx) for idx, name in enumerate(capture.eventNames))
+			elif key == 'categories':
+				capture.categories = list(value)
+				categoryIndex = dict((name, idx) for idx, name in enumerate(capture.categories))
+			elif key == 'eventCount':
+				capture.eventCount = value
+			elif key == 'cpuCount':
+				capture.cpuCount = value
+		file.close()
+		return capture
+
+	def toJSON(self, fileName, useIndex):
+		file = open(fileName, "w")
+		if not file:
+			return
+		writeJSONCapture(file, self.eventCount, self.cpuCount, self.categories, self.eventNames, useIndex, self.records())
+		file.close()
+
+	def save(self, fileName):
+		eventsWritten = len(self)
+		header = {
+			'version' : self.version,
+			'eventCount' : self.eventCount,
+			'cpuCount' : self.cpuCount,
+			'eventsWritten' : eventsWritten,
+			'byteOrder' : sys.byteorder,
+			'categories' : self.categories,
+			'eventNames' : self.eventNames,
+			'descriptions' : self.descriptions,
+			'columns' : [] }
+
+		# The header size depends on the column offsets, so lay the columns out
+		# after the header and move them along until the header fits in front.
+		columns = [(name, self.columns[name]) for name, defaultType in self.sColumns]
+		start = 0
+		while True:
+			columnOffset = start
+			header['columns'] = []
+			for name, column in columns:
+				header['columns'].append([name, columnType(column), columnOffset])
+				columnOffset += eventsWritten * ctypes.sizeof(sColumnCTypes[columnType(column)])
+				columnOffset += -columnOffset % sBinaryAlignment
+			headerText = json.dumps(header)
+			headerEnd = len(sBinaryMagic) + 4 + len(headerText)
+			if headerEnd <= start:
+				break
+			start = headerEnd + (-headerEnd % sBinaryAlignment)
+
+		file = open(fileName, "wb")
+		file.write(sBinaryMagic)
+		file.write(struct.pack('<I', len(headerText)))
+		file.write(headerText)
+		for (name, column), (name, dataType, columnOffset) in zip(columns, header['columns']):
+			file.write('\0' * (columnOffset - file.tell()))
+			if isinstance(column, array):
+				column.tofile(file)
+			else:
+				file.write(buffer(column))
+		file.close()
+
+	@classmethod
+	def load(cls, fileName):
+		"""
+			Description:
+				Memory maps a file written by save(). Columns are views onto the
+				mapping, so only the pages which are touched are read from disk.
+				Call close() when done with the columns.
+		"""
+		file = open(fileName, "rb")
+		if file.read(len(sBinaryMagic)) != sBinaryMagic:
+			file.close()
+			raise ValueError('%s is not a profiler binary capture' % fileName)
+		headerSize = struct.unpack('<I', file.read(4))[0]
+		header = json.loads(file.read(headerSize))
+
+		capture = cls()
+		capture.version = header['version']
+		capture.eventCount = header['eventCount']
+		capture.cpuCount = header['cpuCount']
+		capture.categories = header['categories']
+		capture.eventNames = header['eventNames']
+		capture.descriptions = header['descriptions']
+		eventsWritten = header['eventsWritten']
+
+		# A private copy-on-write mapping is writable, which ctypes needs to share the memory
+		capture.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_COPY)
+		file.close()
+		for name, columnType, columnOffset in header['columns']:
+			if header['byteOrder'] == sys.byteorder:
+				column = (sColumnCTypes[columnType] * eventsWritten).from_buffer(capture.map, columnOffset)
+			else:
+				column = array(sColumnTypecodes[columnType])
+				column.fromstring(capture.map[columnOffset:columnOffset + eventsWritten * column.itemsize])
+				column.byteswap()
+			capture.columns[name] = column
+		return capture
+
+	@classmethod
+	def open(cls, fileName):
+		"""
+			Description:
+				Loads a binary capture or a profilerToJSON file.
+		"""
+		file = open(fileName, "rb")
+		magic = file.read(len(sBinaryMagic))
+		file.close()
+		if magic == sBinaryMagic:
+			return cls.load(fileName)
+		return cls.fromJSON(fileName)
+
+	def close(self):
+		if self.map is not None:
+			self.columns = {}
+			self.map.close()
+			self.map = None
+
+def profilerToBinary(fileName, durationMin, profiler=om.MProfiler, eventFilter=None):
+	"""
+	 	fileName : name of file to write to disk
+		durationMin : only write out events which have at least this minimum time duration
+		profiler : event source, om.MProfiler unless benchmarking with a SyntheticProfiler
+		eventFilter : optional EventFilter selecting which events to write
+
+		Description:
+			Sample code to extract profiler information and write it to file in the
+			columnar binary format.
+
+		Example usage:
+			> profilerToBinary('profiler.mprf', 0.0)
+	"""
+	if profiler.getEventCount() == 0:
+		return
+	ProfilerCapture.fromProfiler(durationMin, profiler, eventFilter).save(fileName)
+
+def profilerLoadBinary(fileName):
+	"""
+	 	fileName : name of the binary capture to read
+
+		Description:
+			Memory maps a binary capture and returns it as a ProfilerCapture.
+
+		Example usage:
+			> capture = profilerLoadBinary('profiler.mprf')
+			> durations = capture.columns['duration']
+			> print sum(durations) / len(durations)
+	"""
+	return ProfilerCapture.load(fileName)
+
+def profilerJSONToBinary(fileName, fileName2):
+	"""
+	 	fileName : name of a profilerToJSON file to read
+		fileName2 : name of the binary capture to write
+
+		Example usage:
+			> profilerJSONToBinary('profiler_indexed.json', 'profiler.mprf')
+	"""
+	ProfilerCapture.fromJSON(fileName).save(fileName2)
+
+def profilerBinaryToJSON(fileName, fileName2, useIndex):
+	"""
+	 	fileName : name of the binary capture to read
+		fileName2 : name of the JSON file to write
+		useIndex : write events using index lookup to category and name lists
+
+		Example usage:
+			> profilerBinaryToJSON('profiler.mprf', 'profiler_indexed.json', True)
+	"""
+	capture = ProfilerCapture.load(fileName)
+	capture.toJSON(fileName2, useIndex)
+	capture.close()
+
+
+# Sample 4: Parallel export
+# -------------------------
+#
+# Formatting dominates the export time of large captures. The events are snapshot
+# from the profiler into a ProfilerCapture first, since the profiler can only be
+# queried from Maya's main thread, then disjoint event ranges are formatted into
+# JSON or CSV fragments by a pool of worker processes and written out in order.
+# The output is identical to profilerToJSON and profilerToCSV.
+#
+# Worker processes import this module, so its directory has to be on the Python
+# path. On Windows the workers are started with mayapy rather than Maya itself.
+#
+sFragmentColumns = ('time', 'nameIdx', 'descIdx', 'catIdx', 'duration', 'tDuration', 'tId', 'cpuId', 'colorId')
+sWorkerState = {}
+
+def initializeWorker(state):
+	sWorkerState.clear()
+	sWorkerState.update(state)
+
+def formatFragment(columnData):
+	"""
+		columnData : (typecode, bytes) of each of sFragmentColumns for one event range
+
+		Description:
+			Formats one range of events using the tables set by initializeWorker().
+	"""
+	columns = []
+	for typecode, data in columnData:
+		column = array(typecode)
+		column.fromstring(data)
+		if typecode == 'd':
+			column = [int(value) for value in column]
+		columns.append(column)
+
+	nameValues = sWorkerState['nameValues']
+	categoryValues = sWorkerState['categoryValues']
+	descriptions = sWorkerState['descriptions']
+	if sWorkerState['format'] == 'csv':
+		fragment = cStringIO.StringIO()
+		csvWriter = csv.writer(fragment, quoting=csv.QUOTE_NONNUMERIC)
+		for eventTime, nameIndex, descIndex, categoryIndex, duration, threadDuration, threadId, cpuId, colorId in itertools.izip(*columns):
+			csvWriter.writerow((eventTime, nameValues[nameIndex], descriptions[descIndex], categoryValues[categoryIndex],
+				duration, threadDuration, threadId, cpuId, colorId))
+		return fragment.getvalue()
+
+	eventFormat = '\t,{ ' + sWorkerState['eventFormat']
+	return "".join([eventFormat % (eventTime, nameValues[nameIndex], descriptions[descIndex], categoryValues[categoryIndex],
+		duration, threadDuration, threadId, cpuId, colorId)
+		for eventTime, nameIndex, descIndex, categoryIndex, duration, threadDuration, threadId, cpuId, colorId in itertools.izip(*columns)])
+
+def captureFragments(capture, chunkEvents):
+	columns = [capture.columns[name] for name in sFragmentColumns]
+	for start in xrange(0, len(capture), chunkEvents):
+		yield [(column.typecode, column[start:start + chunkEvents].tostring()) for column in columns]
+
+def formatCaptureFragments(capture, state, processes, chunkEvents):
+	"""
+		Description:
+			Yields the formatted fragments of a capture in event order, using
+			a pool of worker processes unless processes is 1.
+	"""
+	if processes is None:
+		processes = multiprocessing.cpu_count()
+	if processes <= 1:
+		initializeWorker(state)
+		for columnData in captureFragments(capture, chunkEvents):
+			yield formatFragment(columnData)
+		return
+
+	if sys.platform == 'win32' and not os.path.basename(sys.executable).lower().startswith('mayapy'):
+		mayapy = os.path.join(os.path.dirname(sys.executable), 'mayapy.exe')
+		if os.path.exists(mayapy):
+			multiprocessing.set_executable(mayapy)
+	pool = multiprocessing.Pool(processes, initializeWorker, (state,))
+	try:
+		for fragment in pool.imap(formatFragment, captureFragments(capture, chunkEvents)):
+			yield fragment
+	finally:
+		pool.terminate()
+		pool.join()
+
+def profilerToJSONParallel(fileName, useIndex, durationMin, processes=None, chunkEvents=100000, profiler=om.MProfiler, eventFilter=None):
+	"""
+	 	fileName : name of file to write to disk
+		useIndex : write events using index lookup to category and name lists
+		durationMin : only write out events which have at least this minimum time duration
+		processes : number of worker processes, all cores if None
+		chunkEvents : number of events formatted by a worker at a time
+		profiler : event source, om.MProfiler unless benchmarking with a SyntheticProfiler
+		eventFilter : optional EventFilter selecting which events to write
+
+		Description:
+			Same output as profilerToJSON, with the events formatted in parallel.
+
+		Example usage:
+			> profilerToJSONParallel('profiler_indexed.json', True, 0.0)
+	"""
+	if profiler.getEventCount() == 0:
+		return
+	capture = ProfilerCapture.fromProfiler(durationMin, profiler, eventFilter)
+
+	file = open(fileName, "w")
+	if not file:
+		return
+
+	eventFormat, nameValues, categoryValues = jsonEventFormat(useIndex, capture.eventNames, capture.categories)
+	state = {
+		'format' : 'json',
+		'eventFormat' : eventFormat,
+		'nameValues' : nameValues,
+		'categoryValues' : categoryValues,
+		'descriptions' : [quoted(description) for description in capture.descriptions] }
+
+	writer = ChunkedWriter(file)
+	writeJSONHeader(writer, capture.eventCount, capture.cpuCount, capture.categories, capture.eventNames, useIndex)
+	first = True
+	for fragment in formatCaptureFragments(capture, state, processes, chunkEvents):
+		if first and fragment:
+			# Only the first event goes without a leading comma
+			fragment = '\t{ ' + fragment[len('\t,{ '):]
+			first = False
+		writer.write(fragment)
+	writeJSONFooter(writer, len(capture))
+	writer.flush()
+	file.close()
+
+def profilerToCSVParallel(fileName, durationMin, processes=None, chunkEvents=100000, profiler=om.MProfiler, eventFilter=None):
+	"""
+	 	fileName : name of file to write to disk
+		durationMin : only write out events which have at least this minimum time duration
+		processes : number of worker processes, all cores if None
+		chunkEvents : number of events formatted by a worker at a time
+		profiler : event source, om.MProfiler unless benchmarking with a SyntheticProfiler
+		eventFilter : optional EventFilter selecting which events to write
+
+		Description:
+			Same output as profilerToCSV, with the events formatted in parallel.
+
+		Example usage:
+			> profilerToCSVParallel('profiler.csv', 0.0)
+	"""
+	if profiler.getEventCount() == 0:
+		return
+	capture = ProfilerCapture.fromProfiler(durationMin, profiler, eventFilter)
+
+	file = open(fileName, "w")
+	if not file:
+		return
+
+	state = {
+		'format' : 'csv',
+		'nameValues' : capture.eventNames,
+		'categoryValues' : capture.categories,
+		'descriptions' : capture.descriptions }
+
+	csv.writer(file, quoting=csv.QUOTE_NONNUMERIC).writerow(sCSVHead)
+	writer = ChunkedWriter(file)
+	for fragment in formatCaptureFragments(capture, state, processes, chunkEvents):
+		writer.write(fragment)
+	writer.flush()
+	file.close()
+
+
+# Sample 5: Incremental export
+# ----------------------------
+#
+# Long running jobs can dump the profiler periodically without rewriting everything
+# exported so far. The position reached in the profiler buffer is remembered per
+# output file in a "<fileName>.state" file next to it, and each call appends only the
+# events recorded since.
+#
+# The JSON files have the same keys as profilerToJSON, but the values which grow with
+# each export (eventCount, categories, eventNames and eventsWritten) follow the events
+# list. Appending then only truncates and rewrites that tail.
+#
+# If the profiler buffer was cleared or wrapped around since the last export, events
+# are picked up by time instead: everything later than the last exported event.
+#
+class IncrementalExportState(object):
+	"""
+		Description:
+			Progress of the incremental export to one file.
+	"""
+	def __init__(self, fileName, exportFormat, useIndex):
+		self.fileName = fileName
+		self.exportFormat = exportFormat
+		self.useIndex = useIndex
+		self.lastIndex = 0
+		self.lastIndexTime = None
+		self.lastTime = None
+		self.eventCount = 0
+		self.eventsWritten = 0
+		self.dataEnd = 0
+		self.fileSize = 0
+		self.eventNames = []
+		self.categories = []
+
+	@staticmethod
+	def stateFileName(fileName):
+		return fileName + '.state'
+
+	@classmethod
+	def load(cls, fileName, exportFormat, useIndex):
+		"""
+			Description:
+				Returns the state for fileName. The state is started afresh if there
+				is none, it was for another format, or the file changed since.
+		"""
+		state = cls(fileName, exportFormat, useIndex)
+		stateFileName = cls.stateFileName(fileName)
+		if not os.path.exists(stateFileName) or not os.path.exists(fileName):
+			return state
+		file = open(stateFileName, "r")
+		values = json.load(file)
+		file.close()
+		if values.get('exportFormat') != exportFormat or values.get('useIndex') != useIndex or values.get('fileSize') != os.path.getsize(fileName):
+			return state
+		state.__dict__.update(values)
+		state.fileName = fileName
+		return state
+
+	def save(self):
+		self.fileSize = os.path.getsize(self.fileName)
+		file = open(self.stateFileName(self.fileName), "w")
+		json.dump(self.__dict__, file)
+		file.close()
+
+	def newEvents(self, profiler):
+		"""
+			Description:
+				Returns the profiler indices of the events recorded since the last export.
+		"""
+		eventCount = profiler.getEventCount()
+		lastIndex = self.lastIndex
+		if lastIndex and lastIndex <= eventCount and profiler.getEventTime(lastIndex - 1) == self.lastIndexTime:
+			return xrange(lastIndex, eventCount)
+		if self.lastTime is None:
+			return xrange(eventCount)
+		# The buffer no longer lines up with the last export
+		lastTime = self.lastTime
+		getEventTime = profiler.getEventTime
+		return [i for i in xrange(eventCount) if getEventTime(i) > lastTime]
+
+	def advance(self, profiler, indices):
+		eventCount = profiler.getEventCount()
+		self.eventCount += len(indices)
+		if eventCount:
+			self.lastIndex = eventCount
+			self.lastIndexTime = profiler.getEventTime(eventCount - 1)
+		for i in indices:
+			eventTime = profiler.getEventTime(i)
+			if self.lastTime is None or eventTime > self.lastTime:
+				self.lastTime = eventTime
+
+def profilerToJSONIncremental(fileName, useIndex, durationMin, profiler=om.MProfiler, eventFilter=None):
+	"""
+	 	fileName : name of file to write to or extend
+		useIndex : write events using index lookup to category and name lists
+		durationMin : only write out events which have at least this minimum time duration
+		profiler : event source, om.MProfiler unless benchmarking with a SyntheticProfiler
+		eventFilter : optional EventFilter selecting which events to write
+
+		Description:
+			Appends the events recorded since the previous call for the same file.
+			Returns the number of events written by this call.
+
+		Example usage:
+			> profilerToJSONIncremental('profiler_farm.json', True, 0.0) # Every few minutes
+	"""
+	state = IncrementalExportState.load(fileName, 'json', useIndex)
+	indices = state.newEvents(profiler)
+
+	accepted = (eventFilter or EventFilter()).indices(profiler, durationMin, indices)
+
+	nameTable = EventNameTable(state.eventNames)
+	categoryTable = CategoryTable(profiler, state.categories)
+	nameIndices = array('i')
+	categoryIndices = array('i')
+	for i in accepted:
+		nameIndices.append(nameTable.index(profiler.getEventName(i)))
+		categoryIndices.append(categoryTable.index(profiler.getEventCategory(i)))
+	eventFormat, nameValues, categoryValues = jsonEventFormat(useIndex, nameTable.names, categoryTable.names)
+
+	if state.dataEnd:
+		file = open(fileName, "r+b")
+		file.seek(state.dataEnd)
+		file.truncate()
+	else:
+		file = open(fileName, "wb")
+		file.write("{\n")
+		file.write("\t\"version\": 1,\n")
+		file.write("\t\"cpuCount\": " + str(profiler.getNumberOfCPUs()) + ",\n")
+		file.write('\t\"events\": [\n')
+
+	writer = ChunkedWriter(file)
+	separator = '\t,{ ' if state.eventsWritten else '\t{ '
+	eventsWritten = 0
+	for i, nameIndex, categoryIndex in itertools.izip(accepted, nameIndices, categoryIndices):
+		eventsWritten = eventsWritten + 1
+		writer.write(separator + eventFormat % (profiler.getEventTime(i), nameValues[nameIndex], quoted(profiler.getDescription(i)),
+			categoryValues[categoryIndex], profiler.getEventDuration(i), profiler.getThreadDuration(i), profiler.getThreadId(i),
+			profiler.getCPUId(i), profiler.getColor(i)))
+		separator = '\t,{ '
+	writer.flush()
+
+	state.advance(profiler, indices)
+	state.eventsWritten += eventsWritten
+	state.eventNames = nameTable.names
+	state.categories = categoryTable.names
+	state.dataEnd = file.tell()
+
+	file.write("\t],\n")
+	file.write("\t\"eventCount\": " + str(state.eventCount) + ",\n")
+	if useIndex:
+		file.write("\t\"categories\": " + json.dumps(state.categories, True, True) + ",\n")
+		file.write("\t\"eventNames\" : " + json.dumps(state.eventNames, True, True) + ",\n")
+	file.write("\t\"eventsWritten\": " + str(state.eventsWritten) + "\n")
+	file.write("}\n")
+	file.close()
+	state.save()
+	return eventsWritten
+
+def profilerToCSVIncremental(fileName, durationMin, profiler=om.MProfiler, eventFilter=None):
+	"""
+	 	fileName : name of file to write to or extend
+		durationMin : only write out events which have at least this minimum time duration
+		profiler : event source, om.MProfiler unless benchmarking with a SyntheticProfiler
+		eventFilter : optional EventFilter selecting which events to write
+
+		Description:
+			Appends the events recorded since the previous call for the same file.
+			Returns the number of events written by this call.
+
+		Example usage:
+			> profilerToCSVIncremental('profiler_farm.csv', 0.0) # Every few minutes
+	"""
+	state = IncrementalExportState.load(fileName, 'csv', False)
+	indices = state.newEvents(profiler)
+
+	if state.dataEnd:
+		file = open(fileName, "r+b")
+		file.seek(state.dataEnd)
+		file.truncate()
+		csvWriter = csv.writer(file, quoting=csv.QUOTE_NONNUMERIC)
+	else:
+		file = open(fileName, "wb")
+		csvWriter = csv.writer(file, quoting=csv.QUOTE_NONNUMERIC)
+		csvWriter.writerow(sCSVHead)
+
+	nameTable = EventNameTable()
+	categoryTable = CategoryTable(profiler)
+	eventsWritten = 0
+	for i in (eventFilter or EventFilter()).indices(profiler, durationMin, indices):
+		eventsWritten = eventsWritten + 1
+		csvWriter.writerow((profiler.getEventTime(i),
+			nameTable.names[nameTable.index(profiler.getEventName(i))],
+			profiler.getDescription(i) or '',
+			categoryTable.names[categoryTable.index(profiler.getEventCategory(i))],
+			profiler.getEventDuration(i),
+			profiler.getThreadDuration(i),
+			profiler.getThreadId(i),
+			profiler.getCPUId(i),
+			profiler.getColor(i)))
+
+	state.advance(profiler, indices)
+	state.eventsWritten += eventsWritten
+	state.dataEnd = file.tell()
+	file.close()
+	state.save()
+	return eventsWritten
+
+def profilerResetIncremental(fileName):
+	"""
+	 	fileName : file previously written by an incremental export
+
+		Description:
+			Forgets the export progress so the next call starts the file over.
+	"""
+	stateFileName = IncrementalExportState.stateFileName(fileName)
+	if os.path.exists(stateFileName):
+		os.remove(stateFileName)
+
+
+# Sample 6: Level of detail timeline for profilerHTMLView
+# ------------------------------------------------------
+#
+# Drawing every event of a large capture stalls the browser. This output holds the
+# capture's timeline at several zoom levels instead. At each level the events of a
+# thread are merged into spans wherever the gap between them is less than the level's
+# bucket size, so the number of spans stays close to what can be seen at that zoom.
+# The viewer only reads the level it needs.
+#
+# The file is a sequence of lines, each a JSON object:
+#	line 1		header with version, eventCount, cpuCount, eventsWritten, categories,
+#				eventNames, threads, startTime and endTime in ticks, and "lodLevels": for
+#				each level, coarsest first, its bucketSize, spanCount and the byte offset
+#				and length of its line counted from the end of the header line
+#	line 2...	one level: { "bucketSize": ..., "spans": { "<thread id>": [...] } }
+#
+# The spans of a thread are a flat list of five values per span: start relative to
+# startTime, duration, number of events merged, and the category and name indices of
+# the longest of those events.
+#
+def mergeSpans(spans, bucketSize):
+	"""
+		spans : [start, end, count, longest, catIdx, nameIdx] lists in start order
+
+		Description:
+			Merges spans separated by less than bucketSize. Merging already merged
+			spans gives the same result as merging their events directly, so each
+			level is built from the next finer one.
+	"""
+	merged = []
+	current = None
+	for span in spans:
+		if current is not None and span[0] < current[1] + bucketSize:
+			if span[1] > current[1]:
+				current[1] = span[1]
+			current[2] += span[2]
+			if span[3] > current[3]:
+				current[3:6] = span[3:6]
+		else:
+			current = list(span)
+			merged.append(current)
+	return merged
+
+def writeLODCapture(capture, fileName, levels, baseBuckets, factor):
+	"""
+		Description:
+			Writes the level of detail timeline of a ProfilerCapture.
+	"""
+	times = capture.columnArray('time')
+	threadDurations = capture.columnArray('tDuration')
+	categoryIndices = capture.columnArray('catIdx')
+	nameIndices = capture.columnArray('nameIdx')
+	threadIds = capture.columnArray('tId')
+
+	startTime = min(times) if len(times) else 0
+	endTime = max(itertools.imap(operator.add, times, threadDurations)) if len(times) else 0
+	extent = max(endTime - startTime, 1)
+	bucketSizes = [extent / float(baseBuckets * factor ** level) for level in xrange(levels)]
+
+	threads = {}
+	for i, threadId in enumerate(threadIds):
+		indices = threads.get(threadId)
+		if indices is None:
+			indices = threads[threadId] = []
+		indices.append(i)
+
+	levelSpans = [{} for level in xrange(levels)]
+	for threadId, indices in threads.iteritems():
+		indices.sort(key=times.__getitem__)
+		spans = mergeSpans(([times[i], times[i] + threadDurations[i], 1, threadDurations[i], categoryIndices[i], nameIndices[i]]
+			for i in indices), bucketSizes[-1])
+		for level in xrange(levels - 1, -1, -1):
+			if level != levels - 1:
+				spans = mergeSpans(spans, bucketSizes[level])
+			flat = []
+			for start, end, count, longest, categoryIndex, nameIndex in spans:
+				flat.extend((int(start - startTime), int(end - start), count, categoryIndex, nameIndex))
+			levelSpans[level][str(int(threadId))] = flat
+
+	levelLines = []
+	lodLevels = []
+	offset = 0
+	for bucketSize, spans in zip(bucketSizes, levelSpans):
+		line = json.dumps({ 'bucketSize' : bucketSize, 'spans' : spans }, separators=(',', ':')) + '\n'
+		levelLines.append(line)
+		lodLevels.append({
+			'bucketSize' : bucketSize,
+			'spanCount' : sum(len(flat) for flat in spans.itervalues()) / 5,
+			'offset' : offset,
+			'length' : len(line) })
+		offset += len(line)
+
+	header = {
+		'version' : 1,
+		'eventCount' : capture.eventCount,
+		'cpuCount' : capture.cpuCount,
+		'eventsWritten' : len(times),
+		'categories' : capture.categories,
+		'eventNames' : capture.eventNames,
+		'threads' : sorted(int(threadId) for threadId in threads),
+		'startTime' : int(startTime),
+		'endTime' : int(endTime),
+		'lodLevels' : lodLevels }
+
+	# Binary mode keeps the byte offsets exact on every platform
+	file = open(fileName, "wb")
+	file.write(json.dumps(header, separators=(',', ':')) + '\n')
+	for line in levelLines:
+		file.write(line)
+	file.close()
+
+def profilerToLOD(fileName, durationMin, levels=6, baseBuckets=1024, factor=8, profiler=om.MProfiler, eventFilter=None):
+	"""
+	 	fileName : name of file to write to disk
+		durationMin : only include events which have at least this minimum time duration
+		levels : number of zoom levels
+		baseBuckets : number of buckets across the whole capture at the coarsest level
+		factor : how many times finer each level is than the previous one
+		profiler : event source, om.MProfiler unless benchmarking with a SyntheticProfiler
+		eventFilter : optional EventFilter selecting which events to include
+
+		Description:
+			Writes a level of detail timeline which profilerHTMLView can browse
+			interactively however large the capture is.
+
+		Example usage:
+			> profilerToLOD('profiler_lod.json', 0.0)
+	"""
+	if profiler.getEventCount() == 0:
+		return
+	writeLODCapture(ProfilerCapture.fromProfiler(durationMin, profiler, eventFilter), fileName, levels, baseBuckets, factor)
+
+def profilerCaptureToLOD(fileName, fileName2, levels=6, baseBuckets=1024, factor=8):
+	"""
+	 	fileName : binary capture or profilerToJSON file to read
+		fileName2 : name of the level of detail file to write
+
+		Example usage:
+			> profilerCaptureToLOD('profiler.mprf', 'profiler_lod.json')
+	"""
+	capture = ProfilerCapture.open(fileName)
+	writeLODCapture(capture, fileName2, levels, baseBuckets, factor)
+	capture.close()
+
+
+# Sample 7: Chrome trace event output
+# -----------------------------------
+#
+# chrome://tracing and the Perfetto UI open captures with millions of events, far
+# more than profilerHTMLView can draw. Events are written as complete ("X") events in
+# the JSON object form of the trace event format, one line per event:
+#	{ "traceEvents": [
+#	{"name":"QtIdleTimer","cat":"Qt","ph":"X","ts":25610841.341,"dur":39014,"pid":1,"tid":6972,"args":{"cpuId":4,"colorId":6,"tDuration":39724089,"desc":""}},
+#	.... more events, then thread_name metadata events giving each thread its own track ...
+#	],
+#	"displayTimeUnit": "ms",
+#	"otherData": { "version": 1, "eventCount": 11276, "cpuCount": 8, "eventsWritten": 364 } }
+#
+# Trace timestamps are in microseconds. Event times are in profiler ticks, which are
+# converted using ticksPerMicrosecond, while durations are already in microseconds.
+#
+sTraceEventFormat = '{"name":%s,"cat":%s,"ph":"X","ts":%.3f,"dur":%d,"pid":1,"tid":%d,"args":{"cpuId":%d,"colorId":%d,"tDuration":%d,"desc":%s}}'
+sTraceThreadFormat = '{"name":"thread_name","ph":"M","pid":1,"tid":%d,"args":{"name":"Thread %d"}}'
+
+def writeTraceCapture(file, eventCount, cpuCount, categories, eventNames, records, ticksPerMicrosecond):
+	"""
+		file : file object to write to
+		eventCount : total number of events in the capture
+		cpuCount : number of CPUs
+		categories : list of category names, which may grow while records are iterated
+		eventNames : list of event names, which may grow while records are iterated
+		records : iterable of (time, nameIdx, description, catIdx, duration, tDuration, tId, cpuId, colorId) tuples
+		ticksPerMicrosecond : number of profiler ticks in a microsecond
+
+		Description:
+			Writes the trace event layout for any source of event records.
+			Returns the number of events written.
+	"""
+	writer = ChunkedWriter(file)
+	writer.write('{ "traceEvents": [\n')
+	write = writer.write
+	nameValues = []
+	categoryValues = []
+	microsecondsPerTick = 1.0 / ticksPerMicrosecond
+	threadIds = set()
+	separator = ''
+	eventsWritten = 0
+	for eventTime, nameIndex, description, categoryIndex, duration, threadDuration, threadId, cpuId, colorId in records:
+		eventsWritten = eventsWritten + 1
+		threadIds.add(threadId)
+		if nameIndex >= len(nameValues):
+			nameValues.extend(quoted(name) for name in eventNames[len(nameValues):])
+		if categoryIndex >= len(categoryValues):
+			categoryValues.extend(quoted(name) for name in categories[len(categoryValues):])
+		write(separator + sTraceEventFormat % (nameValues[nameIndex], categoryValues[categoryIndex], eventTime * microsecondsPerTick,
+			duration, threadId, cpuId, colorId, threadDuration, quoted(description)))
+		separator = ',\n'
+
+	write(separator + '{"name":"process_name","ph":"M","pid":1,"tid":0,"args":{"name":"Maya"}}')
+	for threadId in sorted(threadIds):
+		write(',\n' + sTraceThreadFormat % (threadId, threadId))
+	write('\n],\n"displayTimeUnit": "ms",\n')
+	write('"otherData": { "version": 1, "eventCount": %d, "cpuCount": %d, "eventsWritten": %d } }\n' % (eventCount, cpuCount, eventsWritten))
+	writer.flush()
+	return eventsWritten
+
+def profilerToTrace(fileName, durationMin, ticksPerMicrosecond=1000.0, profiler=om.MProfiler, eventFilter=None):
+	"""
+	 	fileName : name of file to write to disk
+		durationMin : only write out events which have at least this minimum time duration
+		ticksPerMicrosecond : number of profiler ticks in a microsecond
+		profiler : event source, om.MProfiler unless benchmarking with a SyntheticProfiler
+		eventFilter : optional EventFilter selecting which events to write
+
+		Description:
+			Sample code to extract profiler information and write it to file in the
+			trace event format read by chrome://tracing and the Perfetto UI.
+
+		Example usage:
+			> profilerToTrace('profiler_trace.json', 0.0)
+	"""
+	eventCount = profiler.getEventCount()
+	if eventCount == 0:
+		return
+
+	file = open(fileName, "w")
+	if not file:
+		return
+
+	# Unlike profilerToJSON no lists precede the events, so names and categories are
+	# resolved as the events are written.
+	nameTable = EventNameTable()
+	categoryTable = CategoryTable(profiler)
+	def eventRecords():
+		for i in (eventFilter or EventFilter()).indices(profiler, durationMin):
+			yield (profiler.getEventTime(i), nameTable.index(profiler.getEventName(i)), profiler.getDescription(i),
+				categoryTable.index(profiler.getEventCategory(i)), profiler.getEventDuration(i), profiler.getThreadDuration(i),
+				profiler.getThreadId(i), profiler.getCPUId(i), profiler.getColor(i))
+
+	writeTraceCapture(file, eventCount, profiler.getNumberOfCPUs(), categoryTable.names, nameTable.names, eventRecords(), ticksPerMicrosecond)
+	file.close()
+
+def profilerCaptureToTrace(fileName, fileName2, ticksPerMicrosecond=1000.0):
+	"""
+	 	fileName : binary capture or profilerToJSON file to read
+		fileName2 : name of the trace event file to write
+		ticksPerMicrosecond : number of profiler ticks in a microsecond
+
+		Example usage:
+			> profilerCaptureToTrace('profiler.mprf', 'profiler_trace.json')
+	"""
+	capture = ProfilerCapture.open(fileName)
+	file = open(fileName2, "w")
+	writeTraceCapture(file, capture.eventCount, capture.cpuCount, capture.categories, capture.eventNames, capture.records(), ticksPerMicrosecond)
+	file.close()
+	capture.close()
+
+
+# Benchmarking
+# ------------
+#
+class SyntheticProfiler(object):
+	"""
+		eventCount : number of events in the synthetic capture
+		nameCount : number of distinct event names
+		categoryCount : number of distinct categories
+		cpuCount : number of CPUs reported and used for cpu ids
+
+		Description:
+			Stand-in for om.MProfiler which generates a deterministic capture of any
+			size so the exporters can be timed outside of a real profiling session.
+			Only the static getters used by this file are provided.
+
+		Example usage:
+			> profilerToJSON('synthetic.json', True, 0.0, SyntheticProfiler(100000))
+	"""
+	def __init__(self, eventCount, nameCount=500, categoryCount=12, cpuCount=8):
+		self.eventCount = eventCount
+		self.cpuCount = cpuCount
+		self.rawNames = ['Event%d\x01' % n for n in xrange(nameCount)]
+		self.categoryNames = ['Category%d' % c for c in xrange(categoryCount)]
+
+	def getEventCount(self):
+		return self.eventCount
+
+	def getNumberOfCPUs(self):
+		return self.cpuCount
+
+	def getAllCategories(self, categories):
+		categories.extend(self.categoryNames)
+
+	def getCategoryName(self, categoryId):
+		return self.categoryNames[categoryId]
+
+	def getEventName(self, i):
+		return self.rawNames[(i * 7919) % len(self.rawNames)]
+
+	def getEventCategory(self, i):
+		return ((i * 7919) % len(self.rawNames)) % len(self.categoryNames)
+
+	def getDescription(self, i):
+		return '' if i % 64 else 'desc%d' % (i % 1000)
+
+	def getEventTime(self, i):
+		return 25610841341 + i * 97
+
+	def getEventDuration(self, i):
+		return (i * 31) % 1000
+
+	def getThreadDuration(self, i):
+		return ((i * 31) % 1000) * 1000 + 17
+
+	def getThreadId(self, i):
+		return 6972 + i % 16
+
+	def getCPUId(self, i):
+		return i % self.cpuCount
+
+	def getColor(self, i):
+		return (i * 7919) % 24
+
+def profilerBenchmarkJSON(fileName, eventCounts=(625000, 1250000, 2500000, 5000000), useIndex=True):
+	"""
+	 	fileName : scratch file to export to. It is removed afterwards.
+		eventCounts : synthetic capture sizes to time
+		useIndex : benchmark the indexed or non-indexed JSON output
+
+		Description:
+			Times profilerToJSON on synthetic captures of increasing size. The cost per
+			event should stay flat as the capture grows, i.e. the export scales linearly.
+
+		Example usage:
+			> profilerBenchmarkJSON('/tmp/profilerBenchmark.json')
+	"""
+	results = []
+	for eventCount in eventCounts:
+		profiler = SyntheticProfiler(eventCount)
+		start = time.time()
+		profilerToJSON(fileName, useIndex, -1, profiler)
+		elapsed = time.time() - start
+		results.append((eventCount, elapsed))
+		print('%10d events : %8.2f s, %8.1f ns/event' % (eventCount, elapsed, elapsed * 1.0e9 / eventCount))
+	if os.path.exists(fileName):
+		os.remove(fileName)
+	return results
+
+def profilerBenchmarkParallel(fileName, eventCount=2000000, processCounts=None, useIndex=True):
+	"""
+	 	fileName : scratch file to export to. It is removed afterwards.
+		eventCount : synthetic capture size
+		processCounts : worker process counts to time, powers of two up to the core count if None
+		useIndex : benchmark the indexed or non-indexed JSON output
+
+		Description:
+			Times profilerToJSON against profilerToJSONParallel with increasing numbers
+			of processes, checks the outputs are identical and reports the wall clock
+			speedup over the serial export.
+
+		Example usage:
+			> profilerBenchmarkParallel('/tmp/profilerBenchmark.json')
+	"""
+	cpuCount = multiprocessing.cpu_count()
+	if processCounts is None:
+		processCounts = [1]
+		while processCounts[-1] * 2 <= cpuCount:
+			processCounts.append(processCounts[-1] * 2)
+		if processCounts[-1] != cpuCount:
+			processCounts.append(cpuCount)
+
+	profiler = SyntheticProfiler(eventCount)
+	start = time.time()
+	profilerToJSON(fileName, useIndex, -1, profiler)
+	serial = time.time() - start
+	file = open(fileName, "r")
+	expected = file.read()
+	file.close()
+	print('%d events, %d cores' % (eventCount, cpuCount))
+	print('  serial       : %8.2f s' % serial)
+
+	results = []
+	for processes in processCounts:
+		start = time.time()
+		profilerToJSONParallel(fileName, useIndex, -1, processes, profiler=profiler)
+		elapsed = time.time() - start
+		file = open(fileName, "r")
+		identical = file.read() == expected
+		file.close()
+		results.append((processes, elapsed, serial / elapsed, identical))
+		print('  %2d processes : %8.2f s, speedup %5.2fx%s' % (processes, elapsed, serial / elapsed, '' if identical else ', OUTPUT DIFFERS'))
+	if os.path.exists(fileName):
+		os.remove(fileName)
+	return results
+
+
 # Nothing run on initialize for now
 def initializePlugin(obj):
 	obj
@@ -3,17 +3,259 @@ function toColor(value)
 	return "#" + (Math.round(value * 0XFFFFFF)).toString(16);
 }
 
+// Reads part of a file as text
+function readText(blob, callback)
+{
+	var reader = new FileReader();
+	reader.onload = function(e)
+	{
+		callback(reader.result);
+	}
+	reader.readAsText(blob);
+}
+
+// Level of detail files written by profilerToLOD() start with a one line header.
+// Reads ever larger slices until the first line is complete, then calls back with
+// the header, or null for any other file, and the byte size of the header line.
+function readLODHeader(file, size, callback)
+{
+	readText(file.slice(0, size), function(text)
+	{
+		var end = text.indexOf("\n");
+		if (end < 0)
+		{
+			if (size < file.size)
+				readLODHeader(file, size * 4, callback);
+			else
+				callback(null, 0);
+			return;
+		}
+		var header = null;
+		try
+		{
+			header = JSON.parse(text.substring(0, end));
+		}
+		catch (error)
+		{
+			header = null;
+		}
+		callback(header && header.lodLevels ? header : null, end + 1);
+	});
+}
+
+// Timeline of a level of detail file. Each thread is a row of merged spans.
+// Only the level matching the current zoom is read from the file, and levels
+// already read are kept. Scroll to zoom around the cursor, drag to pan.
+function LODTimeline(file, header, dataStart, canvas, info)
+{
+	this.file = file;
+	this.header = header;
+	this.dataStart = dataStart;
+	this.canvas = canvas;
+	this.info = info;
+	this.levels = [];
+	this.loading = [];
+	this.viewStart = 0;
+	this.viewEnd = Math.max(header.endTime - header.startTime, 1);
+	this.extent = this.viewEnd;
+
+	var timeline = this;
+	var dragX = null;
+	canvas.onwheel = function(e)
+	{
+		e.preventDefault();
+		var scale = e.deltaY > 0 ? 1.25 : 0.8;
+		var cursor = timeline.viewStart + (timeline.viewEnd - timeline.viewStart) * e.offsetX / canvas.width;
+		var range = Math.max((timeline.viewEnd - timeline.viewStart) * scale, 1);
+		timeline.viewStart = cursor - (cursor - timeline.viewStart) * scale;
+		timeline.viewEnd = timeline.viewStart + range;
+		timeline.draw();
+	}
+	canvas.onmousedown = function(e)
+	{
+		dragX = e.offsetX;
+	}
+	canvas.onmouseup = canvas.onmouseleave = function(e)
+	{
+		dragX = null;
+	}
+	canvas.onmousemove = function(e)
+	{
+		if (dragX === null)
+		{
+			timeline.describe(e.offsetX, e.offsetY);
+			return;
+		}
+		var shift = (timeline.viewEnd - timeline.viewStart) * (dragX - e.offsetX) / canvas.width;
+		timeline.viewStart += shift;
+		timeline.viewEnd += shift;
+		dragX = e.offsetX;
+		timeline.draw();
+	}
+}
+
+// Coarsest level whose spans are no wider than a pixel, or the finest level
+LODTimeline.prototype.levelForZoom = function()
+{
+	var ticksPerPixel = (this.viewEnd - this.viewStart) / this.canvas.width;
+	var lodLevels = this.header.lodLevels;
+	for (var i = 0; i < lodLevels.length; i++)
+	{
+		if (lodLevels[i].bucketSize <= ticksPerPixel)
+			return i;
+	}
+	return lodLevels.length - 1;
+}
+
+LODTimeline.prototype.loadLevel = function(level)
+{
+	if (this.levels[level] || this.loading[level])
+		return;
+	this.loading[level] = true;
+	var timeline = this;
+	var lodLevel = this.header.lodLevels[level];
+	var start = this.dataStart + lodLevel.offset;
+	readText(this.file.slice(start, start + lodLevel.length), function(text)
+	{
+		timeline.levels[level] = JSON.parse(text);
+		timeline.loading[level] = false;
+		timeline.draw();
+	});
+}
+
+// Index of the first span of a thread ending after time. Spans of a level
+// do not overlap so their ends are in increasing order.
+function firstSpanAfter(spans, time)
+{
+	var low = 0;
+	var high = spans.length / 5;
+	while (low < high)
+	{
+		var mid = (low + high) >> 1;
+		if (spans[mid * 5] + spans[mid * 5 + 1] < time)
+			low = mid + 1;
+		else
+			high = mid;
+	}
+	return low;
+}
+
+LODTimeline.prototype.draw = function()
+{
+	var level = this.levelForZoom();
+	this.loadLevel(level);
+
+	// Until the level is read, draw the nearest level already available
+	var shown = level;
+	while (shown >= 0 && !this.levels[shown])
+		shown--;
+	if (shown < 0)
+	{
+		shown = level;
+		while (shown < this.header.lodLevels.length && !this.levels[shown])
+			shown++;
+		if (shown == this.header.lodLevels.length)
+			return;
+	}
+
+	var ctx = this.canvas.getContext("2d");
+	ctx.clearRect(0, 0, this.canvas.width, this.canvas.height);
+	var threads = this.header.threads;
+	var categoryCount = this.header.categories.length;
+	var rowHeight = this.canvas.height / Math.max(threads.length, 1);
+	var ticksPerPixel = (this.viewEnd - this.viewStart) / this.canvas.width;
+	var drawn = 0;
+	for (var row = 0; row < threads.length; row++)
+	{
+		var spans = this.levels[shown].spans[threads[row]] || [];
+		for (var i = firstSpanAfter(spans, this.viewStart); i < spans.length / 5; i++)
+		{
+			var start = spans[i * 5];
+			if (start > this.viewEnd)
+				break;
+			ctx.fillStyle = toColor((spans[i * 5 + 3] + 1) / (categoryCount + 1));
+			ctx.fillRect((start - this.viewStart) / ticksPerPixel, row * rowHeight + 1,
+				Math.max(spans[i * 5 + 1] / ticksPerPixel, 1), Math.max(rowHeight - 2, 1));
+			drawn++;
+		}
+	}
+	this.info.innerHTML = 'Level ' + shown + ' of ' + this.header.lodLevels.length +
+		' (bucket ' + Math.round(this.header.lodLevels[shown].bucketSize) + ' ticks), ' +
+		drawn + ' spans drawn, ' + Math.round(this.viewEnd - this.viewStart) + ' of ' + this.extent + ' ticks visible';
+}
+
+// Show the longest event of the span under the cursor
+LODTimeline.prototype.describe = function(x, y)
+{
+	var level = this.levels[this.levelForZoom()];
+	var threads = this.header.threads;
+	if (!level || !threads.length)
+		return;
+	var row = Math.floor(y / (this.canvas.height / threads.length));
+	var spans = level.spans[threads[row]] || [];
+	var time = this.viewStart + (this.viewEnd - this.viewStart) * x / this.canvas.width;
+	var i = firstSpanAfter(spans, time);
+	if (i < spans.length / 5 && spans[i * 5] <= time)
+	{
+		this.canvas.title = 'Thread ' + threads[row] + ': ' + this.header.eventNames[spans[i * 5 + 4]] +
+			' (' + this.header.categories[spans[i * 5 + 3]] + '), ' + spans[i * 5 + 2] + ' event(s), ' +
+			spans[i * 5 + 1] + ' ticks';
+	}
+	else
+	{
+		this.canvas.title = '';
+	}
+}
+
+// Header of a level of detail file, in place of the event table
+function showLODHeader(header, eventHeader)
+{
+	eventHeader.innerHTML = 'Profiler Version: ' + header.version + "<br>";
+	eventHeader.innerHTML += 'Total Event Count: ' + header.eventCount + "<br>";
+	eventHeader.innerHTML += 'Events Written: ' + header.eventsWritten + "<br>";
+	eventHeader.innerHTML += 'CPU Count: ' + header.cpuCount + "<br>";
+	eventHeader.innerHTML += 'Threads: ' + header.threads.join(', ') + "<br>";
+	eventHeader.innerHTML += 'Levels of detail:';
+	eventHeader.innerHTML += '<ol>';
+	for (var i = 0; i < header.lodLevels.length; i++)
+	{
+		eventHeader.innerHTML += '<li>' + header.lodLevels[i].spanCount + ' spans, bucket ' + Math.round(header.lodLevels[i].bucketSize) + ' ticks';
+	}
+	eventHeader.innerHTML += '</ol>';
+}
+
 window.onload = function() 
 {
 		var fileInput = document.getElementById('fileInput');
 		var eventList = document.getElementById('elementList');
 		var eventCount = document.getElementById("eventCount");
 		var canvas = document.getElementById("canvas");
+		var timelineCanvas = document.getElementById("timeline");
+		var timelineInfo = document.getElementById("timelineInfo");
 		
 		fileInput.addEventListener('change', function(e) {
 			var file = fileInput.files[0];
 			var textType = /text.*/;
 
+			// Level of detail files are browsed on the timeline without reading them whole
+			readLODHeader(file, 65536, function(header, dataStart)
+			{
+				timelineCanvas.getContext("2d").clearRect(0, 0, timelineCanvas.width, timelineCanvas.height);
+				timelineInfo.innerHTML = '';
+				if (header)
+				{
+					showLODHeader(header, eventHeader);
+					eventList.innerHTML = '';
+					if (canvas)
+						canvas.getContext("2d").clearRect(0, 0, canvas.width, canvas.height);
+					new LODTimeline(file, header, dataStart, timelineCanvas, timelineInfo).draw();
+				}
+				else
+				{
+					reader.readAsText(file);
+				}
+			});
+
 			var reader = new FileReader();
 
 			reader.onload = function(e)
@@ -179,6 +421,5 @@ window.onload = function()
 				}
 			}
 
-			reader.readAsText(file);
 		});
 }
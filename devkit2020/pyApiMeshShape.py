@@ -8,10 +8,11 @@
 # ===========================================================================
 #+
 
-import sys, math, ctypes, collections
+import sys, math, ctypes, collections, functools, itertools, operator, array
 import maya.api.OpenMaya as om
 import maya.api.OpenMayaUI as omui
 import maya.api.OpenMayaRender as omr
+from OpenGL.GL import *
 
 def maya_useNewAPI():
 	"""
@@ -39,6 +40,34 @@ def useSelectHighlight(selectedList, path):
 def floatApproxEqual(left, right):
 	return abs(left - right) < 0.0001
 
+################################################################################
+##
+## Profiling
+##
+## Methods decorated with profiled() report a span to Maya's profiler under
+## the apiMesh category, registered when the plugin is loaded. Spans are only
+## created while the category is recording. With sEnableProfiling set to False
+## the methods are left undecorated and cost nothing.
+##
+################################################################################
+sEnableProfiling = True
+sProfilerCategoryName = "apiMesh"
+sProfilerCategory = -1
+
+def profiled(eventName, colorIndex=om.MProfiler.kColorE_L1):
+	def decorate(func):
+		if not sEnableProfiling:
+			return func
+
+		@functools.wraps(func)
+		def wrapper(*args, **kwargs):
+			if sProfilerCategory < 0 or not om.MProfiler.isCategoryRecording(sProfilerCategory):
+				return func(*args, **kwargs)
+			with om.MProfilingScope(sProfilerCategory, colorIndex, eventName):
+				return func(*args, **kwargs)
+		return wrapper
+	return decorate
+
 ################################################################################
 ##
 ## This class holds the underlying geometry for the shape or data.
@@ -70,16 +99,52 @@ class apiMeshGeomUV:
 	def append_uv(self, u, v):
 		self.ucoord.append( u ) 
 		self.vcoord.append( v ) 
+		self.drawCache = None
 
 	def reset(self):
 		self.ucoord = om.MFloatArray()
 		self.vcoord = om.MFloatArray()
 		self.faceVertexIndex = om.MIntArray()
+		self.drawCache = None
 
 	def copy(self, other):
 		self.ucoord = om.MFloatArray(other.ucoord)
 		self.vcoord = om.MFloatArray(other.vcoord)
 		self.faceVertexIndex = om.MIntArray(other.faceVertexIndex)
+		self.drawCache = None
+
+	def drawBuffers(self, faceCounts):
+		## Return the buffers used to draw the uvs in the UV editor : the (u, v)
+		## end points of every face edge for GL_LINES, and the (u, v) of every
+		## uv for GL_POINTS. They are built once and kept until the uvs change.
+		## Besides the explicit resets, the arrays are checked in case they were
+		## replaced or appended to directly.
+		sizes = (len(self.ucoord), len(self.faceVertexIndex), len(faceCounts))
+		cache = self.drawCache
+		if cache is None or cache[0] is not self.ucoord or cache[1] is not self.vcoord or cache[2] is not self.faceVertexIndex or cache[3] != sizes:
+			u = list(self.ucoord)
+			v = list(self.vcoord)
+			faceVertexIndex = list(self.faceVertexIndex)
+
+			lines = []
+			start = 0
+			for count in faceCounts:
+				if start + count > len(faceVertexIndex):
+					break
+				for k in xrange(count):
+					uvId1 = faceVertexIndex[start + k]
+					uvId2 = faceVertexIndex[start + (k + 1) % count]
+					lines.extend( (u[uvId1], v[uvId1], u[uvId2], v[uvId2]) )
+				start += count
+
+			points = [ coord for uv in zip(u, v) for coord in uv ]
+
+			lineBuffer = (ctypes.c_float * len(lines))(*lines)
+			pointBuffer = (ctypes.c_float * len(points))(*points)
+			cache = (self.ucoord, self.vcoord, self.faceVertexIndex, sizes, lineBuffer, pointBuffer)
+			self.drawCache = cache
+
+		return cache[4], cache[5]
 
 class apiMeshGeom:
 	def __init__(self):
@@ -571,6 +636,12 @@ class apiMesh(om.MPxSurfaceShape):
 		self.fShapeDirty = True
 		self.fMaterialDirty = True
 
+		## Incremented whenever the geometry may have changed. Used by the UI
+		## to know when its projected vertices need to be recomputed.
+		##
+		self.fGeometryVersion = 0
+
+	@profiled("apiMesh::compute", om.MProfiler.kColorA_L1)
 	def compute(self, plug, datablock):
 		##
 		## Description
@@ -896,8 +967,13 @@ class apiMesh(om.MPxSurfaceShape):
 			##
 			self.convertToTweakNodePlug(plug)
 
-			for i in xrange(fnVtxComp.elementCount):
-				plug.selectAncestorLogicalIndex(fnVtxComp.element(i), plug.attribute())
+			## Get all the vertex ids at once. MSelectionList has no way to add
+			## several element plugs in one call, so they are still added one
+			## at a time.
+			##
+			attribute = plug.attribute()
+			for vid in fnVtxComp.getElements():
+				plug.selectAncestorLogicalIndex(vid, attribute)
 				list.add(plug)
 
 	def matchComponent(self, item, spec, list):
@@ -956,7 +1032,7 @@ class apiMesh(om.MPxSurfaceShape):
 
 			## Check the attribute index xrange is valid
 			##
-			if lower > upper or upper >= numComp:
+			if lower < 0 or lower > upper or upper >= numComp:
 				result = om.MPxSurfaceShape.kMatchInvalidAttributeRange
 
 			else:
@@ -964,8 +1040,8 @@ class apiMesh(om.MPxSurfaceShape):
 				fnComp = om.MFnSingleIndexedComponent()
 				objComp = fnComp.create( typeComp )
 
-				for i in xrange(lower, upper+1):
-					fnComp.addElement( i )
+				## Add the whole xrange in a single call
+				fnComp.addElements( range(lower, upper+1) )
 				
 				list.add( (path, objComp), False )
 
@@ -999,9 +1075,10 @@ class apiMesh(om.MPxSurfaceShape):
 		if len(componentList) == 0:
 			result = mask.intersects( om.MSelectionMask.kSelectMeshes )
 
-		else:
+		elif mask.intersects(om.MSelectionMask.kSelectMeshVerts):
+			## Only vertices can match, look for the first vertex component
 			for comp in componentList:
-				if comp.apiType() == om.MFn.kMeshVertComponent and mask.intersects(om.MSelectionMask.kSelectMeshVerts):
+				if comp.apiType() == om.MFn.kMeshVertComponent:
 					result = True
 					break
 
@@ -1912,6 +1989,7 @@ class apiMesh(om.MPxSurfaceShape):
 
 			cachedHandle.setMPxData( newCachedData )
 
+	@profiled("apiMesh::computeOutputSurface", om.MProfiler.kColorA_L1)
 	def computeOutputSurface(self, plug, datablock):
 		##
 		## Description
@@ -1975,6 +2053,7 @@ class apiMesh(om.MPxSurfaceShape):
 		# The plug was computed successfully
 		return self
 
+	@profiled("apiMesh::computeWorldSurface", om.MProfiler.kColorA_L1)
 	def computeWorldSurface(self, plug, datablock):
 		##
 		## Description
@@ -2364,9 +2443,14 @@ class apiMesh(om.MPxSurfaceShape):
 		##
 		self.childChanged( om.MPxSurfaceShape.kBoundingBoxChanged )
 		self.childChanged( om.MPxSurfaceShape.kObjectChanged )
+		self.fGeometryVersion += 1
 
 	def setShapeDirty(self):
 		self.fShapeDirty = True
+		self.fGeometryVersion += 1
+
+	def geometryVersion(self):
+		return self.fGeometryVersion
 
 	def notifyViewport(self):
 		omr.MRenderer.setGeometryDrawDirty(self.thisMObject())
@@ -2384,6 +2468,8 @@ class apiMesh(om.MPxSurfaceShape):
 ##
 ################################################################################
 class apiMeshUI(omui.MPxSurfaceShapeUI):
+	## Size in pixels of the screen cells used to look up projected vertices
+	sPickGridCellSize = 32
 
 	@staticmethod
 	def creator():
@@ -2392,6 +2478,9 @@ class apiMeshUI(omui.MPxSurfaceShapeUI):
 	def __init__(self):
 		omui.MPxSurfaceShapeUI.__init__(self)
 
+		## Projected vertices of the last selection, see projectedVertices()
+		self.fPickCache = None
+
 	#####################################################################
 	##
 	## Overrides
@@ -2439,6 +2528,7 @@ class apiMeshUI(omui.MPxSurfaceShapeUI):
 
 	## Main selection routine
 	##
+	@profiled("apiMeshUI::select", om.MProfiler.kColorD_L1)
 	def select(self, selectInfo, selectionList, worldSpaceSelectPts):
 		##
 		## Description:
@@ -2490,6 +2580,7 @@ class apiMeshUI(omui.MPxSurfaceShapeUI):
 	##
 	#####################################################################
 
+	@profiled("apiMeshUI::selectVertices", om.MProfiler.kColorD_L1)
 	def selectVertices(self, selectInfo, selectionList, worldSpaceSelectPts):
 		##
 		## Description:
@@ -2513,63 +2604,46 @@ class apiMeshUI(omui.MPxSurfaceShapeUI):
 		fnComponent = om.MFnSingleIndexedComponent()
 		surfaceComponent = fnComponent.create( om.MFn.kMeshVertComponent )
 
-		## if the user did a single mouse click and we find > 1 selection
-		## we will use the alignmentMatrix to find out which is the closest
-		##
-		alignmentMatrix = om.MMatrix()
-		if singleSelection:
-			alignmentMatrix = selectInfo.getAlignmentMatrix()
-
-		singlePoint = om.MPoint()
 		selectionPoint = om.MPoint()
-		closestPointVertexIndex = -1
-		previousZ = 0
 
 		## Get the geometry information
 		##
 		meshNode = self.surfaceShape()
 		geom = meshNode.meshGeom()
 
-		## Loop through all vertices of the mesh and
-		## see if they lie withing the selection area
+		## Find the vertices whose projection lies within the selection area
 		##
-		for currentPoint in geom.vertices:
-			## Sets OpenGL's render mode to select and stores
-			## selected items in a pick buffer
-			##
-			view.beginSelect()
+		screenPoints, grid = self.projectedVertices( meshNode, geom, view, path )
 
-			glBegin( GL_POINTS )
-			glVertex3f( currentPoint[0], currentPoint[1], currentPoint[2] )
-			glEnd()
+		rectX, rectY, rectWidth, rectHeight = selectInfo.selectRect()
+		hits = self.verticesInRect( screenPoints, grid, rectX, rectY, rectX + rectWidth, rectY + rectHeight )
 
-			if view.endSelect() > 0: ## Hit count > 0
-				selected = True
+		if len(hits) > 0:
+			selected = True
 
-				if singleSelection:
-					xformedPoint = currentPoint
-					xformedPoint.homogenize()
-					xformedPoint *= alignmentMatrix
-					z = xformedPoint.z
-					if closestPointVertexIndex < 0 or z > previousZ:
-						closestPointVertexIndex = vertexIndex
-						singlePoint = currentPoint
-						previousZ = z
+			if singleSelection:
+				## if the user did a single mouse click and we find > 1 selection
+				## we keep the vertex closest to the camera, then the one closest
+				## to the center of the pick area
+				##
+				centerX = rectX + 0.5 * rectWidth
+				centerY = rectY + 0.5 * rectHeight
+				def pickOrder(index):
+					sx, sy, depth = screenPoints[index]
+					return (depth, (sx - centerX)**2 + (sy - centerY)**2)
 
-				else:
-					## multiple selection, store all elements
-					##
-					fnComponent.addElement( vertexIndex )
+				closestPointVertexIndex = min(hits, key=pickOrder)
+				fnComponent.addElement( closestPointVertexIndex )
 
-		## If single selection, insert the closest point into the array
-		##
-		if selected and singleSelection:
-			fnComponent.addElement(closestPointVertexIndex)
+				## need to get world space position for this vertex
+				##
+				selectionPoint = om.MPoint( geom.vertices[closestPointVertexIndex] )
+				selectionPoint *= path.inclusiveMatrix()
 
-			## need to get world space position for this vertex
-			##
-			selectionPoint = singlePoint
-			selectionPoint *= path.inclusiveMatrix()
+			else:
+				## multiple selection, store all elements
+				##
+				fnComponent.addElements( hits )
 
 		## Add the selected component to the selection list
 		##
@@ -2582,77 +2656,146 @@ class apiMeshUI(omui.MPxSurfaceShapeUI):
 
 		return selected
 
+	def projectedVertices(self, meshNode, geom, view, path):
+		##
+		## Description:
+		##
+		##     Project all the vertices to port coordinates in a single pass.
+		##     Returns a list of (x, y, depth) tuples, None for the vertices
+		##     clipped by the camera, and a dictionary of the vertices in each
+		##     screen cell of the port. The result is kept until the view or
+		##     the geometry changes.
+		##
+
+		camera = view.getCamera()
+		objToPort = path.inclusiveMatrix() * camera.inclusiveMatrixInverse() * view.projectionMatrix()
+		portWidth = view.portWidth()
+		portHeight = view.portHeight()
+
+		m = [ objToPort.getElement(row, col) for row in xrange(4) for col in xrange(4) ]
+		key = (meshNode.geometryVersion(), len(geom.vertices), portWidth, portHeight, m)
+		if self.fPickCache is not None and self.fPickCache[0] == key:
+			return self.fPickCache[1], self.fPickCache[2]
+
+		m00, m01, m02, m03, m10, m11, m12, m13, m20, m21, m22, m23, m30, m31, m32, m33 = m
+		halfWidth = 0.5 * portWidth
+		halfHeight = 0.5 * portHeight
+		cellSize = self.sPickGridCellSize
+
+		screenPoints = []
+		grid = collections.defaultdict(list)
+		for index, point in enumerate(geom.vertices):
+			x, y, z, w = point.x, point.y, point.z, point.w
+			clipW = x*m03 + y*m13 + z*m23 + w*m33
+			if clipW <= 1e-6:
+				screenPoints.append( None )
+				continue
+
+			depth = (x*m02 + y*m12 + z*m22 + w*m32) / clipW
+			if depth < -1.0 or depth > 1.0:
+				screenPoints.append( None )
+				continue
+
+			sx = ((x*m00 + y*m10 + z*m20 + w*m30) / clipW + 1.0) * halfWidth
+			sy = ((x*m01 + y*m11 + z*m21 + w*m31) / clipW + 1.0) * halfHeight
+			screenPoints.append( (sx, sy, depth) )
+
+			if 0.0 <= sx <= portWidth and 0.0 <= sy <= portHeight:
+				grid[ (int(sx // cellSize), int(sy // cellSize)) ].append( index )
+
+		self.fPickCache = (key, screenPoints, grid)
+		return screenPoints, grid
+
+	def verticesInRect(self, screenPoints, grid, xMin, yMin, xMax, yMax):
+		##
+		## Description:
+		##
+		##     Return the sorted indices of the projected vertices inside the
+		##     port rectangle, only looking at the grid cells it overlaps.
+		##
+
+		cellSize = self.sPickGridCellSize
+		hits = []
+		for cellX in xrange(int(xMin // cellSize), int(xMax // cellSize) + 1):
+			for cellY in xrange(int(yMin // cellSize), int(yMax // cellSize) + 1):
+				for index in grid.get( (cellX, cellY), () ):
+					sx, sy = screenPoints[index][:2]
+					if xMin <= sx <= xMax and yMin <= sy <= yMax:
+						hits.append( index )
+
+		hits.sort()
+		return hits
+
 	def drawUVWireframe(self, geom, view, info):
 		##
 		## Description: 
 		##  Draws the UV layout in wireframe mode. 
 		## 
 
+		lines = geom.uvcoords.drawBuffers(geom.face_counts)[0]
+		if len(lines) == 0:
+			return
+
 		view.beginGL()
 		
-		## Draw the polygons
+		## Draw the polygon edges in a single call
 		##
-		vid = 0
-		vid_start = vid
-		for i in xrange(geom.faceCount):
-			glBegin( GL_LINES )
-
-			vid_start = vid 
-			for v in xrange(geom.face_counts[i]-1):
-				uvId1 = geom.uvcoords.uvId(vid)
-				uvId2 = geom.uvcoords.uvId(vid+1)
-
-				uv1 = geom.uvcoords.getUV(uvId1)
-				uv2 = geom.uvcoords.getUV(uvId2)
-
-				glVertex3f( uv1[0], uv1[1], 0.0 ) 
-				glVertex3f( uv2[0], uv2[1], 0.0 ) 
-				vid += 1
-			
-			uvId1 = geom.uvcoords.uvId(vid)
-			uvId2 = geom.uvcoords.uvId(vid_start)
-
-			uv1 = geom.uvcoords.getUV(uvId1)
-			uv2 = geom.uvcoords.getUV(uvId2)
-
-			glVertex3f( uv1[0], uv1[1], 0.0 ) 
-			glVertex3f( uv2[0], uv2[1], 0.0 ) 
-			vid += 1
-
-			glEnd()
+		glPushClientAttrib( GL_CLIENT_VERTEX_ARRAY_BIT )
+		glEnableClientState( GL_VERTEX_ARRAY )
+		glVertexPointer( 2, GL_FLOAT, 0, lines )
+		glDrawArrays( GL_LINES, 0, len(lines) // 2 )
+		glPopClientAttrib()
 		
 		view.endGL()
 
-	def drawUVMapCoord(self, view, uvId, uv, drawNumbers):
+	def visibleUVRect(self, view):
 		##
 		## Description: 
-		##  Draw the specified uv value into the port view. If drawNumbers is True 
-		##  It will also draw the UV id for the the UV.  
+		##  Return the (uMin, vMin, uMax, vMax) bounds of the uv range shown 
+		##  in the UV editor port. 
 		##
 
-		if drawNumbers:
-			view.drawText( str(uvId), om.MPoint( uv[0], uv[1], 0 ), omui.M3dView.kCenter )
+		lowerNear = view.viewToWorld( 0, 0 )[0]
+		upperNear = view.viewToWorld( view.portWidth(), view.portHeight() )[0]
 
-		glVertex3f( uv[0], uv[1], 0.0 )
+		return ( min(lowerNear.x, upperNear.x), min(lowerNear.y, upperNear.y),
+				 max(lowerNear.x, upperNear.x), max(lowerNear.y, upperNear.y) )
 
 	def drawUVMapCoordNum(self, geom, view, info, drawNumbers):
 		##
 		## Description: 
-		##  Draw the UV points for all uvs on this surface shape. 
+		##  Draw the UV points for all uvs on this surface shape. If drawNumbers 
+		##  is True it will also draw the ids of the uvs inside the port. 
 		##
 
+		points = geom.uvcoords.drawBuffers(geom.face_counts)[1]
+		if len(points) == 0:
+			return
+
 		view.beginGL() 
 
 		ptSize = glGetFloatv( GL_POINT_SIZE )
 		glPointSize( 4.0 )
 
-		for uvId in xrange(geom.uvcoords.uvcount()):
-			uv = geom.uvcoords.getUV( uvId )
-			self.drawUVMapCoord( view, uvId, uv, drawNumbers )
+		glPushClientAttrib( GL_CLIENT_VERTEX_ARRAY_BIT )
+		glEnableClientState( GL_VERTEX_ARRAY )
+		glVertexPointer( 2, GL_FLOAT, 0, points )
+		glDrawArrays( GL_POINTS, 0, len(points) // 2 )
+		glPopClientAttrib()
 
 		glPointSize( ptSize )
 
 		view.endGL() 
+
+		## Only label the uvs that can be seen
+		##
+		if drawNumbers:
+			uMin, vMin, uMax, vMax = self.visibleUVRect( view )
+			for uvId in xrange(len(points) // 2):
+				u = points[2*uvId]
+				v = points[2*uvId+1]
+				if uMin <= u <= uMax and vMin <= v <= vMax:
+					view.drawText( str(uvId), om.MPoint( u, v, 0 ), omui.M3dView.kCenter )
 		
 ################################################################################
 ##
@@ -2725,6 +2868,7 @@ class apiMeshCreator(om.MPxNode):
 	##
     ##########################################################
 
+	@profiled("apiMeshCreator::compute", om.MProfiler.kColorA_L1)
 	def compute(self, plug, datablock):
 		##
 		## Description
@@ -3024,16 +3168,20 @@ class apiMeshHWSelectionUserData(om.MUserData):
 		self.fMeshGeom = None
 		self.fInstanceIndex = 0
 		self.fFaceViewSelectedStates = None
+		## Optional primitive to component lookup tables, set when the
+		## index buffer of the render item does not follow the component order
+		self.fFaceLookupTable = None
+		self.fEdgeLookupTable = None
+
 
-		
-sViewSelectedInstanceMark = -1		
 sViewSelectedFaceSelectionNames = set()
 		
-# Gather the view-selected face indices of each instance. Use -1 to mark a	
-# view-selected instance (but not any of its faces) for easier processing
-# later in shouldDrawInstance().	 
-def gatherViewSelectedFaceInfo(frameContext, instances, meshGeom):
-	viewSelectedFaceInfo = collections.defaultdict(list)
+# Gather a bitmap of the view-selected faces of each instance. An instance which
+# is view-selected but none of its faces gets a bitmap with no face set, for
+# easier processing later in shouldDrawInstance(). When a cache dictionary is
+# given the bitmaps of each view are kept until its filtered object list changes.
+def gatherViewSelectedFaceInfo(frameContext, instances, meshGeom, cache=None):
+	viewSelectedFaceInfo = {}
 	
 	if (not meshGeom or meshGeom.faceCount <= 0):
 		return False, viewSelectedFaceInfo
@@ -3052,6 +3200,12 @@ def gatherViewSelectedFaceInfo(frameContext, instances, meshGeom):
 	viewSelectedList = view.filteredObjectList()
 	if(viewSelectedList):
 		
+		viewName = renderingDestinationResult[1]
+		if cache is not None:
+			cacheKey = (viewSelectedList.getSelectionStrings(), [instance.fullPathName() for instance in instances], meshGeom.faceCount)
+			if viewName in cache and cache[viewName][0] == cacheKey:
+				return True, cache[viewName][1]
+
 		for instIdx in xrange(len(instances)):
 			intersectionList = om.MSelectionList()
 			
@@ -3062,39 +3216,437 @@ def gatherViewSelectedFaceInfo(frameContext, instances, meshGeom):
 			while not selectionIt.isDone():
 				comp = selectionIt.getComponent()[1]
 				
-				if(comp.isNull()):
-					viewSelectedFaceInfo[instIdx].append(sViewSelectedInstanceMark)
-					
-				else:
+				if instIdx not in viewSelectedFaceInfo:
+					viewSelectedFaceInfo[instIdx] = bytearray(meshGeom.faceCount)
+
+				if(not comp.isNull()):
 					fnComp = om.MFnSingleIndexedComponent(comp)		
 					
 					if (fnComp.componentType == om.MFn.kMeshPolygonComponent):
-						faceIds = fnComp.getElements()
-						
-						for i in xrange(len(faceIds)):
-							faceId = faceIds[i]
+						faceBitmap = viewSelectedFaceInfo[instIdx]
+						for faceId in fnComp.getElements():
 							if (faceId >= 0 and faceId < meshGeom.faceCount):
-								viewSelectedFaceInfo[instIdx].append(faceId)
+								faceBitmap[faceId] = 1
 				
 				selectionIt.next()
+
+		if cache is not None:
+			cache[viewName] = (cacheKey, viewSelectedFaceInfo)
 				
 	return True, viewSelectedFaceInfo
 
-# If an instance has only -1 stored in its ViewSelectedFaceInfo map, it is
+# Return True if any face is set in a view-selected face bitmap.
+def hasViewSelectedFaces(faceBitmap):
+	return 1 in faceBitmap
+
+# If an instance has no face set in its view-selected face bitmap, it is
 # view-selected but none of its faces is, so the instance should be drawn.
 def shouldDrawInstance(viewSelectedFaceInfo, instIdx):
-	found = False
-	
-	if instIdx in viewSelectedFaceInfo:
-		faceIds = viewSelectedFaceInfo[instIdx]
-		
-		for id in faceIds:
-			if id != sViewSelectedInstanceMark:
-				return False
-			found = True
-	
-	return found
-	
+	faceBitmap = viewSelectedFaceInfo.get(instIdx)
+	return faceBitmap is not None and not hasViewSelectedFaces(faceBitmap)
+
+################################################################################
+##
+## Index buffer helpers
+##
+## Shared by both draw overrides to build compact index data : 16-bit indices
+## whenever the vertex count allows it, triangles reordered for the
+## post-transform vertex cache and wireframe edges emitted only once.
+##
+################################################################################
+## Size of the post-transform vertex cache the triangle order is tuned for
+sVertexCacheSize = 16
+
+def indexBufferType(vertexCount):
+	## Pick the narrowest index type able to address vertexCount vertices.
+	## Returns the MGeometry data type along with the matching ctypes type.
+	if vertexCount <= 0xFFFF:
+		return omr.MGeometry.kUnsignedInt16, ctypes.c_ushort
+	return omr.MGeometry.kUnsignedInt32, ctypes.c_uint
+
+def fillIndexBuffer(indexBuffer, indices, ctype):
+	## Copy a list of indices into an acquired index buffer in one shot
+	count = len(indices)
+	dataAddress = indexBuffer.acquire(count, True) ## writeOnly - we don't need the current buffer values
+	if not dataAddress:
+		return False
+
+	data = (ctype * count).from_address(dataAddress)
+	data[:] = indices
+	indexBuffer.commit(dataAddress)
+	return True
+
+def buildTriangleIndices(meshGeom, faceStates=None):
+	## Fan-triangulate the convex faces of the geometry.
+	## Returns the vertex indices of the triangles and the face id of each
+	## triangle. If faceStates is given only the enabled faces are kept.
+	indices = []
+	triangleFaceIds = []
+	connects = list(meshGeom.face_connects)
+	counts = list(meshGeom.face_counts)
+
+	base = 0
+	for faceIdx in xrange(meshGeom.faceCount):
+		## Ignore degenerate faces
+		numVerts = counts[faceIdx]
+		if numVerts > 2 and (faceStates is None or faceStates[faceIdx]):
+			first = connects[base]
+			for v in xrange(1, numVerts-1):
+				indices.extend((first, connects[base+v], connects[base+v+1]))
+			triangleFaceIds.extend([faceIdx] * (numVerts-2))
+		base += numVerts
+
+	return indices, triangleFaceIds
+
+def optimizeTriangleOrder(indices, vertexCount, cacheSize=sVertexCacheSize):
+	## Reorder triangles for post-transform vertex cache locality.
+	## This is the "Tipsify" algorithm (Sander, Nehab and Barczak, 2007) which
+	## runs in linear time : triangles are emitted as fans around a vertex and
+	## the next fanning vertex is picked among the ones still in the cache.
+	## Returns the triangle ids in their new order.
+	numTriangles = len(indices) // 3
+	if numTriangles == 0:
+		return []
+
+	## Vertex to triangle adjacency, stored as offsets into a flat array
+	liveCount = [0] * vertexCount
+	for vid in indices:
+		liveCount[vid] += 1
+
+	offsets = [0] * (vertexCount+1)
+	for vid in xrange(vertexCount):
+		offsets[vid+1] = offsets[vid] + liveCount[vid]
+
+	adjacency = [0] * len(indices)
+	fill = offsets[:-1]
+	for i, vid in enumerate(indices):
+		adjacency[fill[vid]] = i // 3
+		fill[vid] += 1
+
+	cacheTime = [0] * vertexCount
+	emitted = [False] * numTriangles
+	deadEnd = []
+	order = []
+	time = cacheSize + 1
+	cursor = 0
+	fanning = indices[0]
+
+	while fanning >= 0:
+		## Emit all the remaining triangles around the fanning vertex
+		candidates = []
+		for tri in adjacency[offsets[fanning]:offsets[fanning+1]]:
+			if emitted[tri]:
+				continue
+			emitted[tri] = True
+			order.append(tri)
+
+			for vid in indices[3*tri:3*tri+3]:
+				deadEnd.append(vid)
+				candidates.append(vid)
+				liveCount[vid] -= 1
+				if time - cacheTime[vid] > cacheSize:
+					cacheTime[vid] = time
+					time += 1
+
+		## Pick the candidate that will still be in the cache after its fan
+		fanning = -1
+		bestPriority = -1
+		for vid in candidates:
+			if liveCount[vid] > 0:
+				priority = 0
+				if time - cacheTime[vid] + 2*liveCount[vid] <= cacheSize:
+					priority = time - cacheTime[vid]
+				if priority > bestPriority:
+					bestPriority = priority
+					fanning = vid
+
+		## Dead end : fall back on recently used vertices, then on any vertex
+		if fanning < 0:
+			while deadEnd:
+				vid = deadEnd.pop()
+				if liveCount[vid] > 0:
+					fanning = vid
+					break
+
+		if fanning < 0:
+			while cursor < vertexCount:
+				if liveCount[cursor] > 0:
+					fanning = cursor
+					break
+				cursor += 1
+
+	return order
+
+def buildWireEdgeIndices(meshGeom, faceVertexIndexing=False):
+	## Build the line list for the wireframe, emitting edges shared between
+	## faces only once. Indices are vertex ids, or face-vertex ids when the
+	## vertex streams are not shared between faces (faceVertexIndexing).
+	## Returns the indices and, for each line, the id of the first face edge
+	## it stands for so selection can map it back to a component.
+	indices = []
+	edgeIds = []
+	visited = set()
+	connects = list(meshGeom.face_connects)
+	counts = list(meshGeom.face_counts)
+
+	base = 0
+	edgeId = 0
+	for faceIdx in xrange(meshGeom.faceCount):
+		## Ignore degenerate faces
+		numVerts = counts[faceIdx]
+		if numVerts > 2:
+			for v in xrange(numVerts):
+				vindex1 = base + v
+				vindex2 = base + ((v+1) % numVerts)
+				vertexId1 = connects[vindex1]
+				vertexId2 = connects[vindex2]
+
+				key = (vertexId1, vertexId2) if vertexId1 < vertexId2 else (vertexId2, vertexId1)
+				if key not in visited:
+					visited.add(key)
+					if faceVertexIndexing:
+						indices.extend((vindex1, vindex2))
+					else:
+						indices.extend((vertexId1, vertexId2))
+					edgeIds.append(edgeId)
+				edgeId += 1
+		base += numVerts
+
+	return indices, edgeIds
+
+################################################################################
+##
+## Level of detail helpers
+##
+################################################################################
+def buildClusteredLOD(meshGeom, resolution):
+	## Simplify the geometry by vertex clustering : vertices are snapped to a
+	## grid of resolution^3 cells spanning the bounding box and all the vertices
+	## of a cell are merged into their average. Triangles and edges collapsing
+	## inside a cell are dropped, as are duplicates.
+	## Returns the positions, normals, triangle indices and line indices of the
+	## simplified geometry, or None if there is nothing to simplify.
+	points = meshGeom.vertices
+	normals = meshGeom.normals
+	numPoints = len(points)
+	numNormals = len(normals)
+	if numPoints == 0:
+		return None
+
+	lower = [ points[0][0], points[0][1], points[0][2] ]
+	upper = list(lower)
+	for pnt in points:
+		for k in xrange(3):
+			if pnt[k] < lower[k]:	lower[k] = pnt[k]
+			if pnt[k] > upper[k]:	upper[k] = pnt[k]
+
+	scale = [ resolution / max(upper[k] - lower[k], 1e-6) for k in xrange(3) ]
+	lastCell = resolution - 1
+
+	## Accumulate position, normal and count per occupied cell
+	cellIds = {}
+	sums = []
+	remap = [0] * numPoints
+	for vid in xrange(numPoints):
+		pnt = points[vid]
+		key = tuple( min(int((pnt[k] - lower[k]) * scale[k]), lastCell) for k in xrange(3) )
+		cellId = cellIds.get(key)
+		if cellId is None:
+			cellId = len(sums)
+			cellIds[key] = cellId
+			sums.append([0.0] * 7)
+
+		acc = sums[cellId]
+		acc[0] += pnt[0]
+		acc[1] += pnt[1]
+		acc[2] += pnt[2]
+		if vid < numNormals:
+			normal = normals[vid]
+			acc[3] += normal[0]
+			acc[4] += normal[1]
+			acc[5] += normal[2]
+		acc[6] += 1.0
+		remap[vid] = cellId
+
+	positions = []
+	clusterNormals = []
+	for acc in sums:
+		positions.append( (acc[0] / acc[6], acc[1] / acc[6], acc[2] / acc[6]) )
+		length = math.sqrt(acc[3]*acc[3] + acc[4]*acc[4] + acc[5]*acc[5])
+		if length > 0.0:
+			clusterNormals.append( (acc[3] / length, acc[4] / length, acc[5] / length) )
+		else:
+			clusterNormals.append( (0.0, 1.0, 0.0) )
+
+	## Remap the full resolution primitives onto the clusters
+	triangleIndices = []
+	visited = set()
+	fullTriangles = buildTriangleIndices(meshGeom)[0]
+	for i in xrange(0, len(fullTriangles), 3):
+		a = remap[fullTriangles[i]]
+		b = remap[fullTriangles[i+1]]
+		c = remap[fullTriangles[i+2]]
+		if a == b or b == c or a == c:
+			continue
+		key = tuple(sorted((a, b, c)))
+		if key not in visited:
+			visited.add(key)
+			triangleIndices.extend((a, b, c))
+
+	lineIndices = []
+	visited = set()
+	fullLines = buildWireEdgeIndices(meshGeom)[0]
+	for i in xrange(0, len(fullLines), 2):
+		a = remap[fullLines[i]]
+		b = remap[fullLines[i+1]]
+		if a == b:
+			continue
+		key = (a, b) if a < b else (b, a)
+		if key not in visited:
+			visited.add(key)
+			lineIndices.extend((a, b))
+
+	return positions, clusterNormals, triangleIndices, lineIndices
+
+def projectedBoundsSize(bounds, objToWorld, viewProjection, viewportHeight):
+	## Return the height in pixels covered on screen by the given object space
+	## bounding box. A box crossing the near plane is considered infinitely large.
+	bbmin = bounds.min
+	bbmax = bounds.max
+	objToClip = objToWorld * viewProjection
+
+	lowerX = lowerY = float("inf")
+	upperX = upperY = float("-inf")
+	for x in (bbmin.x, bbmax.x):
+		for y in (bbmin.y, bbmax.y):
+			for z in (bbmin.z, bbmax.z):
+				corner = om.MPoint(x, y, z) * objToClip
+				if corner.w <= 1e-6:
+					return float("inf")
+				ndcX = corner.x / corner.w
+				ndcY = corner.y / corner.w
+				lowerX = min(lowerX, ndcX)
+				upperX = max(upperX, ndcX)
+				lowerY = min(lowerY, ndcY)
+				upperY = max(upperY, ndcY)
+
+	## NDC spans [-1, 1] over the viewport height
+	return 0.5 * max(upperX - lowerX, upperY - lowerY) * viewportHeight
+
+################################################################################
+##
+## Culling helpers
+##
+################################################################################
+def frustumPlanes(viewProjection):
+	## Extract the six clip planes (a, b, c, d) of a view-projection matrix.
+	## Maya uses row vectors (clip = point * matrix) so the planes are sums and
+	## differences of the matrix columns. Points inside have a positive distance.
+	## The near plane is the OpenGL one, which is conservative for DirectX.
+	planes = []
+	for axis in xrange(3):
+		for sign in (1.0, -1.0):
+			planes.append( [ viewProjection.getElement(row, 3) + sign * viewProjection.getElement(row, axis) for row in xrange(4) ] )
+	return planes
+
+def isBoxOutsideFrustum(planes, bounds, objToWorld):
+	## Return True when the object space bounding box, placed in the world by
+	## objToWorld, lies entirely on the outer side of one of the frustum planes.
+	## Each plane is brought to object space so the box never gets transformed.
+	bbmin = bounds.min
+	bbmax = bounds.max
+	rows = [ [ objToWorld.getElement(i, j) for j in xrange(4) ] for i in xrange(4) ]
+
+	for plane in planes:
+		a, b, c, d = [ row[0]*plane[0] + row[1]*plane[1] + row[2]*plane[2] + row[3]*plane[3] for row in rows ]
+
+		## Test the corner furthest along the plane normal
+		x = bbmax.x if a >= 0.0 else bbmin.x
+		y = bbmax.y if b >= 0.0 else bbmin.y
+		z = bbmax.z if c >= 0.0 else bbmin.z
+		if a*x + b*y + c*z + d < 0.0:
+			return True
+
+	return False
+
+################################################################################
+##
+## Component converter helpers
+##
+## Intersections are accumulated as raw primitive positions in a preallocated
+## integer array. They are mapped to component ids through the lookup table
+## built by initialize(), and the component is filled in a single call, only
+## when component() is called.
+##
+################################################################################
+def mapPrimitiveHits(hits, lookupTable, outOfRangeId=None):
+	## Map index buffer primitive positions to component ids through a lookup
+	## table, None meaning the position is the id. Positions outside the table
+	## map to outOfRangeId, or are kept as is when it is None.
+	## Returns the sorted unique component ids.
+	if lookupTable is None:
+		return sorted(set(hits))
+
+	tableSize = len(lookupTable)
+	inRange = [ idx for idx in hits if idx >= 0 and idx < tableSize ]
+
+	componentIds = set()
+	if len(inRange) > 1:
+		componentIds.update(operator.itemgetter(*inRange)(lookupTable))
+	elif len(inRange) == 1:
+		componentIds.add(lookupTable[inRange[0]])
+
+	if len(inRange) < len(hits):
+		if outOfRangeId is None:
+			componentIds.update(idx for idx in hits if idx < 0 or idx >= tableSize)
+		else:
+			componentIds.add(outOfRangeId)
+
+	return sorted(componentIds)
+
+class apiMeshComponentConverter(omr.MPxComponentConverter):
+	def __init__(self, componentType):
+		omr.MPxComponentConverter.__init__(self)
+
+		self.fComponentType = componentType
+		self.fComponent = om.MFnSingleIndexedComponent()
+		self.fComponentObject = om.MObject.kNullObj
+
+		## Component id of each primitive position, None when they are the same
+		self.fLookupTable = None
+		## Component id of the positions outside of the lookup table, None to keep them
+		self.fOutOfRangeId = None
+
+		self.fHits = array.array('i')
+		self.fNumHits = 0
+
+	def initializeHits(self, lookupTable, outOfRangeId=None):
+		## Create the component selection object, and preallocate room for
+		## one hit per primitive
+		self.fComponentObject = self.fComponent.create( self.fComponentType )
+		self.fLookupTable = lookupTable
+		self.fOutOfRangeId = outOfRangeId
+
+		capacity = len(lookupTable) if lookupTable is not None else 0
+		self.fHits = array.array('i', [0]) * max(capacity, 64)
+		self.fNumHits = 0
+
+	def addHit(self, idx):
+		## Store the primitive position, growing the array when it is full
+		if self.fNumHits == len(self.fHits):
+			self.fHits.extend(self.fHits)
+		self.fHits[self.fNumHits] = idx
+		self.fNumHits += 1
+
+	def component(self):
+		## Return the component object that contains the ids of the selected
+		## components, adding the pending hits to it first
+		if self.fNumHits > 0:
+			componentIds = mapPrimitiveHits(self.fHits[:self.fNumHits], self.fLookupTable, self.fOutOfRangeId)
+			self.fComponent.addElements(componentIds)
+			self.fNumHits = 0
+		return self.fComponentObject
+
 ################################################################################
 ##
 ## apiMeshSubSceneOverride
@@ -3107,57 +3659,37 @@ def shouldDrawInstance(viewSelectedFaceInfo, instIdx):
 ## Attached to the vertex, edge and face selection render items
 ## respectively apiMeshSubSceneOverride.sVertexSelectionName, apiMeshSubSceneOverride.sEdgeSelectionName
 ## and apiMeshSubSceneOverride.sFaceSelectionName
-class simpleComponentConverter_subsceneOverride(omr.MPxComponentConverter):
+class simpleComponentConverter_subsceneOverride(apiMeshComponentConverter):
 	def __init__(self, componentType, selectionType):
-		omr.MPxComponentConverter.__init__(self)
+		apiMeshComponentConverter.__init__(self, componentType)
 
-		self.fComponentType = componentType
 		self.fSelectionType = selectionType
 
-		self.fComponent = om.MFnSingleIndexedComponent()
-		self.fComponentObject = om.MObject.kNullObj
-		self.fLookupTable = []
-
 	def initialize(self, renderItem):
-		## Create the component selection object
-		self.fComponentObject = self.fComponent.create( self.fComponentType )
-
-		## For face selection, 
-		## create a lookup table to match triangle intersection with face id :
-		## One face may contains more than one triangle
-		if self.fComponentType == om.MFn.kMeshPolygonComponent:
-			selectionData = renderItem.customData()
-			if isinstance(selectionData, apiMeshHWSelectionUserData):
+		## For vertex: the primitive index value is the same as the component id
+		## For edge and face: use the lookup table of the render item when its
+		## index buffer has been reordered or compacted
+		lookupTable = None
+		selectionData = renderItem.customData()
+		if isinstance(selectionData, apiMeshHWSelectionUserData):
+			if self.fComponentType == om.MFn.kMeshPolygonComponent and selectionData.fFaceLookupTable is not None:
+				lookupTable = selectionData.fFaceLookupTable
+			elif self.fComponentType == om.MFn.kMeshEdgeComponent and selectionData.fEdgeLookupTable is not None:
+				lookupTable = selectionData.fEdgeLookupTable
+
+			## For face selection, 
+			## create a lookup table to match triangle intersection with face id :
+			## One face may contains more than one triangle
+			elif self.fComponentType == om.MFn.kMeshPolygonComponent:
 				meshGeom = selectionData.fMeshGeom
 				faceStates = selectionData.fFaceViewSelectedStates
+				lookupTable = array.array('i', buildTriangleIndices(meshGeom, faceStates)[1])
 
-				## Allocate faces lookup table
-				numTriangles = 0
-				for i in xrange(meshGeom.faceCount):
-					numVerts = meshGeom.face_counts[i]
-					if numVerts > 2:
-						if(not faceStates or faceStates[i]):
-							numTriangles += numVerts - 2
-				
-				self.fLookupTable = [0]*numTriangles
-
-				## Fill faces lookup table
-				triId = 0
-				for faceId in xrange(meshGeom.faceCount):
-					## ignore degenerate faces
-					numVerts = meshGeom.face_counts[faceId]
-					if numVerts > 2:
-						if(not faceStates or faceStates[faceId]):
-							for v in xrange(1, numVerts-1):
-								self.fLookupTable[triId] = faceId
-								triId += 1
+		self.initializeHits(lookupTable)
 
 	def addIntersection(self, intersection):
-		## Convert the intersection index, which represent the primitive position in the
-		## index buffer, to the correct component id
-
-		## For vertex and edge: the primitive index value is the same as the component id
-		## For face: get the face id that matches the triangle index from the lookup table
+		## Store the intersection index, which represent the primitive position in the
+		## index buffer. It is converted to a component id in component()
 
 		if self.fComponentType == om.MFn.kMeshEdgeComponent:
 			# Only accept edge selection intersection on draw instance #2 -- scaled by 2
@@ -3165,17 +3697,7 @@ class simpleComponentConverter_subsceneOverride(omr.MPxComponentConverter):
 			if intersection.instanceID == 1 or intersection.instanceID == 3:
 				return
 
-		idx = intersection.index
-
-		if self.fComponentType == om.MFn.kMeshPolygonComponent:
-			if idx >= 0 and idx < len(self.fLookupTable):
-				idx = self.fLookupTable[idx]
-
-		self.fComponent.addElement(idx)
-
-	def component(self):
-		## Return the component object that contains the ids of the selected components
-		return self.fComponentObject
+		self.addHit(intersection.index)
 
 	def selectionMask(self):
 		## This converter is only valid for specified selection type
@@ -3215,11 +3737,21 @@ class apiMeshSubSceneOverride(omr.MPxSubSceneOverride):
 	sActiveFaceName   = "apiMeshActiveFace"
 	
 	sNameSeparator    = "_"
+	sLODName          = "lod"
+
+	## Level of detail chain : grid resolution used to cluster the vertices of
+	## each level, and on-screen height in pixels under which an instance
+	## switches to that level. Switching back requires going past the threshold
+	## by the hysteresis ratio to avoid popping back and forth.
+	sLODGridResolutions = (32, 16, 8)
+	sLODScreenSizes     = (256.0, 96.0, 32.0)
+	sLODHysteresis      = 0.15
 	
 	class InstanceInfo:
-		def __init__(self, transform, isSelected):
+		def __init__(self, transform, isSelected, lodLevel=0):
 			self.fTransform = transform
 			self.fIsSelected = isSelected
+			self.fLODLevel = lodLevel
 
 	@staticmethod
 	def creator(obj):
@@ -3262,6 +3794,31 @@ class apiMeshSubSceneOverride(omr.MPxSubSceneOverride):
 		self.fIsInstanceMode = False
 		self.fQueueUpdate = False
 		self.fUseQueuedLineUpdate = False ## Set to True to run sample line width update code
+		self.fOptimizeIndexBuffers = True ## Set to False to use plain fan triangulation and per-face wire edges
+
+		## Primitive to component lookup tables matching the shaded and wire index buffers
+		self.fTriangleFaceIds = None
+		self.fWireEdgeIds = None
+
+		## Shaded triangles in draw order, with getters of their face states per
+		## triangle and per triangle corner, used to gather isolated faces
+		self.fShadedIndices = None
+		self.fShadedTriangleFaceIds = None
+		self.fShadedTriangleStates = None
+		self.fShadedCornerStates = None
+
+		self.fUseLOD = False ## Set to True to draw distant instances with simplified geometry
+		self.fCullInstances = True ## Set to False to submit off-screen instances to the instanced render items
+		self.fDebugCulling = False ## Set to True to print the culling statistics when they change
+
+		## Culling statistics of the last update
+		self.fNumVisibleInstances = 0
+		self.fNumCulledInstances = 0
+
+		## Per instanced render item name, the index in the DAG instance list of
+		## each instance transform submitted to the item, in submission order
+		self.fInstancePathIndices = {}
+		self.fLODBuffers = [] ## (positions, normals, shaded indices, wire indices) per coarser level
 
 		self.fInstanceInfoCache = collections.defaultdict(set)
 
@@ -3269,7 +3826,8 @@ class apiMeshSubSceneOverride(omr.MPxSubSceneOverride):
 		self.fActiveEdgesSet = set()
 		self.fActiveFacesSet = set()
 		
-		self.fViewSelectedFaceInfoCache = collections.defaultdict(list)
+		self.fViewSelectedFaceInfoCache = {}
+		self.fViewSelectedFaceBitmapCache = {}
 		self.fLinkLostCallbackData      = []
 
 	def __del__(self):
@@ -3338,6 +3896,7 @@ class apiMeshSubSceneOverride(omr.MPxSubSceneOverride):
 
 		return False
 
+	@profiled("apiMeshSubSceneOverride::manageRenderItems", om.MProfiler.kColorC_L1)
 	def manageRenderItems(self, container, frameContext, updateGeometry):
 		## Preamble
 		if not self.fMesh or self.fObject.isNull():
@@ -3398,7 +3957,7 @@ class apiMeshSubSceneOverride(omr.MPxSubSceneOverride):
 		if not all((self.fPositionBuffer, self.fNormalBuffer, self.fBoxPositionBuffer, self.fWireIndexBuffer, self.fBoxIndexBuffer, self.fShadedIndexBuffer)):
 			return
 		
-		isActiveViewFiltered, viewSelectedFaceInfo = gatherViewSelectedFaceInfo(frameContext, instances, self.fMesh.meshGeom())	
+		isActiveViewFiltered, viewSelectedFaceInfo = gatherViewSelectedFaceInfo(frameContext, instances, self.fMesh.meshGeom(), self.fViewSelectedFaceBitmapCache)
 		
 		selectedList = om.MGlobal.getActiveSelectionList()
 
@@ -3413,6 +3972,35 @@ class apiMeshSubSceneOverride(omr.MPxSubSceneOverride):
 		selectedInstanceMatrixArray = om.MMatrixArray(instanceArrayLength)
 		unselectedInstanceMatrixArray = om.MMatrixArray(instanceArrayLength)
 
+		## With level of detail enabled, the full resolution shaded and wire items
+		## only draw the instances at level 0, the others go to the LOD items
+		useLOD = self.fUseLOD and len(self.fLODBuffers) > 0
+		shadedInstanceMatrices = []
+		wireInstanceMatrices = []
+		lodShadedInstanceMatrices = collections.defaultdict(list)
+		lodWireInstanceMatrices = collections.defaultdict(list)
+
+		## DAG instance index of each matrix added to the arrays above, used
+		## to resolve the instance ID of a hit back to its DAG path
+		drawnInstanceIndices = []
+		selectedInstanceIndices = []
+		unselectedInstanceIndices = []
+		shadedInstanceIndices = []
+		wireInstanceIndices = []
+		lodShadedInstanceIndices = collections.defaultdict(list)
+		lodWireInstanceIndices = collections.defaultdict(list)
+
+		## Off-screen instances are only culled when drawn through instancing,
+		## single instances keep their render items untouched
+		cullInstances = self.fCullInstances and (self.fIsInstanceMode or instanceArrayLength > 1)
+		numInstancesCulled = 0
+
+		if useLOD or cullInstances:
+			bounds = self.fMesh.boundingBox()
+			viewProjection = frameContext.getMatrix(omr.MFrameContext.kViewProjMtx)
+			viewportHeight = frameContext.getViewportDimensions()[3]
+			planes = frustumPlanes(viewProjection)
+
 		for instIdx in xrange(instanceArrayLength):
 			## If expecting large numbers of instances, then walking through the whole
 			## list of instances every time to look for changes is not efficient
@@ -3422,11 +4010,26 @@ class apiMeshSubSceneOverride(omr.MPxSubSceneOverride):
 			instance = instances[instIdx]
 			instanceNum = instance.instanceNumber()
 
-			if (instance.isValid and instance.isVisible and (not isActiveViewFiltered or shouldDrawInstance(viewSelectedFaceInfo, instIdx))):
-				instanceInfo = apiMeshSubSceneOverride.InstanceInfo(instance.inclusiveMatrix(), useSelectHighlight(selectedList, instance))
+			isDrawn = instance.isValid and instance.isVisible and (not isActiveViewFiltered or shouldDrawInstance(viewSelectedFaceInfo, instIdx))
+			if isDrawn:
+				objToWorld = instance.inclusiveMatrix()
+				if cullInstances and isBoxOutsideFrustum(planes, bounds, objToWorld):
+					isDrawn = False
+					numInstancesCulled += 1
+
+			if isDrawn:
+				instanceInfo = apiMeshSubSceneOverride.InstanceInfo(objToWorld, useSelectHighlight(selectedList, instance))
+
+				if useLOD:
+					prevLevel = 0
+					if instanceNum in self.fInstanceInfoCache:
+						prevLevel = self.fInstanceInfoCache[instanceNum].fLODLevel
+					screenSize = projectedBoundsSize(bounds, instanceInfo.fTransform, viewProjection, viewportHeight)
+					instanceInfo.fLODLevel = self.selectLODLevel(prevLevel, screenSize)
 
 				if( instanceNum not in self.fInstanceInfoCache or 
 				    self.fInstanceInfoCache[instanceNum].fIsSelected != instanceInfo.fIsSelected or 
+					self.fInstanceInfoCache[instanceNum].fLODLevel != instanceInfo.fLODLevel or 
 					not self.fInstanceInfoCache[instanceNum].fTransform.isEquivalent(instanceInfo.fTransform)):
 					
 					self.fInstanceInfoCache[instanceNum] = instanceInfo
@@ -3434,13 +4037,30 @@ class apiMeshSubSceneOverride(omr.MPxSubSceneOverride):
 				
 				instanceMatrixArray[numInstances] = instanceInfo.fTransform
 				numInstances += 1
+				drawnInstanceIndices.append(instIdx)
 				
 				if instanceInfo.fIsSelected:
 					selectedInstanceMatrixArray[numInstanceSelected] = instanceInfo.fTransform
 					numInstanceSelected += 1
+					selectedInstanceIndices.append(instIdx)
 				else:
 					unselectedInstanceMatrixArray[numInstanceUnselected] = instanceInfo.fTransform
 					numInstanceUnselected += 1					
+					unselectedInstanceIndices.append(instIdx)
+
+				## Selected instances keep their full resolution wireframe
+				if instanceInfo.fLODLevel > 0:
+					lodShadedInstanceMatrices[instanceInfo.fLODLevel].append(instanceInfo.fTransform)
+					lodShadedInstanceIndices[instanceInfo.fLODLevel].append(instIdx)
+					if not instanceInfo.fIsSelected:
+						lodWireInstanceMatrices[instanceInfo.fLODLevel].append(instanceInfo.fTransform)
+						lodWireInstanceIndices[instanceInfo.fLODLevel].append(instIdx)
+				else:
+					shadedInstanceMatrices.append(instanceInfo.fTransform)
+					shadedInstanceIndices.append(instIdx)
+					if not instanceInfo.fIsSelected:
+						wireInstanceMatrices.append(instanceInfo.fTransform)
+						wireInstanceIndices.append(instIdx)
 			else:
 				if (instanceNum in self.fInstanceInfoCache):
 					
@@ -3455,6 +4075,12 @@ class apiMeshSubSceneOverride(omr.MPxSubSceneOverride):
 			anyMatrixChanged = True
 			self.fNumInstances = numInstances
 
+		## Keep culling statistics
+		if self.fDebugCulling and (self.fNumVisibleInstances != numInstances or self.fNumCulledInstances != numInstancesCulled):
+			print "apiMesh culling : " + str(numInstances) + " visible, " + str(numInstancesCulled) + " culled"
+		self.fNumVisibleInstances = numInstances
+		self.fNumCulledInstances = numInstancesCulled
+
 		anyInstanceSelected = numInstanceSelected > 0
 		anyInstanceUnselected = numInstanceUnselected > 0
 
@@ -3674,12 +4300,18 @@ class apiMeshSubSceneOverride(omr.MPxSubSceneOverride):
 			container.add(faceSelectionItem)
 			itemsChanged = True
 
-		## create and add a custom data to help the face component converter
+		## create and add a custom data to help the edge and face component converters
 		if updateGeometry:
 			mySelectionData = apiMeshHWSelectionUserData()
 			mySelectionData.fMeshGeom = self.fMesh.meshGeom()
+			mySelectionData.fFaceLookupTable = self.fTriangleFaceIds
 			faceSelectionItem.setCustomData(mySelectionData)
 
+			myEdgeSelectionData = apiMeshHWSelectionUserData()
+			myEdgeSelectionData.fMeshGeom = mySelectionData.fMeshGeom
+			myEdgeSelectionData.fEdgeLookupTable = self.fWireEdgeIds
+			edgeSelectionItem.setCustomData(myEdgeSelectionData)
+
 		# render item to display active (selected) vertices
 		activeVertexItem = container.find(self.sActiveVertexName)
 		if not activeVertexItem and anyVertexSelected:
@@ -3818,7 +4450,7 @@ class apiMeshSubSceneOverride(omr.MPxSubSceneOverride):
 
 		## Update render item matrices if necessary
 		if itemsChanged or anyMatrixChanged:
-			if not self.fIsInstanceMode and numInstances == 1:
+			if not self.fIsInstanceMode and numInstances == 1 and not useLOD:
 				## When not dealing with multiple instances, don't convert the render items into instanced
 				## mode.  Set the matrices on them directly.
 				objToWorld = instanceMatrixArray[0]
@@ -3887,39 +4519,171 @@ class apiMeshSubSceneOverride(omr.MPxSubSceneOverride):
 				## could then group up the instance transforms based matching materials.
 
 				## Note this has to happen after the geometry and shaders are set, otherwise it will fail.
-				if wireItem:
-					self.setInstanceTransformArray(wireItem, unselectedInstanceMatrixArray)
+				if useLOD:
+					## Instances drawn by the LOD items are left out of the full resolution items
+					self.setInstanceTransforms(shadedItem, om.MMatrixArray(shadedInstanceMatrices), shadedInstanceIndices)
+					self.setInstanceTransforms(texturedItem, om.MMatrixArray(shadedInstanceMatrices), shadedInstanceIndices)
+					if wireItem:
+						self.setInstanceTransforms(wireItem, om.MMatrixArray(wireInstanceMatrices), wireInstanceIndices)
+				else:
+					if wireItem:
+						self.setInstanceTransforms(wireItem, unselectedInstanceMatrixArray, unselectedInstanceIndices)
+					self.setInstanceTransforms(shadedItem, instanceMatrixArray, drawnInstanceIndices)
+					self.setInstanceTransforms(texturedItem, instanceMatrixArray, drawnInstanceIndices)
 				if selectItem:
-					self.setInstanceTransformArray(selectItem, selectedInstanceMatrixArray)
+					self.setInstanceTransforms(selectItem, selectedInstanceMatrixArray, selectedInstanceIndices)
 				if boxItem:
-					self.setInstanceTransformArray(boxItem, unselectedInstanceMatrixArray)
+					self.setInstanceTransforms(boxItem, unselectedInstanceMatrixArray, unselectedInstanceIndices)
 				if selectedBoxItem:
-					self.setInstanceTransformArray(selectedBoxItem, selectedInstanceMatrixArray)
-				self.setInstanceTransformArray(shadedItem, instanceMatrixArray)
-				self.setInstanceTransformArray(texturedItem, instanceMatrixArray)
+					self.setInstanceTransforms(selectedBoxItem, selectedInstanceMatrixArray, selectedInstanceIndices)
 
-				self.setInstanceTransformArray(vertexSelectionItem, instanceMatrixArray)
-				self.setInstanceTransformArray(edgeSelectionItem, instanceMatrixArray)
-				self.setInstanceTransformArray(faceSelectionItem, instanceMatrixArray)
+				self.setInstanceTransforms(vertexSelectionItem, instanceMatrixArray, drawnInstanceIndices)
+				self.setInstanceTransforms(edgeSelectionItem, instanceMatrixArray, drawnInstanceIndices)
+				self.setInstanceTransforms(faceSelectionItem, instanceMatrixArray, drawnInstanceIndices)
 
 				if activeVertexItem:
-					self.setInstanceTransformArray(activeVertexItem, instanceMatrixArray)
+					self.setInstanceTransforms(activeVertexItem, instanceMatrixArray, drawnInstanceIndices)
 				if activeEdgeItem:
-					self.setInstanceTransformArray(activeEdgeItem, instanceMatrixArray)
+					self.setInstanceTransforms(activeEdgeItem, instanceMatrixArray, drawnInstanceIndices)
 				if activeFaceItem:
-					self.setInstanceTransformArray(activeFaceItem, instanceMatrixArray)
+					self.setInstanceTransforms(activeFaceItem, instanceMatrixArray, drawnInstanceIndices)
 
 				## Once we change the render items into instance rendering they can't be changed back without
 				## being deleted and re-created.  So if instances are deleted to leave only one remaining,
 				## just keep treating them the instance way.
 				self.fIsInstanceMode = True
 		
+		self.manageLODRenderItems(container, instances, lodShadedInstanceMatrices, lodWireInstanceMatrices, lodShadedInstanceIndices, lodWireInstanceIndices, shader, updateMaterial, updateGeometry, itemsChanged or anyMatrixChanged)
+
 		self.manageIsolateSelectRenderItems(container, frameContext, instances, viewSelectedFaceInfo, shader, updateMaterial, updateGeometry)
 		
 		if itemsChanged or anyMatrixChanged or updateGeometry:
 			## On transform or geometry change, force recalculation of shadow maps
 			omr.MRenderer.setLightsAndShadowsDirty()
 	
+	def selectLODLevel(self, prevLevel, screenSize):
+		## Pick the level of detail matching the on-screen size of an instance.
+		## A change of level is held back by one level at a time while the size
+		## stays within the hysteresis band around the last threshold crossed.
+		maxLevel = min(len(self.sLODScreenSizes), len(self.fLODBuffers))
+		prevLevel = min(prevLevel, maxLevel)
+
+		level = 0
+		while level < maxLevel and screenSize < self.sLODScreenSizes[level]:
+			level += 1
+
+		if level > prevLevel:
+			## Getting coarser : must be clearly under the threshold into the level
+			while level > prevLevel and screenSize > self.sLODScreenSizes[level-1] * (1.0 - self.sLODHysteresis):
+				level -= 1
+
+		elif level < prevLevel:
+			## Getting finer : must be clearly over the threshold out of the next level
+			while level < prevLevel and screenSize < self.sLODScreenSizes[level] * (1.0 + self.sLODHysteresis):
+				level += 1
+
+		return level
+
+	def manageLODRenderItems(self, container, instances, lodShadedInstanceMatrices, lodWireInstanceMatrices, lodShadedInstanceIndices, lodWireInstanceIndices, shader, updateMaterial, updateGeometry, updateInstances):
+		## Create, update or remove the shaded, textured and wireframe render items
+		## drawing the instances assigned to each coarser level of detail.
+		## Selection and active component items always use the full resolution geometry.
+		for level in xrange(1, len(self.sLODGridResolutions)+1):
+			namePostfix = self.sNameSeparator + self.sLODName + str(level)
+			shadedName = self.sShadedName + namePostfix
+			texturedName = self.sTexturedName + namePostfix
+			wireName = self.sWireName + namePostfix
+
+			hasBuffers = self.fUseLOD and level <= len(self.fLODBuffers)
+			shadedMatrices = lodShadedInstanceMatrices.get(level) if hasBuffers else None
+			wireMatrices = lodWireInstanceMatrices.get(level) if hasBuffers else None
+
+			itemsChanged = False
+
+			shadedItem = container.find(shadedName)
+			texturedItem = container.find(texturedName)
+			if not shadedItem and shadedMatrices:
+				shadedItem = omr.MRenderItem.create( shadedName, omr.MRenderItem.MaterialSceneItem, omr.MGeometry.kTriangles)
+				shadedItem.setDrawMode(omr.MGeometry.kShaded)
+				shadedItem.setExcludedFromPostEffects(False)
+				shadedItem.setCastsShadows(True)
+				shadedItem.setReceivesShadows(True)
+				container.add(shadedItem)
+
+				texturedItem = omr.MRenderItem.create( texturedName, omr.MRenderItem.MaterialSceneItem, omr.MGeometry.kTriangles)
+				texturedItem.setDrawMode(omr.MGeometry.kTextured)
+				texturedItem.setExcludedFromPostEffects(False)
+				texturedItem.setCastsShadows(True)
+				texturedItem.setReceivesShadows(True)
+				container.add(texturedItem)
+				itemsChanged = True
+
+			elif shadedItem and not shadedMatrices:
+				container.remove(shadedName)
+				container.remove(texturedName)
+				shadedItem = None
+				texturedItem = None
+
+			wireItem = container.find(wireName)
+			if not wireItem and wireMatrices:
+				wireItem = omr.MRenderItem.create( wireName, omr.MRenderItem.DecorationItem, omr.MGeometry.kLines)
+				wireItem.setDrawMode(omr.MGeometry.kWireframe)
+				wireItem.setDepthPriority(omr.MRenderItem.sActiveWireDepthPriority)
+				wireItem.setShader(self.fWireShader)
+				container.add(wireItem)
+				itemsChanged = True
+
+			elif wireItem and not wireMatrices:
+				container.remove(wireName)
+				wireItem = None
+
+			if not shadedItem and not wireItem:
+				continue
+
+			## Update shaders
+			if shadedItem and (itemsChanged or updateMaterial or not shadedItem.isShaderFromNode()):
+				if not shader or \
+					not shadedItem.setShaderFromNode(shader, instances[0], apiMeshSubSceneOverride.shadedItemLinkLost, ShadedItemUserData(self), True):
+					shadedItem.setShader(self.fShadedShader)
+
+				if not shader or \
+					not texturedItem.setShaderFromNode(shader, instances[0], apiMeshSubSceneOverride.shadedItemLinkLost, ShadedItemUserData(self), False):
+					texturedItem.setShader(self.fShadedShader)
+
+			## Update geometry
+			if itemsChanged or updateGeometry:
+				(positionBuffer, normalBuffer, shadedIndexBuffer, wireIndexBuffer) = self.fLODBuffers[level-1]
+				bounds = self.fMesh.boundingBox()
+
+				if shadedItem:
+					shadedBuffers = omr.MVertexBufferArray()
+					shadedBuffers.append(positionBuffer, "positions")
+					shadedBuffers.append(normalBuffer, "normals")
+					self.setGeometryForRenderItem(shadedItem, shadedBuffers, shadedIndexBuffer, bounds)
+					self.setGeometryForRenderItem(texturedItem, shadedBuffers, shadedIndexBuffer, bounds)
+
+				if wireItem:
+					wireBuffers = omr.MVertexBufferArray()
+					wireBuffers.append(positionBuffer, "positions")
+					self.setGeometryForRenderItem(wireItem, wireBuffers, wireIndexBuffer, bounds)
+
+			## Update instance transforms, after the geometry and shaders are set
+			if itemsChanged or updateGeometry or updateInstances:
+				if shadedItem:
+					self.setInstanceTransforms(shadedItem, om.MMatrixArray(shadedMatrices), lodShadedInstanceIndices[level])
+					self.setInstanceTransforms(texturedItem, om.MMatrixArray(shadedMatrices), lodShadedInstanceIndices[level])
+				if wireItem:
+					self.setInstanceTransforms(wireItem, om.MMatrixArray(wireMatrices), lodWireInstanceIndices[level])
+
+	def setInstanceTransforms(self, renderItem, matrixArray, instanceIndices):
+		## Set the instance transforms of an instanced render item, and keep the
+		## DAG instance index of each one for selection. When every instance
+		## using the item has been culled, disable it instead.
+		self.fInstancePathIndices[renderItem.name()] = instanceIndices
+		renderItem.enable(len(matrixArray) > 0)
+		if len(matrixArray) > 0:
+			self.setInstanceTransformArray(renderItem, matrixArray)
+
 	def manageIsolateSelectRenderItems(self, container, frameContext, instances, viewSelectedFaceInfo, shader, updateMaterial, updateGeometry):
 		if (not self.fMesh):
 			return
@@ -3955,17 +4719,15 @@ class apiMeshSubSceneOverride(omr.MPxSubSceneOverride):
 			prevInstIdxArray = set()
 			if (activeViewName in self.fViewSelectedFaceInfoCache):
 				prevInfo = self.fViewSelectedFaceInfoCache[activeViewName]
-				for instIdx, faceIdxList in prevInfo.iteritems():
-					for faceIdx in faceIdxList:
-						if faceIdx != sViewSelectedInstanceMark:
-							prevInstIdxArray.add(instIdx)
+				for instIdx, faceBitmap in prevInfo.iteritems():
+					if hasViewSelectedFaces(faceBitmap):
+						prevInstIdxArray.add(instIdx)
 			
 			## Gather current instances which own view-selected faces
 			currInstIdxArray = set()
-			for instIdx, faceIdxList in viewSelectedFaceInfo.iteritems():
-				for faceIdx in faceIdxList:
-					if (faceIdx != sViewSelectedInstanceMark):
-						currInstIdxArray.add(instIdx)
+			for instIdx, faceBitmap in viewSelectedFaceInfo.iteritems():
+				if hasViewSelectedFaces(faceBitmap):
+					currInstIdxArray.add(instIdx)
 						
 			## Update the cache now that we've gathered the previous data
 			self.fViewSelectedFaceInfoCache[activeViewName] = viewSelectedFaceInfo
@@ -4062,8 +4824,7 @@ class apiMeshSubSceneOverride(omr.MPxSubSceneOverride):
 			
 			instIdxArray = set()
 			for instIdx in faceInfo:
-				faceIdx = faceInfo[instIdx]
-				if (faceIdx != sViewSelectedInstanceMark):
+				if hasViewSelectedFaces(faceInfo[instIdx]):
 					instIdxArray.add(instIdx)
 			
 			for instIdx in instIdxArray:
@@ -4114,46 +4875,12 @@ class apiMeshSubSceneOverride(omr.MPxSubSceneOverride):
 					selectionBuffers = omr.MVertexBufferArray()
 					selectionBuffers.append(self.fPositionBuffer, "positions")
 					
-					faceStates = []
-					for faceIdx in xrange(meshGeom.faceCount):
-						faceStates.append(False)
-					
-					faceIds = faceInfo[instIdx]
-					for faceIdx in faceIds:
-						if (faceIdx != sViewSelectedInstanceMark):
-							faceStates[faceIdx] = True
-					
-					numTriangles = 0
-					for faceIdx in xrange(meshGeom.faceCount):
-						numVerts = meshGeom.face_counts[faceIdx]
-						if (numVerts > 2):
-							if faceStates[faceIdx]:
-								numTriangles += numVerts - 2
-					
-					indexBuffer = omr.MIndexBuffer(omr.MGeometry.kUnsignedInt32)
-					bufferSize = numTriangles * 3
-
-					dataAddress = indexBuffer.acquire(bufferSize, True)
-					if dataAddress:
-						data = (ctypes.c_uint * bufferSize).from_address(dataAddress)
-
-						base = 0
-						idx = 0
-						for faceIdx in xrange(meshGeom.faceCount):
-							## Ignore degenerate faces
-							numVerts = meshGeom.face_counts[faceIdx]
-							if (numVerts > 2):
-								if (faceStates[faceIdx]):
-									for v in range(1, numVerts - 1):
-										data[idx] = meshGeom.face_connects[base]
-										idx += 1
-										data[idx] = meshGeom.face_connects[base + v]
-										idx += 1
-										data[idx] = meshGeom.face_connects[base + v + 1]
-										idx += 1
-								base += numVerts
-						indexBuffer.commit(dataAddress);
-						dataAddress = None
+					faceStates = faceInfo[instIdx]
+					indices, triangleFaceIds = self.gatherFaceTriangles(meshGeom, faceStates)
+
+					indexType, indexCType = indexBufferType(len(meshGeom.vertices))
+					indexBuffer = omr.MIndexBuffer(indexType)
+					fillIndexBuffer(indexBuffer, indices, indexCType)
 
 					bounds = self.fMesh.boundingBox()
 					self.setGeometryForRenderItem(viewSelectedShadedItem, shadedBuffers, indexBuffer, bounds)
@@ -4173,7 +4900,23 @@ class apiMeshSubSceneOverride(omr.MPxSubSceneOverride):
 					if userData and isinstance(userData, apiMeshHWSelectionUserData):
 						userData.fMeshGeom = meshGeom
 						userData.fFaceViewSelectedStates = faceStates
+						userData.fFaceLookupTable = triangleFaceIds
+
+	def gatherFaceTriangles(self, meshGeom, faceStates):
+		## Masked gather of the shaded triangles whose face is set in the
+		## faceStates bitmap, keeping their draw order. Returns the vertex
+		## indices and the face id of each triangle kept.
+		## The getters are only built for more than one triangle, as itemgetter
+		## returns a single value instead of a tuple otherwise
+		if self.fShadedCornerStates is None:
+			return buildTriangleIndices(meshGeom, faceStates)
+
+		## The getters pick the state of every triangle and corner in one call
+		indices = list(itertools.compress(self.fShadedIndices, self.fShadedCornerStates(faceStates)))
+		triangleFaceIds = list(itertools.compress(self.fShadedTriangleFaceIds, self.fShadedTriangleStates(faceStates)))
+		return indices, triangleFaceIds
 	
+	@profiled("apiMeshSubSceneOverride::rebuildGeometryBuffers", om.MProfiler.kColorC_L1)
 	def rebuildGeometryBuffers(self):
 		## Preamble
 		meshGeom = self.fMesh.meshGeom()
@@ -4185,14 +4928,40 @@ class apiMeshSubSceneOverride(omr.MPxSubSceneOverride):
 		self.clearGeometryBuffers()
 
 		## Compute mesh data size
-		numTriangles = 0
-		totalVerts = 0
 		totalPoints = len(meshGeom.vertices)
-		for i in xrange(meshGeom.faceCount):
-			numVerts = meshGeom.face_counts[i]
-			if numVerts > 2:
-				numTriangles += numVerts - 2
-				totalVerts += numVerts
+
+		## Build index data. With optimization enabled, triangles are reordered
+		## for the vertex cache and edges shared by two faces are drawn once.
+		shadedIndices, triangleFaceIds = buildTriangleIndices(meshGeom)
+		if self.fOptimizeIndexBuffers:
+			triangleOrder = optimizeTriangleOrder(shadedIndices, totalPoints)
+			shadedIndices = [ shadedIndices[3*tri+k] for tri in triangleOrder for k in xrange(3) ]
+			triangleFaceIds = [ triangleFaceIds[tri] for tri in triangleOrder ]
+			wireIndices, wireEdgeIds = buildWireEdgeIndices(meshGeom)
+		else:
+			## One line per face edge : the primitive index is the edge id
+			wireIndices = []
+			base = 0
+			for i in xrange(meshGeom.faceCount):
+				## Ignore degenerate faces
+				numVerts = meshGeom.face_counts[i]
+				if numVerts > 2:
+					for v in xrange(numVerts):
+						wireIndices.append(meshGeom.face_connects[base+v])
+						wireIndices.append(meshGeom.face_connects[base+((v+1) % numVerts)])
+				base += numVerts
+			wireEdgeIds = None
+			triangleFaceIds = None
+
+		self.fTriangleFaceIds = triangleFaceIds
+		self.fWireEdgeIds = wireEdgeIds
+
+		## Keep the shaded triangles for isolate select
+		self.fShadedIndices = shadedIndices
+		self.fShadedTriangleFaceIds = triangleFaceIds if triangleFaceIds is not None else buildTriangleIndices(meshGeom)[1]
+		if len(self.fShadedTriangleFaceIds) > 1:
+			self.fShadedTriangleStates = operator.itemgetter(*self.fShadedTriangleFaceIds)
+			self.fShadedCornerStates = operator.itemgetter(*[ faceId for faceId in self.fShadedTriangleFaceIds for k in xrange(3) ])
 
 		## Acquire vertex buffer resources
 		posDesc = omr.MVertexBufferDescriptor("", omr.MGeometry.kPosition, omr.MGeometry.kFloat, 3)
@@ -4206,17 +4975,8 @@ class apiMeshSubSceneOverride(omr.MPxSubSceneOverride):
 		normalDataAddress = self.fNormalBuffer.acquire(totalPoints, True)
 		boxPositionDataAddress = self.fBoxPositionBuffer.acquire(8, True)
 
-		## Acquire index buffer resources
-		self.fWireIndexBuffer = omr.MIndexBuffer(omr.MGeometry.kUnsignedInt32)
-		self.fBoxIndexBuffer = omr.MIndexBuffer(omr.MGeometry.kUnsignedInt32)
-		self.fShadedIndexBuffer = omr.MIndexBuffer(omr.MGeometry.kUnsignedInt32)
-
-		wireBufferDataAddress = self.fWireIndexBuffer.acquire(2*totalVerts, True)
-		boxBufferDataAddress = self.fBoxIndexBuffer.acquire(24, True)
-		shadedBufferDataAddress = self.fShadedIndexBuffer.acquire(3*numTriangles, True)
-
 		## Sanity check
-		if not all((positionDataAddress, normalDataAddress, boxPositionDataAddress, wireBufferDataAddress, boxBufferDataAddress, shadedBufferDataAddress)):
+		if not all((positionDataAddress, normalDataAddress, boxPositionDataAddress)):
 			self.clearGeometryBuffers()
 			return
 
@@ -4224,10 +4984,6 @@ class apiMeshSubSceneOverride(omr.MPxSubSceneOverride):
 		normalData = ((ctypes.c_float * 3)*totalPoints).from_address(normalDataAddress)
 		boxPositionData = ((ctypes.c_float * 3)*8).from_address(boxPositionDataAddress)
 
-		wireBufferData = (ctypes.c_uint * (2*totalVerts)).from_address(wireBufferDataAddress)
-		boxBufferData = (ctypes.c_uint * 24).from_address(boxBufferDataAddress)
-		shadedBufferData = ((ctypes.c_uint * 3)*numTriangles).from_address(shadedBufferDataAddress)
-
 		## Fill vertex data for shaded/wireframe
 		for vid,position in enumerate(meshGeom.vertices):
 			positionData[vid][0] = position[0]
@@ -4282,59 +5038,69 @@ class apiMeshSubSceneOverride(omr.MPxSubSceneOverride):
 		self.fBoxPositionBuffer.commit(boxPositionDataAddress)
 		boxPositionDataAddress = None
 
-		## Fill index data for wireframe
-		vid = 0
-		first = 0
-		idx = 0
-		for i in xrange(meshGeom.faceCount):
-			## Ignore degenerate faces
-			numVerts = meshGeom.face_counts[i]
-			if numVerts > 2:
-				first = vid
-				for v in xrange(numVerts-1):
-					wireBufferData[idx] = meshGeom.face_connects[vid]
-					idx += 1
-					vid += 1
-					wireBufferData[idx] = meshGeom.face_connects[vid]
-					idx += 1
+		## Acquire and fill index buffers, using 16-bit indices when possible
+		indexType, indexCType = indexBufferType(totalPoints)
+		if not self.fOptimizeIndexBuffers:
+			indexType, indexCType = omr.MGeometry.kUnsignedInt32, ctypes.c_uint
 
-				wireBufferData[idx] = meshGeom.face_connects[vid]
-				idx += 1
-				vid += 1
-				wireBufferData[idx] = meshGeom.face_connects[first]
-				idx += 1
+		self.fWireIndexBuffer = omr.MIndexBuffer(indexType)
+		self.fBoxIndexBuffer = omr.MIndexBuffer(omr.MGeometry.kUnsignedInt16)
+		self.fShadedIndexBuffer = omr.MIndexBuffer(indexType)
 
-			else:
-				vid += numVerts
+		boxIndices = [ 0, 1, 1, 2, 2, 3, 3, 0, 4, 5, 5, 6, 6, 7, 7, 4, 0, 4, 1, 5, 2, 6, 3, 7 ]
 
-		self.fWireIndexBuffer.commit(wireBufferDataAddress)
-		wireBufferDataAddress = None
+		if not (fillIndexBuffer(self.fWireIndexBuffer, wireIndices, indexCType) and
+				fillIndexBuffer(self.fBoxIndexBuffer, boxIndices, ctypes.c_ushort) and
+				fillIndexBuffer(self.fShadedIndexBuffer, shadedIndices, indexCType)):
+			self.clearGeometryBuffers()
+			return
 
-		## Fill index data for bounding box
-		indexData = [ 0, 1, 1, 2, 2, 3, 3, 0, 4, 5, 5, 6, 6, 7, 7, 4, 0, 4, 1, 5, 2, 6, 3, 7 ]
-		for i in xrange(24):
-			boxBufferData[i] = indexData[i]
+		## Build the coarser levels of detail, stopping when clustering no
+		## longer leaves any triangle
+		if self.fUseLOD:
+			for resolution in self.sLODGridResolutions:
+				lod = buildClusteredLOD(meshGeom, resolution)
+				if not lod or not lod[2]:
+					break
+				lodBuffers = self.buildLODBuffers(*lod)
+				if not lodBuffers:
+					break
+				self.fLODBuffers.append(lodBuffers)
 
-		self.fBoxIndexBuffer.commit(boxBufferDataAddress)
-		boxBufferDataAddress = None
+	def buildLODBuffers(self, positions, normals, triangleIndices, lineIndices):
+		## Create the vertex and index buffers of one level of detail. Levels
+		## clustered down to no triangles or no lines are not built.
+		numPoints = len(positions)
+		if numPoints == 0 or len(triangleIndices) == 0 or len(lineIndices) == 0:
+			return None
 
-		## Fill index data for shaded
-		base = 0
-		idx = 0
-		for i in xrange(meshGeom.faceCount):
-			## Ignore degenerate faces
-			numVerts = meshGeom.face_counts[i]
-			if numVerts > 2:
-				for v in xrange(1, numVerts-1):
-					shadedBufferData[idx][0] = meshGeom.face_connects[base]
-					shadedBufferData[idx][1] = meshGeom.face_connects[base+v]
-					shadedBufferData[idx][2] = meshGeom.face_connects[base+v+1]
-					idx += 1
+		posDesc = omr.MVertexBufferDescriptor("", omr.MGeometry.kPosition, omr.MGeometry.kFloat, 3)
+		normalDesc = omr.MVertexBufferDescriptor("", omr.MGeometry.kNormal, omr.MGeometry.kFloat, 3)
 
-				base += numVerts
-		
-		self.fShadedIndexBuffer.commit(shadedBufferDataAddress)
-		shadedBufferDataAddress = None
+		positionBuffer = omr.MVertexBuffer(posDesc)
+		normalBuffer = omr.MVertexBuffer(normalDesc)
+
+		positionDataAddress = positionBuffer.acquire(numPoints, True)
+		normalDataAddress = normalBuffer.acquire(numPoints, True)
+		if not positionDataAddress or not normalDataAddress:
+			return None
+
+		positionData = ((ctypes.c_float * 3)*numPoints).from_address(positionDataAddress)
+		normalData = ((ctypes.c_float * 3)*numPoints).from_address(normalDataAddress)
+		for vid in xrange(numPoints):
+			positionData[vid][:] = positions[vid]
+			normalData[vid][:] = normals[vid]
+
+		positionBuffer.commit(positionDataAddress)
+		normalBuffer.commit(normalDataAddress)
+
+		indexType, indexCType = indexBufferType(numPoints)
+		shadedIndexBuffer = omr.MIndexBuffer(indexType)
+		wireIndexBuffer = omr.MIndexBuffer(indexType)
+		if not fillIndexBuffer(shadedIndexBuffer, triangleIndices, indexCType) or not fillIndexBuffer(wireIndexBuffer, lineIndices, indexCType):
+			return None
+
+		return (positionBuffer, normalBuffer, shadedIndexBuffer, wireIndexBuffer)
 
 	def rebuildActiveComponentIndexBuffers(self):
 		## Preamble
@@ -4345,13 +5111,15 @@ class apiMeshSubSceneOverride(omr.MPxSubSceneOverride):
 		## Clear old
 		self.clearActiveComponentIndexBuffers()
 
+		indexType, indexCType = indexBufferType(len(meshGeom.vertices))
+
 		## Acquire and fill index buffer for active vertices
 		numActiveVertices = len(self.fActiveVerticesSet)
 		if numActiveVertices > 0:
-			self.fActiveVerticesIndexBuffer = omr.MIndexBuffer(omr.MGeometry.kUnsignedInt32)
+			self.fActiveVerticesIndexBuffer = omr.MIndexBuffer(indexType)
 			activeVerticesDataAddress = self.fActiveVerticesIndexBuffer.acquire(numActiveVertices, True)
 			if activeVerticesDataAddress:
-				activeVerticesData = (ctypes.c_uint*numActiveVertices).from_address(activeVerticesDataAddress)
+				activeVerticesData = (indexCType*numActiveVertices).from_address(activeVerticesDataAddress)
 
 				idx = 0
 				for vid in self.fActiveVerticesSet:
@@ -4364,10 +5132,10 @@ class apiMeshSubSceneOverride(omr.MPxSubSceneOverride):
 		## Acquire and fill index buffer for active edges
 		numActiveEdges = len(self.fActiveEdgesSet)
 		if numActiveEdges > 0:
-			self.fActiveEdgesIndexBuffer = omr.MIndexBuffer(omr.MGeometry.kUnsignedInt32)
+			self.fActiveEdgesIndexBuffer = omr.MIndexBuffer(indexType)
 			activeEdgesDataAddress = self.fActiveEdgesIndexBuffer.acquire(2*numActiveEdges, True)
 			if activeEdgesDataAddress:
-				activeEdgesData = ((ctypes.c_uint * 2)*numActiveEdges).from_address(activeEdgesDataAddress)
+				activeEdgesData = ((indexCType * 2)*numActiveEdges).from_address(activeEdgesDataAddress)
 
 				eid = 0
 				first = 0
@@ -4408,10 +5176,10 @@ class apiMeshSubSceneOverride(omr.MPxSubSceneOverride):
 					if numVerts > 2:
 						numActiveFacesTriangles += numVerts - 2
 
-			self.fActiveFacesIndexBuffer = omr.MIndexBuffer(omr.MGeometry.kUnsignedInt32)
+			self.fActiveFacesIndexBuffer = omr.MIndexBuffer(indexType)
 			activeFacesDataAddress = self.fActiveFacesIndexBuffer.acquire(3*numActiveFacesTriangles, True)
 			if activeFacesDataAddress:
-				activeFacesData = ((ctypes.c_uint * 3)*numActiveFacesTriangles).from_address(activeFacesDataAddress)
+				activeFacesData = ((indexCType * 3)*numActiveFacesTriangles).from_address(activeFacesDataAddress)
 
 				idx = 0
 				vid = 0
@@ -4441,6 +5209,11 @@ class apiMeshSubSceneOverride(omr.MPxSubSceneOverride):
 		self.fWireIndexBuffer = None
 		self.fBoxIndexBuffer = None
 		self.fShadedIndexBuffer = None
+		self.fLODBuffers = []
+		self.fShadedIndices = None
+		self.fShadedTriangleFaceIds = None
+		self.fShadedTriangleStates = None
+		self.fShadedCornerStates = None
 
 	def clearActiveComponentIndexBuffers(self):
 		self.fActiveVerticesIndexBuffer = None
@@ -4487,6 +5260,7 @@ class apiMeshSubSceneOverride(omr.MPxSubSceneOverride):
 		dagPath.set(instances[0])
 		return True
 		
+	@profiled("apiMeshSubSceneOverride::getInstancedSelectionPath", om.MProfiler.kColorD_L1)
 	def getInstancedSelectionPath(self, renderItem, intersection, dagPath):
 		node = om.MFnDagNode(self.fObject)
 		if not node:
@@ -4517,6 +5291,13 @@ class apiMeshSubSceneOverride(omr.MPxSubSceneOverride):
 		## which introduces nested instancing scenarios. For simplicity reason the selection
 		## edge instancing is disabled when there are multiple apiMesh instances.
 		elif(instanceId >=1 and instanceId <= instanceCount):
+			## Each instanced render item only draws some of the instances (culling,
+			## selection state, level of detail), use the order they were submitted in.
+			instanceIndices = self.fInstancePathIndices.get(renderItem.name())
+			if instanceIndices is not None and instanceId <= len(instanceIndices):
+				dagPath.set(instances[instanceIndices[instanceId - 1]])
+				return True
+
 			view = omui.M3dView.active3dView()
 			if view.viewIsFiltered():
 				
@@ -4590,60 +5371,25 @@ def apiMeshPostDrawCallback(context, renderItemList, shaderInstance):
 
 ## Custom component converter to select vertices
 ## Attached to the dormant vertices render item (apiMeshGeometryOverride.sVertexItemName)
-class meshVertComponentConverter_geometryOverride(omr.MPxComponentConverter):
+class meshVertComponentConverter_geometryOverride(apiMeshComponentConverter):
 	def __init__(self):
-		omr.MPxComponentConverter.__init__(self)
-
-		self.fComponent = om.MFnSingleIndexedComponent()
-		self.fComponentObject = om.MObject.kNullObj
-		self.fVertices = []
+		apiMeshComponentConverter.__init__(self, om.MFn.kMeshVertComponent)
 
 	def initialize(self, renderItem):
-		## Create the component selection object .. here we are selecting vertex component
-		self.fComponentObject = self.fComponent.create( om.MFn.kMeshVertComponent )
-
 		## Build a lookup table to match each primitive position in the index buffer of the render item geometry
 		## to the correponding vertex component of the object
-		## Use same algorithm as in apiMeshGeometryOverride.updateIndexingForDormantVertices
-
+		## Use same triangulation as in apiMeshGeometryOverride.updateIndexingForDormantVertices
+		lookupTable = []
 		selectionData = renderItem.customData()
 		if isinstance(selectionData, apiMeshHWSelectionUserData):
-			meshGeom = selectionData.fMeshGeom
+			lookupTable = array.array('i', buildTriangleIndices(selectionData.fMeshGeom)[0])
 
-			## Allocate vertices lookup table
-			numTriangles = 0
-			for i in xrange(meshGeom.faceCount):
-				numVerts = meshGeom.face_counts[i]
-				if numVerts > 2:
-					numTriangles += numVerts - 2
-			self.fVertices = [0]*(3*numTriangles)
-
-			## Fill vertices lookup table
-			base = 0
-			idx = 0
-			for faceIdx in xrange(meshGeom.faceCount):
-				## ignore degenerate faces
-				numVerts = meshGeom.face_counts[faceIdx]
-				if numVerts > 2:
-					for v in xrange(1, numVerts-1):
-						self.fVertices[idx] = meshGeom.face_connects[base]
-						self.fVertices[idx+1] = meshGeom.face_connects[base+v]
-						self.fVertices[idx+2] = meshGeom.face_connects[base+v+1]
-						idx += 3
-					base += numVerts
+		self.initializeHits(lookupTable, 0)
 
 	def addIntersection(self, intersection):
-		## Convert the intersection index, which represent the primitive position in the
-		## index buffer, to the correct vertex component
-		rawIdx = intersection.index
-		idx = 0
-		if rawIdx >= 0 and rawIdx < len(self.fVertices):
-			idx = self.fVertices[rawIdx]
-		self.fComponent.addElement(idx)
-
-	def component(self):
-		## Return the component object that contains the ids of the selected vertices
-		return self.fComponentObject
+		## Store the intersection index, which represent the primitive position in the
+		## index buffer. It is converted to a vertex component in component()
+		self.addHit(intersection.index)
 
 	def selectionMask(self):
 		## This converter is only valid for vertex selection
@@ -4657,18 +5403,11 @@ class meshVertComponentConverter_geometryOverride(omr.MPxComponentConverter):
 
 ## Custom component converter to select edges
 ## Attached to the edge selection render item (apiMeshGeometryOverride.sEdgeSelectionItemName)
-class meshEdgeComponentConverter_geometryOverride(omr.MPxComponentConverter):
+class meshEdgeComponentConverter_geometryOverride(apiMeshComponentConverter):
 	def __init__(self):
-		omr.MPxComponentConverter.__init__(self)
-
-		self.fComponent = om.MFnSingleIndexedComponent()
-		self.fComponentObject = om.MObject.kNullObj
-		self.fEdges = []
+		apiMeshComponentConverter.__init__(self, om.MFn.kMeshEdgeComponent)
 
 	def initialize(self, renderItem):
-		## Create the component selection object .. here we are selecting edge component
-		self.fComponentObject = self.fComponent.create( om.MFn.kMeshEdgeComponent )
-
 		## Build a lookup table to match each primitive position in the index buffer of the render item geometry
 		## to the correponding edge component of the object
 		## Use same algorithm as in apiMeshGeometryOverride.updateIndexingForEdges
@@ -4678,43 +5417,25 @@ class meshEdgeComponentConverter_geometryOverride(omr.MPxComponentConverter):
 		## indices 0 & 1 : primitive #0
 		## indices 2 & 3 : primitive #1
 		## ...
-
+		## Every edge of the non degenerate faces gets a line, in order, so the
+		## edge id is the primitive position : the table is a plain range.
+		lookupTable = []
 		selectionData = renderItem.customData()
 		if isinstance(selectionData, apiMeshHWSelectionUserData):
 			meshGeom = selectionData.fMeshGeom
 
-			## Allocate edges lookup table
 			totalVerts = 0
-			for i in xrange(meshGeom.faceCount):
-				numVerts = meshGeom.face_counts[i]
+			for numVerts in meshGeom.face_counts:
 				if numVerts > 2:
 					totalVerts += numVerts
-			self.fEdges = [0]*(totalVerts)
+			lookupTable = xrange(totalVerts)
 
-			## Fill edges lookup table
-			idx = 0
-			edgeId = 0
-			for faceIdx in xrange(meshGeom.faceCount):
-				## ignore degenerate faces
-				numVerts = meshGeom.face_counts[faceIdx]
-				if numVerts > 2:
-					for v in xrange(numVerts):
-						self.fEdges[idx] = edgeId
-						edgeId += 1
-						idx += 1
+		self.initializeHits(lookupTable, 0)
 
 	def addIntersection(self, intersection):
-		## Convert the intersection index, which represent the primitive position in the
-		## index buffer, to the correct edge component
-		rawIdx = intersection.index
-		idx = 0
-		if rawIdx >= 0 and rawIdx < len(self.fEdges):
-			idx = self.fEdges[rawIdx]
-		self.fComponent.addElement(idx)
-
-	def component(self):
-		## Return the component object that contains the ids of the selected edges
-		return self.fComponentObject
+		## Store the intersection index, which represent the primitive position in the
+		## index buffer. It is converted to an edge component in component()
+		self.addHit(intersection.index)
 
 	def selectionMask(self):
 		## This converter is only valid for edge selection
@@ -4726,18 +5447,11 @@ class meshEdgeComponentConverter_geometryOverride(omr.MPxComponentConverter):
 
 ## Custom component converter to select faces
 ## Attached to the face selection render item (apiMeshGeometryOverride.sFaceSelectionItemName)
-class meshFaceComponentConverter_geometryOverride(omr.MPxComponentConverter):
+class meshFaceComponentConverter_geometryOverride(apiMeshComponentConverter):
 	def __init__(self):
-		omr.MPxComponentConverter.__init__(self)
-
-		self.fComponent = om.MFnSingleIndexedComponent()
-		self.fComponentObject = om.MObject.kNullObj
-		self.fFaces = []
+		apiMeshComponentConverter.__init__(self, om.MFn.kMeshPolygonComponent)
 
 	def initialize(self, renderItem):
-		## Create the component selection object .. here we are selecting face component
-		self.fComponentObject = self.fComponent.create( om.MFn.kMeshPolygonComponent )
-
 		## Build a lookup table to match each primitive position in the index buffer of the render item geometry
 		## to the correponding face component of the object
 		## Use same algorithm as in apiMeshGeometryOverride.updateIndexingForFaces
@@ -4747,61 +5461,29 @@ class meshFaceComponentConverter_geometryOverride(omr.MPxComponentConverter):
 		## indices 0, 1 & 2 : primitive #0
 		## indices 3, 4 & 5 : primitive #1
 		## ...
-
+		lookupTable = []
 		selectionData = renderItem.customData()
 		if isinstance(selectionData, apiMeshHWSelectionUserData):
 			meshGeom = selectionData.fMeshGeom
 
 			## isolate selection
-			isolateSelect = renderItem.isIsolateSelectCopy()
-			if(isolateSelect):
-				
-				enableFaces = [0] * meshGeom.faceCount
-				for i in xrange(meshGeom.faceCount):
-					enableFaces[i] = False
+			enableFaces = None
+			if(renderItem.isIsolateSelectCopy()):
+				enableFaces = bytearray(meshGeom.faceCount)
 
 				fnComponent = om.MFnSingleIndexedComponent( renderItem.shadingComponent() )
 				if(fnComponent.componentType == om.MFn.kMeshPolygonComponent):
-					faceIds = fnComponent.getElements()
-					
-					for i in xrange(len(faceIds)):
-						enableFaces[faceIds[i]] = True
-
-			## Allocate faces lookup table
-			numTriangles = 0
-			for i in xrange(meshGeom.faceCount):
-				numVerts = meshGeom.face_counts[i]
-				if numVerts > 2:
-					if(not isolateSelect or enableFaces[i]):
-						numTriangles += numVerts - 2
-
-			self.fFaces = [0]*numTriangles
-
-			## Fill faces lookup table
-			idx = 0
-			for faceIdx in xrange(meshGeom.faceCount):
-				## ignore degenerate faces
-				numVerts = meshGeom.face_counts[faceIdx]
-				if numVerts > 2:
-					if(not isolateSelect or enableFaces[faceIdx]):
-						for v in xrange(1, numVerts-1):
-							self.fFaces[idx] = faceIdx
-							idx += 1
+					for faceId in fnComponent.getElements():
+						enableFaces[faceId] = 1
 
+			lookupTable = array.array('i', buildTriangleIndices(meshGeom, enableFaces)[1])
 
+		self.initializeHits(lookupTable, 0)
 
 	def addIntersection(self, intersection):
-		## Convert the intersection index, which represent the primitive position in the
-		## index buffer, to the correct face component
-		rawIdx = intersection.index
-		idx = 0
-		if rawIdx >= 0 and rawIdx < len(self.fFaces):
-			idx = self.fFaces[rawIdx]
-		self.fComponent.addElement(idx)
-
-	def component(self):
-		## Return the component object that contains the ids of the selected faces
-		return self.fComponentObject
+		## Store the intersection index, which represent the primitive position in the
+		## index buffer. It is converted to a face component in component()
+		self.addHit(intersection.index)
 
 	def selectionMask(self):
 		## This converter is only valid for face selection
@@ -4999,6 +5681,7 @@ class apiMeshGeometryOverride(omr.MPxGeometryOverride):
 						item.setReceivesShadows( not self.fInternalItems_NoShadowReceive and self.fReceivesShadows )
 						item.setExcludedFromPostEffects( self.fInternalItems_NoPostEffects )
 
+	@profiled("apiMeshGeometryOverride::populateGeometry", om.MProfiler.kColorC_L1)
 	def populateGeometry(self, requirements, renderItems, data):
 		## Fill in data and index streams based on the requirements passed in.
 		## Associate indexing with the render items passed in.
@@ -5075,7 +5758,7 @@ class apiMeshGeometryOverride(omr.MPxGeometryOverride):
 			## Create indexing for wireframe render items
 			##
 			elif item.name() == self.sWireframeItemName or item.name() == self.sShadedTemplateItemName or item.name() == self.sSelectedWireframeItemName or (item.primitive() != omr.MGeometry.kTriangles and item.name() == self.sShadedProxyItemName):
-				self.updateIndexingForWireframeItems(wireIndexBuffer, item, data, totalVerts)
+				wireIndexBuffer = self.updateIndexingForWireframeItems(wireIndexBuffer, item, data, totalVerts)
 
 			## Handle indexing for affected edge render items
 			## For each face we check the edges. If the edges are in the active vertex
@@ -6525,49 +7208,28 @@ class apiMeshGeometryOverride(omr.MPxGeometryOverride):
 		## Wireframe index buffer is same for both wireframe and selected render item
 		## so we only compute and allocate it once, but reuse it for both render items
 		if not wireIndexBuffer:
-			wireIndexBuffer = data.createIndexBuffer(omr.MGeometry.kUnsignedInt32)
+			indexType, indexCType = indexBufferType(len(self.fMeshGeom.face_connects))
+			wireIndexBuffer = data.createIndexBuffer(indexType)
 			if wireIndexBuffer:
-				dataAddress = wireIndexBuffer.acquire(2*totalVerts, True) ## writeOnly - we don't need the current buffer values
-				if dataAddress:
-					data = (ctypes.c_uint * (2*totalVerts)).from_address(dataAddress)
-					vid = 0
-					first = 0
-					idx = 0
-					for faceIdx in xrange(self.fMeshGeom.faceCount):
-						## ignore degenerate faces
-						numVerts = self.fMeshGeom.face_counts[faceIdx]
-						if numVerts > 2:
-							first = vid
-							for v in xrange(numVerts-1):
-								data[idx] = vid
-								vid += 1
-								idx += 1
-								data[idx] = vid
-								idx += 1
-
-							data[idx] = vid
-							vid += 1
-							idx += 1
-							data[idx] = first
-							idx += 1
-
-						else:
-							vid += numVerts
-
-					wireIndexBuffer.commit(dataAddress)
+				## Edges shared between faces are only drawn once
+				indices = buildWireEdgeIndices(self.fMeshGeom, True)[0]
+				fillIndexBuffer(wireIndexBuffer, indices, indexCType)
 
 		## Associate same index buffer with either render item
 		if wireIndexBuffer:
 			item.associateWithIndexBuffer(wireIndexBuffer)
 
+		return wireIndexBuffer
+
 	def updateIndexingForDormantVertices(self, item, data, numTriangles):
 		## Create / update indexing for render items which draw dormant vertices
 
-		indexBuffer = data.createIndexBuffer(omr.MGeometry.kUnsignedInt32)
+		indexType, indexCType = indexBufferType(len(self.fMeshGeom.face_connects))
+		indexBuffer = data.createIndexBuffer(indexType)
 		if indexBuffer:
 			dataAddress = indexBuffer.acquire(3*numTriangles, True) ## writeOnly - we don't need the current buffer values
 			if dataAddress:
-				data = (ctypes.c_uint*(3*numTriangles)).from_address(dataAddress)
+				data = (indexCType*(3*numTriangles)).from_address(dataAddress)
 				## compute index data for triangulated convex polygons sharing
 				## poly vertex data among triangles
 				base = 0
@@ -6591,11 +7253,12 @@ class apiMeshGeometryOverride(omr.MPxGeometryOverride):
 	def updateIndexingForFaceCenters(self, item, data, debugPopulateGeometry):
 		## Create / update indexing for render items which draw face centers
 
-		indexBuffer = data.createIndexBuffer(omr.MGeometry.kUnsignedInt32)
+		indexType, indexCType = indexBufferType(self.fMeshGeom.faceCount)
+		indexBuffer = data.createIndexBuffer(indexType)
 		if indexBuffer:
 			dataAddress = indexBuffer.acquire(self.fMeshGeom.faceCount, True) ## writeOnly - we don't need the current buffer values
 			if dataAddress:
-				data = (ctypes.c_uint * self.fMeshGeom.faceCount).from_address(dataAddress)
+				data = (indexCType * self.fMeshGeom.faceCount).from_address(dataAddress)
 				if debugPopulateGeometry:
 					print ">>> Set up indexing for face centers"
 
@@ -6618,7 +7281,8 @@ class apiMeshGeometryOverride(omr.MPxGeometryOverride):
 	def updateIndexingForVertices(self, item, data, numTriangles, activeVertexCount, debugPopulateGeometry):
 		## Create / update indexing for render items which draw active vertices
 
-		indexBuffer = data.createIndexBuffer(omr.MGeometry.kUnsignedInt32)
+		indexType, indexCType = indexBufferType(max(activeVertexCount, len(self.fMeshGeom.face_connects)))
+		indexBuffer = data.createIndexBuffer(indexType)
 		if indexBuffer:
 			dataAddress = None
 
@@ -6633,7 +7297,7 @@ class apiMeshGeometryOverride(omr.MPxGeometryOverride):
 			if self.fDrawSharedActiveVertices:
 				dataAddress = indexBuffer.acquire(activeVertexCount, True) ## writeOnly - we don't need the current buffer values
 				if dataAddress:
-					data = (ctypes.c_uint*activeVertexCount).from_address(dataAddress)
+					data = (indexCType*activeVertexCount).from_address(dataAddress)
 					if debugPopulateGeometry:
 						print ">>> Set up indexing for shared vertices"
  
@@ -6649,9 +7313,7 @@ class apiMeshGeometryOverride(omr.MPxGeometryOverride):
 				vertexCount = 3*numTriangles
 				dataAddress = indexBuffer.acquire(vertexCount, True) ## writeOnly - we don't need the current buffer values
 				if dataAddress:
-					data = (ctypes.c_uint*vertexCount).from_address(dataAddress)
-					for i in xrange(vertexCount):
-						data[i] = vertexCount+1
+					data = (indexCType*vertexCount).from_address(dataAddress)
 
 					selectionIdSet = self.fActiveVerticesSet
 
@@ -6681,13 +7343,12 @@ class apiMeshGeometryOverride(omr.MPxGeometryOverride):
 								if vertexId in selectionIdSet:
 									lastFound = base+v+1
 									data[idx] = lastFound
-									idx +1
+									idx += 1
 
 							base += numVerts
 
-					for i in xrange(vertexCount):
-						if data[i] == vertexCount+1:
-							 data[i] = lastFound
+					## Point the unused tail at the last vertex found
+					data[idx:] = [lastFound] * (vertexCount - idx)
 
 			if dataAddress:
 				indexBuffer.commit(dataAddress)
@@ -6697,16 +7358,13 @@ class apiMeshGeometryOverride(omr.MPxGeometryOverride):
 	def updateIndexingForEdges(self, item, data, totalVerts, fromSelection):
 		## Create / update indexing for render items which draw affected edges
 
-		indexBuffer = data.createIndexBuffer(omr.MGeometry.kUnsignedInt32)
+		indexType, indexCType = indexBufferType(len(self.fMeshGeom.face_connects))
+		indexBuffer = data.createIndexBuffer(indexType)
 		if indexBuffer:
 			totalEdges = 2*totalVerts
-			totalEdgesP1 = 2*totalVerts+1
 			dataAddress = indexBuffer.acquire(totalEdges, True) ## writeOnly - we don't need the current buffer values
 			if dataAddress:
-				data = (ctypes.c_uint*totalEdges).from_address(dataAddress)
-				for i in xrange(totalEdges):
-					data[i] = totalEdgesP1
-					pass
+				data = (indexCType*totalEdges).from_address(dataAddress)
 
 				displayAll = not fromSelection
 				displayActives = (not displayAll and bool(self.fActiveEdgesSet))
@@ -6763,10 +7421,10 @@ class apiMeshGeometryOverride(omr.MPxGeometryOverride):
 
 						base += numVerts
 
-				if not displayAll:
-					for i in xrange(totalEdges):
-						if data[i] == totalEdgesP1:
-							data[i] = lastFound
+				## Point the unused tail at the last vertex found. The buffer is
+				## acquired write-only and degenerate faces write no edges, so
+				## this applies with displayAll too.
+				data[idx:] = [lastFound] * (totalEdges - idx)
 
 				indexBuffer.commit(dataAddress)
 
@@ -6775,35 +7433,28 @@ class apiMeshGeometryOverride(omr.MPxGeometryOverride):
 	def updateIndexingForFaces(self, item, data, numTriangles, fromSelection):
 		## Create / update indexing for render items which draw affected/active faces
 
-		indexBuffer = data.createIndexBuffer(omr.MGeometry.kUnsignedInt32)
+		indexType, indexCType = indexBufferType(len(self.fMeshGeom.face_connects))
+		indexBuffer = data.createIndexBuffer(indexType)
 		if indexBuffer:
 			numTriangleVertices = 3*numTriangles
 			dataAddress = indexBuffer.acquire(numTriangleVertices, True) ## writeOnly - we don't need the current buffer values
 			if dataAddress:
-				data = (ctypes.c_uint*numTriangleVertices).from_address(dataAddress)
-				for i in xrange(numTriangleVertices):
-					data[i] = numTriangleVertices+1
-					pass
+				data = (indexCType*numTriangleVertices).from_address(dataAddress)
 
 				displayAll = not fromSelection
 				displayActives = (not displayAll and bool(self.fActiveFacesSet))
 				displayAffected = (not displayAll and not displayActives)
 				isolateSelect = item.isIsolateSelectCopy();
 				
-				enableFaces = []
+				enableFaces = None
 				if(isolateSelect):
-					enableFaces = [0] * self.fMeshGeom.faceCount
-					
-					for i in xrange(self.fMeshGeom.faceCount):
-						enableFaces[i] = False
-
+					## Bitmap of the faces of the isolate select copy
+					enableFaces = bytearray(self.fMeshGeom.faceCount)
 
 					fnComponent = om.MFnSingleIndexedComponent( item.shadingComponent() )
 					if(fnComponent.componentType == om.MFn.kMeshPolygonComponent):
-						faceIds = fnComponent.getElements()
-						
-						for i in xrange(len(faceIds)):
-							enableFaces[faceIds[i]] = True
+						for faceId in fnComponent.getElements():
+							enableFaces[faceId] = 1
 
 
 				selectionIdSet = None
@@ -6866,10 +7517,10 @@ class apiMeshGeometryOverride(omr.MPxGeometryOverride):
 
 						base += numVerts
 
-				if not displayAll:
-					for i in xrange(numTriangleVertices):
-						if data[i] == numTriangleVertices+1:
-							data[i] = lastFound
+				## Point the unused tail at the last vertex found. The buffer is
+				## acquired write-only, so this also covers isolate select copies
+				## drawn with displayAll which only write their enabled faces.
+				data[idx:] = [lastFound] * (numTriangleVertices - idx)
 
 				indexBuffer.commit(dataAddress)
 
@@ -6879,23 +7530,20 @@ class apiMeshGeometryOverride(omr.MPxGeometryOverride):
 		## Create / update indexing for render items which draw filled / shaded
 		## triangles.
 		
-		indexBuffer = data.createIndexBuffer(omr.MGeometry.kUnsignedInt32)
+		indexType, indexCType = indexBufferType(len(self.fMeshGeom.face_connects))
+		indexBuffer = data.createIndexBuffer(indexType)
 		if indexBuffer:
 			isolateSelect = item.isIsolateSelectCopy()
 			
-			enableFaces = []
+			enableFaces = None
 			if (isolateSelect):
-				enableFaces = [0] * self.fMeshGeom.faceCount
-				
-				for i in xrange(self.fMeshGeom.faceCount):
-					enableFaces[i] = False
+				## Bitmap of the faces of the isolate select copy
+				enableFaces = bytearray(self.fMeshGeom.faceCount)
 
 				fnComponent = om.MFnSingleIndexedComponent( item.shadingComponent() )
 				if(fnComponent.componentType == om.MFn.kMeshPolygonComponent):
-					faceIds = fnComponent.getElements()
-					
-					for i in xrange(len(faceIds)):
-						enableFaces[faceIds[i]] = True
+					for faceId in fnComponent.getElements():
+						enableFaces[faceId] = 1
 			
 			indices = [0] * numTriangles * 3
 			
@@ -6913,14 +7561,7 @@ class apiMeshGeometryOverride(omr.MPxGeometryOverride):
 							idx += 3
 					base += numVerts
 			
-			dataAddress = indexBuffer.acquire(len(indices), True) ## writeOnly - we don't need the current buffer values
-			if dataAddress:
-				data = (ctypes.c_uint * len(indices)).from_address(dataAddress)
-				
-				for i in range(len(indices)):
-					data[i] = indices[i]
-				
-				indexBuffer.commit(dataAddress)
+			fillIndexBuffer(indexBuffer, indices, indexCType)
 
 			item.associateWithIndexBuffer(indexBuffer)
 
@@ -6946,7 +7587,14 @@ sDrawRegistrantId = "apiMeshPlugin"
 def initializePlugin(obj):
 	plugin = om.MFnPlugin(obj, "Autodesk", "3.0", "Any")
 
-	global sUseSubSceneOverride, sDrawDbClassification, sDrawRegistrantId
+	global sUseSubSceneOverride, sDrawDbClassification, sDrawRegistrantId, sProfilerCategory
+
+	try:
+		if sEnableProfiling:
+			sProfilerCategory = om.MProfiler.addCategory(sProfilerCategoryName, "Events from the apiMesh plugin")
+	except:
+		sys.stderr.write("Failed to register profiler category\n")
+		raise
 
 	try:
 		plugin.registerData("apiMeshData", apiMeshData.id, apiMeshData.creator, om.MPxData.kGeometryData)
@@ -6991,7 +7639,7 @@ def initializePlugin(obj):
 def uninitializePlugin(obj):
 	plugin = om.MFnPlugin(obj)
 
-	global sUseSubSceneOverride, sDrawDbClassification, sDrawRegistrantId
+	global sUseSubSceneOverride, sDrawDbClassification, sDrawRegistrantId, sProfilerCategory
 
 	try:
 		if sUseSubSceneOverride:
@@ -7038,3 +7686,11 @@ def uninitializePlugin(obj):
 		sys.stderr.write("Failed to deregister data\n")
 		pass
 
+	try:
+		if sProfilerCategory >= 0:
+			om.MProfiler.removeCategory(sProfilerCategoryName)
+			sProfilerCategory = -1
+	except:
+		sys.stderr.write("Failed to deregister profiler category\n")
+		pass
+
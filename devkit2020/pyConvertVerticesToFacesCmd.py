@@ -26,6 +26,9 @@ def maya_useNewAPI():
 ##############################################################################
 class convertVerticesToFacesCmd(om.MPxCommand):
 	s_name = "convertVerticesToFaces"
+	## Selections with fewer than 1 vertex in this many only visit the faces
+	## around the selected vertices, larger ones scan every face of the mesh once
+	s_localWalkRatio = 16
 	
 	def __init__(self):
 		om.MPxCommand.__init__(self)
@@ -40,45 +43,69 @@ class convertVerticesToFacesCmd(om.MPxCommand):
 		self.redoIt()
 
 	def redoIt(self):
-		multiVertexComponent = None
-		singleVertexComponent = None
 		finalFacesSelection = om.MSelectionList()
+
+		## GATHER THE SELECTED VERTEX IDS OF EACH MESH INTO A BITMAP, THE SAME MESH MAY APPEAR IN SEVERAL SELECTION ITEMS:
+		meshDagPaths = []
+		selectedVertices = {}
+		selectedVertexIds = {}
 		vertexComponentIter = om.MItSelectionList(self.previousSelectionList, om.MFn.kMeshVertComponent)
 		while not vertexComponentIter.isDone():
 		    meshDagPath, multiVertexComponent = vertexComponentIter.getComponent()
-		    meshName = meshDagPath.fullPathName();
-		    if multiVertexComponent is not None:
-		        itMeshVertex = om.MItMeshVertex(meshDagPath, multiVertexComponent)
-		        connectedFacesIndices = itMeshVertex.getConnectedFaces()
-		        faceIter = om.MItMeshPolygon(meshDagPath)
-
-		        for i in connectedFacesIndices :
-		            #GET THE VERTEX INDICES FOR CURRENT FACE:
-		            faceIter.setIndex(i);
-		            faceVerticesIndices = faceIter.getVertices()
-		            faceIsContained = True
-		            for j in faceVerticesIndices :
-		                singleVertexList = om.MSelectionList() 
-		                singleVertexList.clear()
-		                vertexName = meshName 
-		                vertexName += ".vtx["
-		                vertexName += str(j)
-		                vertexName += "]"
-		                singleVertexList.add(vertexName)
-		                meshDagPath, singleVertexComponent = singleVertexList.getComponent(0)
-		                ##SEE WHETHER VERTEX BELONGS TO ORIGINAL SELECTION, AND IF IT DOESN'T, THEN THE WHOLE FACE IS NOT CONTAINED:
-		                if not self.previousSelectionList.hasItem((meshDagPath, singleVertexComponent)):
-		                    faceIsContained = False
-		                    break
-		            ##IF FACE IS "CONTAINED", ADD IT TO THE FINAL CONTAINED FACES LIST:
-		            if faceIsContained:
-		                faceName = meshName 
-		                faceName += ".f["
-		                faceName += str(i)
-		                faceName += "]"
-		                finalFacesSelection.add(faceName)
+		    meshName = meshDagPath.fullPathName()
+		    if multiVertexComponent is not None and not multiVertexComponent.isNull():
+		        if meshName not in selectedVertices:
+		            meshDagPaths.append(meshDagPath)
+		            selectedVertices[meshName] = bytearray(om.MFnMesh(meshDagPath).numVertices)
+		            selectedVertexIds[meshName] = []
+		        vertexBitmap = selectedVertices[meshName]
+		        vertexIds = om.MFnSingleIndexedComponent(multiVertexComponent).getElements()
+		        for j in vertexIds:
+		            vertexBitmap[j] = 1
+		        selectedVertexIds[meshName].extend(vertexIds)
 		    vertexComponentIter.next()
 
+		for meshDagPath in meshDagPaths:
+		    vertexBitmap = selectedVertices[meshDagPath.fullPathName()]
+		    vertexIds = selectedVertexIds[meshDagPath.fullPathName()]
+		    meshFn = om.MFnMesh(meshDagPath)
+
+		    ##A FACE IS "CONTAINED" WHEN ALL OF ITS VERTICES BELONG TO THE ORIGINAL SELECTION:
+		    containedFaces = []
+		    if len(vertexIds) * self.s_localWalkRatio < meshFn.numVertices:
+		        #SMALL SELECTION, ONLY THE FACES AROUND THE SELECTED VERTICES CAN BE CONTAINED:
+		        candidateFaces = set()
+		        vertexIter = om.MItMeshVertex(meshDagPath)
+		        for vertexId in vertexIds:
+		            vertexIter.setIndex(vertexId)
+		            candidateFaces.update(vertexIter.getConnectedFaces())
+		        for i in sorted(candidateFaces):
+		            for vertexId in meshFn.getPolygonVertices(i):
+		                if not vertexBitmap[vertexId]:
+		                    break
+		            else:
+		                containedFaces.append(i)
+		    else:
+		        #GET THE VERTEX INDICES OF ALL FACES AT ONCE:
+		        faceVertexCounts, faceVertexIndices = meshFn.getVertices()
+		        faceVertexIndices = list(faceVertexIndices)
+
+		        offset = 0
+		        for i in xrange(len(faceVertexCounts)):
+		            nextOffset = offset + faceVertexCounts[i]
+		            for k in xrange(offset, nextOffset):
+		                if not vertexBitmap[faceVertexIndices[k]]:
+		                    break
+		            else:
+		                containedFaces.append(i)
+		            offset = nextOffset
+
+		    ##ADD THE CONTAINED FACES OF THE MESH TO THE FINAL LIST AS A SINGLE COMPONENT:
+		    if containedFaces:
+		        fnFaceComponent = om.MFnSingleIndexedComponent()
+		        faceComponent = fnFaceComponent.create(om.MFn.kMeshPolygonComponent)
+		        fnFaceComponent.addElements(containedFaces)
+		        finalFacesSelection.add((meshDagPath, faceComponent))
 
 		## FINALLY, MAKE THE NEW "CONTAINED FACES", THE CURRENT SELECTION:
 		om.MGlobal.setActiveSelectionList(finalFacesSelection, om.MGlobal.kReplaceList)
@@ -67,6 +67,7 @@
 
 import maya.OpenMaya as OpenMaya
 import maya.OpenMayaMPx as OpenMayaMPx
+import bisect
 import sys
 
 import polyModifier
@@ -272,28 +273,14 @@ class splitUV(polyModifier.polyModifierCmd):
 		# Get the number of faces sharing the selected UVs
 		#
 		meshFn = OpenMaya.MFnMesh(mesh)
-		polyIter = OpenMaya.MItMeshPolygon(mesh)
-		selUVFaceCountArray = OpenMaya.MIntArray()
-
-		indexParam = OpenMaya.MScriptUtil(0)
-		indexPtr = indexParam.asIntPtr()
+		selUVSet = meshFn.currentUVSetName()
+		uvCounts = OpenMaya.MIntArray()
+		assignedUVs = OpenMaya.MIntArray()
+		meshFn.getAssignedUVs(uvCounts, assignedUVs, selUVSet)
+		selUVFaceOffsetMap = buildUVFaceIndex(uvCounts, assignedUVs, meshFn.numUVs(selUVSet), self.__fSelUVs)[0]
 
-		count = 0
 		selUVsCount = self.__fSelUVs.length()
-		for i in range(selUVsCount):
-			while not polyIter.isDone():
-				if polyIter.hasUVs():
-					polyVertCount = polyIter.polygonVertexCount()
-
-					for j in range(polyVertCount):
-						polyIter.getUVIndex(j, indexPtr)
-						UVIndex = indexParam.getInt(indexPtr)
-
-						if UVIndex == self.__fSelUVs[i]:
-							count += 1
-							break
-				polyIter.next()
-			selUVFaceCountArray.append(count)
+		selUVFaceCountArray = [selUVFaceOffsetMap[i + 1] - selUVFaceOffsetMap[i] for i in range(selUVsCount)]
 
 		# Now, check to make sure that at least one UV is being shared by more than one
 		# face. So long as we have one UV that we can operate on, we should proceed and let
@@ -361,6 +348,80 @@ class splitUV(polyModifier.polyModifierCmd):
 ## FACTORY ##########################################################
 #####################################################################
 
+def buildUVFaceIndex(uvCounts, assignedUVs, numUVs, uvIds):
+	"""
+	Finds the faces sharing each of the given UVs in a single pass over the
+	UVs assigned to the mesh.
+
+	Arguments:
+		uvCounts - MIntArray of the number of UVs of each face, from MFnMesh.getAssignedUVs()
+		assignedUVs - MIntArray of the UV ids of each face-vertex, from MFnMesh.getAssignedUVs()
+		numUVs - number of UVs in the UV set
+		uvIds - MIntArray of the UV ids to look up, without duplicates. Only the
+		        last copy of a duplicated UV id is given its faces.
+
+	Returns the lists (offsets, faceIds, localVertIds, positions). The faces sharing
+	uvIds[i], the local vertex index of the UV in each of them and the matching
+	index into assignedUVs, are found between offsets[i] and offsets[i + 1] in
+	faceIds, localVertIds and positions. Faces are listed in increasing order, once
+	per UV, at the first of their vertices using that UV.
+	"""
+	assignedUVs = list(assignedUVs)
+
+	# Map each UV id of the mesh to its position in uvIds, -1 for the other UVs
+	#
+	uvIdCount = uvIds.length()
+	uvSlots = [-1] * numUVs
+	for i in range(uvIdCount):
+		uvId = uvIds[i]
+		if 0 <= uvId < len(uvSlots):
+			uvSlots[uvId] = i
+
+	# The UVs of a face are listed in its vertex order. Faces without UVs have
+	# a count of zero, so each face-vertex position belongs to the last face
+	# starting at or before it.
+	#
+	faceStarts = []
+	start = 0
+	for uvCount in uvCounts:
+		faceStarts.append(start)
+		start += uvCount
+
+	hits = [position for position, assignedUV in enumerate(assignedUVs) if uvSlots[assignedUV] >= 0]
+
+	# Collect one (slot, faceId, localVertId) entry per face sharing a UV. Positions
+	# are visited in face order, so a face using a UV more than once is the same as
+	# the last face recorded for that UV.
+	#
+	slotCounts = [0] * uvIdCount
+	lastFaceIds = [-1] * uvIdCount
+	entries = []
+	for position in hits:
+		slot = uvSlots[assignedUVs[position]]
+		faceId = bisect.bisect_right(faceStarts, position) - 1
+		if lastFaceIds[slot] != faceId:
+			lastFaceIds[slot] = faceId
+			slotCounts[slot] += 1
+			entries.append((slot, faceId, position - faceStarts[faceId]))
+
+	offsets = [0] * (uvIdCount + 1)
+	for i in range(uvIdCount):
+		offsets[i + 1] = offsets[i] + slotCounts[i]
+
+	faceIds = [0] * len(entries)
+	localVertIds = [0] * len(entries)
+	positions = [0] * len(entries)
+	cursors = offsets[:-1]
+	for (slot, faceId, localVertId) in entries:
+		cursor = cursors[slot]
+		faceIds[cursor] = faceId
+		localVertIds[cursor] = localVertId
+		positions[cursor] = faceStarts[faceId] + localVertId
+		cursors[slot] = cursor + 1
+
+	return (offsets, faceIds, localVertIds, positions)
+
+
 # Overview:
 #
 #		The splitUV factory implements the actual splitUV operation. It takes in
@@ -371,7 +432,8 @@ class splitUV(polyModifier.polyModifierCmd):
 #
 #		The algorithm works as follows:
 #
-#			1) Parse the mesh for the selected UVs and collect:
+#			1) Parse the mesh for the selected UVs and collect, in a single pass over
+#			   the UVs assigned to the mesh (see buildUVFaceIndex()):
 #
 #				(a) Number of faces sharing each UV
 #					(stored as two arrays: face array, indexing/offset array)
@@ -387,6 +449,10 @@ class splitUV(polyModifier.polyModifierCmd):
 #
 #			4) Assign each other face one of the new UVIds.
 #
+#		Steps 2 to 4 are computed on the arrays returned by MFnMesh.getUVs() and
+#		MFnMesh.getAssignedUVs(), which are then applied to the mesh with a single
+#		MFnMesh.setUVs() and MFnMesh.assignUVs() call each. Setting or assigning UVs
+#		one at a time updates the mesh on every call.
 #
 class splitUVFty(polyModifier.polyModifierFty):
 	def __init__(self):
@@ -407,7 +473,14 @@ class splitUVFty(polyModifier.polyModifierFty):
 
 
 	def setUVIds(self, uvIds):
-		self.__fSelUVs = uvIds
+		# Drop duplicated UV ids, a UV is only split once
+		#
+		self.__fSelUVs = OpenMaya.MIntArray()
+		seen = set()
+		for i in range(uvIds.length()):
+			if uvIds[i] not in seen:
+				seen.add(uvIds[i])
+				self.__fSelUVs.append(uvIds[i])
 
 
 	def doIt(self):
@@ -418,15 +491,6 @@ class splitUVFty(polyModifier.polyModifierFty):
 		# Declare our processing variables #
 		####################################
 
-		# Face Id and Face Offset map to the selected UVs
-		#
-		selUVFaceIdMap = OpenMaya.MIntArray()
-		selUVFaceOffsetMap = OpenMaya.MIntArray()
-
-		# Local Vertex Index map to the selected UVs
-		#
-		selUVLocalVertIdMap = OpenMaya.MIntArray()
-
 		#################################################
 		# Collect necessary information for the splitUV #
 		#												#
@@ -437,78 +501,54 @@ class splitUVFty(polyModifier.polyModifierFty):
 		meshFn = OpenMaya.MFnMesh(self.__fMesh)
 		selUVSet = meshFn.currentUVSetName()
 
-		indexParam = OpenMaya.MScriptUtil(0)
-		indexPtr = indexParam.asIntPtr()
-
-		offset = 0
-		selUVsCount = self.__fSelUVs.length()
-		polyIter = OpenMaya.MItMeshPolygon(self.__fMesh)
-		for i in range(selUVsCount):
-			selUVFaceOffsetMap.append(offset)
-
-			polyIter.reset()
-			while not polyIter.isDone():
-				if polyIter.hasUVs():
-					polyVertCount = polyIter.polygonVertexCount()
-
-					for j in range(polyVertCount):
-						polyIter.getUVIndex(j, indexPtr)
-						UVIndex = indexParam.getInt(indexPtr)
-
-						if UVIndex == self.__fSelUVs[i]:
-							selUVFaceIdMap.append(polyIter.index())
-							selUVLocalVertIdMap.append(j)
-							offset += 1
-							break
-
-				polyIter.next()
-
-		# Store total length of the faceId map in the last element of
-		# the offset map so that there is a way to get the number of faces
-		# sharing each of the selected UVs
+		# All UVs and face-vertex UV assignments of the UV set
+		#
+		uArray = OpenMaya.MFloatArray()
+		vArray = OpenMaya.MFloatArray()
+		meshFn.getUVs(uArray, vArray, selUVSet)
+
+		uvCounts = OpenMaya.MIntArray()
+		assignedUVs = OpenMaya.MIntArray()
+		meshFn.getAssignedUVs(uvCounts, assignedUVs, selUVSet)
+
+		# Face Id, Local Vertex Index and face-vertex position maps to the selected
+		# UVs, with their offset map. The last element of the offset map holds the
+		# total length of the faceId map so that there is a way to get the number
+		# of faces sharing each of the selected UVs
 		#
-		selUVFaceOffsetMap.append(offset)
+		currentUVCount = uArray.length()
+		(selUVFaceOffsetMap, selUVFaceIdMap, selUVLocalVertIdMap, selUVPositionMap) = buildUVFaceIndex(uvCounts, assignedUVs, currentUVCount, self.__fSelUVs)
+		selUVsCount = self.__fSelUVs.length()
 
 		###############################
 		# Begin the splitUV operation #
 		###############################
 
-		currentUVCount = meshFn.numUVs(selUVSet)
+		originalUVCount = currentUVCount
 
 		for i in range(selUVsCount):
-			# Get the current FaceId map offset
-			#
-			offset = selUVFaceOffsetMap[i]
-
 			# Get the U and V values of the current UV
 			#
 			uvId = self.__fSelUVs[i]
-
-			uParam = OpenMaya.MScriptUtil(0.0)
-			uPtr = uParam.asFloatPtr()
-			vParam = OpenMaya.MScriptUtil(0.0)
-			vPtr = vParam.asFloatPtr()
-			meshFn.getUV(uvId, uPtr, vPtr, selUVSet)
-			u = uParam.getFloat(uPtr)
-			v = vParam.getFloat(vPtr)
-			
-			# Get the number of faces sharing the current UV
-			#
-			faceCount = selUVFaceOffsetMap[i + 1] - selUVFaceOffsetMap[i]
+			u = uArray[uvId]
+			v = vArray[uvId]
 
 			# Arbitrarily choose that the last faceId in the list of faces
 			# sharing this UV, will keep the original UV.
 			#
-			for j in range(faceCount-1):
-				meshFn.setUV(currentUVCount, u, v, selUVSet)
-
-				localVertId = selUVLocalVertIdMap[offset]
-				faceId = selUVFaceIdMap[offset]
+			for offset in range(selUVFaceOffsetMap[i], selUVFaceOffsetMap[i + 1] - 1):
+				uArray.append(u)
+				vArray.append(v)
 
-				meshFn.assignUV(faceId, localVertId, currentUVCount, selUVSet)
+				assignedUVs.set(currentUVCount, selUVPositionMap[offset])
 
 				currentUVCount += 1
-				offset += 1
+
+		# Apply the new UVs and assignments in one shot
+		#
+		if currentUVCount != originalUVCount:
+			meshFn.setUVs(uArray, vArray, selUVSet)
+			meshFn.assignUVs(uvCounts, assignedUVs, selUVSet)
 
 
 #####################################################################